@@ -7,10 +7,10 @@
 # Simple shell script that controls the MMCGA project's server
 #
 
-USAGE="Usage: ./mmcga_server.sh (start | stop | restart)"
+USAGE="Usage: ./mmcga_server.sh (start | stop | restart) [--async]"
 
 # usage checks
-if [ "$#" -ne 1 ]; then
+if [ "$#" -lt 1 ] || [ "$#" -gt 2 ]; then
     echo "${USAGE}"
     exit 1
 fi
@@ -18,6 +18,10 @@ if [ "$1" != "start" ] && [ "$1" != "stop" ] && [ "$1" != "restart" ]; then
     echo "${USAGE}"
     exit 2
 fi
+if [ "$#" -eq 2 ] && [ "$2" != "--async" ]; then
+    echo "${USAGE}"
+    exit 2
+fi
 
 # Manage the RabbitMQ server
 ./server/utils/rmq.sh "$1"
@@ -29,9 +33,9 @@ if [ "$?" -ne 0 ]; then
 fi
 
 # start our python server/request handling system that reads off of queues
-# managed by the RabbitMQ server
+# managed by the RabbitMQ server; optionally on the asyncio engine
 if [ "$1" = "start" ]; then
-    /usr/bin/python3 server/mmcga_server.py
+    /usr/bin/python3 server/mmcga_server.py $2
     # Testing: I don't want RabbitMQ running on my box all the time
     ./server/utils/rmq.sh "stop"
 fi
@@ -0,0 +1,253 @@
+##
+## File:    async_server.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: This file defines the AsyncServer class, an asyncio-based
+##              engine for the MMCGA server. Consuming messages, applying them
+##              to the QueueManager (and the SQLite I/O that goes with it) and
+##              publishing replies all run as independent tasks, so a slow
+##              database write no longer stalls the whole message queue
+##
+
+# Python libraries
+import asyncio
+import queue
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+from utils.ack_batcher import AckBatcher
+from utils.metrics import METRICS
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class AsyncPublisher:
+    '''
+    Stand-in for the Bunny's publisher that hands out-going messages to the
+    AsyncServer's publishing task instead of writing them to RabbitMQ inline
+    '''
+
+    def __init__(self, loop, outbox):
+        '''
+        Constructs an AsyncPublisher
+        :param: loop Event loop that owns the out-going message queue
+        :param: outbox asyncio Queue drained by the publishing task
+        '''
+        self.loop = loop
+        self.outbox = outbox
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Queues a message for the publishing task; safe to call from any thread
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait,
+            [(msg_queue, body, content_type)])
+
+    def publish_batch(self, msgs):
+        '''
+        Queues a batch of messages for the publishing task, which sends them
+        together; safe to call from any thread
+        :param: msgs List of (message queue, message body) pairs or
+                (message queue, message body, content type) triples to send
+        '''
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, list(msgs))
+
+    def close(self):
+        '''
+        Nothing to close; the AsyncServer owns the real publisher connection
+        '''
+        pass
+
+class AsyncServer:
+    '''
+    AsyncServer object, runs the server as three independent stages:
+      - a consumer that keeps draining SERVER_QUEUE into an in-memory inbox
+      - a handler that applies messages to the QueueManager in arrival order
+      - a publisher that writes out-going messages to the message broker
+    Stages that block (the broker transport and SQLite) run on their own
+    worker threads so the event loop is always free to accept more work
+    '''
+
+    def __init__(self, queue_manager, msg_handler):
+        '''
+        Constructs an AsyncServer
+        :param: queue_manager QueueManager instance the server drives
+        :param: msg_handler Function that applies a single message body (and
+                its content type) to the QueueManager
+        '''
+        self.queue_manager = queue_manager
+        self.msg_handler = msg_handler
+        # single worker threads: QueueManager/SQLite state and the transport's
+        # connections are not thread-safe, so each one is only ever touched by
+        # one thread, which also preserves message ordering
+        self.consume_pool = ThreadPoolExecutor(max_workers=1)
+        self.handle_pool = ThreadPoolExecutor(max_workers=1)
+        self.publish_pool = ThreadPoolExecutor(max_workers=1)
+        # transport to the message broker; the consumer thread consumes from
+        # it and the publishing task publishes through it
+        self.transport = queue_manager.bunny.transport
+        # the real publisher, owned by the publishing task
+        self.publisher = queue_manager.bunny.publisher
+        # event loop state is built when the server starts running
+        self.loop = None
+        self.inbox = None
+        self.outbox = None
+        self.stopping = None
+        self.consuming = False
+        self.draining = False
+        # handled delivery tags on their way back to the consumer thread,
+        # which is the only thread allowed to ack on the transport
+        self.acks = queue.Queue()
+
+    #### BEGIN: Internal Functions ####
+    def __consume(self):
+        '''
+        Consumer stage; runs on its own thread and pushes every message
+        received on SERVER_QUEUE into the inbox. Messages are acked from here
+        once the handler stage has applied them
+        '''
+        transport = self.transport
+        batcher = AckBatcher(transport)
+
+        def on_msg(delivery_tag, body, content_type):
+            self.loop.call_soon_threadsafe(self.inbox.put_nowait,
+                (delivery_tag, body, content_type))
+
+        # bound the number of un-acked messages the broker pushes to us
+        transport.consume(SERVER_QUEUE, on_msg, SERVER_PREFETCH)
+        # poll so the loop can be told to stop
+        while (self.consuming):
+            transport.process_events(ASYNC_POLL_TIME)
+            self.__send_acks(batcher)
+        # stop deliveries, but stay connected until everything that was
+        # already delivered has been handled and acked
+        transport.cancel()
+        while (self.draining):
+            transport.process_events(ASYNC_POLL_TIME)
+            self.__send_acks(batcher)
+        self.__send_acks(batcher)
+
+    def __send_acks(self, batcher):
+        '''
+        Acks (or rejects) every message the handler stage has finished with
+        :param: batcher AckBatcher for the consumer channel
+        '''
+        while (True):
+            try:
+                delivery_tag, handled = self.acks.get_nowait()
+            except queue.Empty:
+                break
+            if (handled):
+                batcher.ack(delivery_tag)
+            else:
+                batcher.reject(delivery_tag)
+        # nothing else is ready; don't sit on a partially filled batch
+        batcher.flush()
+
+    async def __handle(self):
+        '''
+        Handler stage; applies messages to the QueueManager in arrival order
+        '''
+        while (True):
+            delivery_tag, body, content_type = await self.inbox.get()
+            handled = True
+            try:
+                await self.loop.run_in_executor(self.handle_pool,
+                    self.msg_handler, body, content_type)
+            except Exception as err:
+                print("Failed to handle message " + str(body) + ": "
+                    + str(err))
+                METRICS.counter("mmcga_msgs_failed_total",
+                    "Messages that raised an error while being handled").inc()
+                handled = False
+            self.acks.put((delivery_tag, handled))
+            self.inbox.task_done()
+
+    async def __publish(self):
+        '''
+        Publisher stage; writes out-going messages to RabbitMQ
+        '''
+        while (True):
+            msgs = await self.outbox.get()
+            try:
+                await self.loop.run_in_executor(self.publish_pool,
+                    self.publisher.publish_batch, msgs)
+            except Exception as err:
+                print("Failed to publish " + str(len(msgs)) + " message(s): "
+                    + str(err))
+            self.outbox.task_done()
+
+    async def __tick(self):
+        '''
+        Timer stage; periodically lets the QueueManager do its housekeeping,
+        such as flushing changed users to the database
+        '''
+        while (True):
+            await asyncio.sleep(ASYNC_TICK_TIME)
+            try:
+                await self.loop.run_in_executor(self.handle_pool,
+                    self.queue_manager.tick)
+            except Exception as err:
+                print("Housekeeping failed: " + str(err))
+    #### END: Internal Functions ####
+
+    def stop(self):
+        '''
+        Asks a running server to shut down; pending messages are drained first
+        '''
+        if (self.stopping != None):
+            self.stopping.set()
+
+    async def run(self):
+        '''
+        Runs the server until stop() is called (or the process is sent
+        SIGINT/SIGTERM)
+        '''
+        self.loop = asyncio.get_running_loop()
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stop)
+        # route the Bunny's out-going messages through the publishing task
+        self.queue_manager.bunny.publisher = AsyncPublisher(self.loop,
+            self.outbox)
+
+        # start all of the stages
+        self.consuming = True
+        self.draining = True
+        consumer = self.loop.run_in_executor(self.consume_pool, self.__consume)
+        # losing the broker connection takes the whole server down
+        consumer.add_done_callback(lambda fut: self.stop())
+        tasks = [
+            asyncio.ensure_future(self.__handle()),
+            asyncio.ensure_future(self.__publish()),
+            asyncio.ensure_future(self.__tick()),
+        ]
+        await self.stopping.wait()
+
+        # stop taking new messages, then let the other stages catch up
+        self.consuming = False
+        await self.inbox.join()
+        self.draining = False
+        try:
+            await consumer
+        except Exception as err:
+            print("Consumer failed: " + str(err))
+        await self.outbox.join()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # hand the real publisher back to the Bunny so it can be closed
+        self.queue_manager.bunny.publisher = self.publisher
+        for pool in (self.consume_pool, self.handle_pool, self.publish_pool):
+            pool.shutdown()
+        printd("AsyncServer stopped")
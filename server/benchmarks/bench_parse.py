@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+##
+## File:    bench_parse.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Benchmark that measures the per-message cost of parsing the
+##              messages the server receives from RabbitMQ, and compares the
+##              size and encode/decode cost of the JSON and binary wire formats
+##
+## Usage:       python3 -m benchmarks.bench_parse (from the server directory)
+##
+
+# Python libraries
+import json
+import timeit
+
+# project libraries
+from utils.macros import *
+import utils.codec
+from utils.bunny import Bunny
+from utils.codec import JSON_CODEC, BIN_CODEC
+
+#### GLOBALS    ####
+
+# number of times each message is parsed per timing run
+BENCH_ITERS = 20000
+# number of timing runs; the fastest one is reported
+BENCH_REPEAT = 5
+
+# typical messages the server receives, as the raw bytes pika hands over
+BENCH_MSGS = {
+    "login": json.dumps({
+        MSG_PARAM_METHOD:      MSG_USER_ENTER,
+        MSG_PARAM_USER_NAME:   "aic4242",
+        MSG_PARAM_USER_PASSWD: "5f4dcc3b5aa765d61d8327deb882cf99",
+    }).encode("utf-8"),
+    "register": json.dumps({
+        MSG_PARAM_METHOD:      MSG_TUT_ENTER,
+        MSG_PARAM_USER_NAME:   "tut0001",
+        MSG_PARAM_USER_PASSWD: "5f4dcc3b5aa765d61d8327deb882cf99",
+        MSG_PARAM_USER_F_NAME: "Tutor",
+        MSG_PARAM_USER_L_NAME: "McTutorface",
+        MSG_PARAM_USER_TITLE:  TUTOR_SLI,
+    }).encode("utf-8"),
+    "question": json.dumps({
+        MSG_PARAM_METHOD:      MSG_STU_QUEST,
+        MSG_PARAM_UID:         "stu_6825eece-7b51-4f96-aada-ad87500a0724",
+    }).encode("utf-8"),
+}
+
+# high-frequency messages the server sends to devices
+BENCH_REPLIES = {
+    "position": {
+        MSG_PARAM_METHOD:    MSG_STU_POS,
+        MSG_PARAM_STU_UID:   "stu_6825eece-7b51-4f96-aada-ad87500a0724",
+        MSG_PARAM_STU_POS:   12,
+        MSG_PARAM_QUEUE_LEN: 340,
+    },
+    "helped": {
+        MSG_PARAM_METHOD:    MSG_USER_HELPED,
+        MSG_PARAM_STU_UID:   "stu_6825eece-7b51-4f96-aada-ad87500a0724",
+        MSG_PARAM_TUT_UID:   "tut_0b7e6f5e-3c55-4bd4-9d8c-3bb4d1e4a3d2",
+    },
+}
+
+#### FUNCTIONS  ####
+
+def parse_legacy(msg_body):
+    '''
+    The original parser: strips the b'...' repr of the body and parses that
+    :param: msg_body RabbitMQ body message
+    :return: Dictionary of the message
+    '''
+    json_str = str(msg_body)
+    json_str = json_str[2:-1]
+    return json.loads(json_str)
+
+def parse_stdlib(msg_body):
+    '''
+    Bunny.parse_msg without the optional faster JSON parser
+    :param: msg_body RabbitMQ body message
+    :return: Dictionary of the message
+    '''
+    fast_parser = utils.codec.orjson
+    utils.codec.orjson = None
+    try:
+        return Bunny.parse_msg(msg_body)
+    finally:
+        utils.codec.orjson = fast_parser
+
+def time_parser(parser, msg_body):
+    '''
+    Times a parser on a single message
+    :param: parser Parsing function to time
+    :param: msg_body Message to parse
+    :return: Best per-message parse time, in microseconds
+    '''
+    runs = timeit.repeat(lambda: parser(msg_body),
+        number=BENCH_ITERS, repeat=BENCH_REPEAT)
+    return min(runs) / BENCH_ITERS * 1e6
+
+def bench_wire_formats():
+    '''
+    Prints a table comparing the JSON and binary wire formats on every
+    benchmark message: encoded size (bytes) and encode/decode cost (usec)
+    '''
+    print("Wire formats: size (bytes) / encode (usec) / decode (usec)")
+    print("{:<10}{:>24}{:>24}".format("message", "json", "binary"))
+    msgs = dict((name, Bunny.parse_msg(body))
+        for name, body in BENCH_MSGS.items())
+    msgs.update(BENCH_REPLIES)
+    for msg_name, var_tbl in msgs.items():
+        row = "{:<10}".format(msg_name)
+        for codec in (JSON_CODEC, BIN_CODEC):
+            encoded = codec.encode(var_tbl)
+            if (isinstance(encoded, str)):
+                encoded = encoded.encode("utf-8")
+            if (codec.decode(encoded) != var_tbl):
+                row += "{:>24}".format("MISMATCH")
+                continue
+            row += "{:>24}".format("{:d} / {:.2f} / {:.2f}".format(
+                len(encoded),
+                time_parser(codec.encode, var_tbl),
+                time_parser(codec.decode, encoded)))
+        print(row)
+
+#### MAIN       ####
+
+def main():
+    '''
+    Runs the benchmark and prints a table of per-message parse costs
+    '''
+    parsers = [
+        ("legacy repr", parse_legacy),
+        ("stdlib", parse_stdlib),
+    ]
+    if (utils.codec.orjson != None):
+        parsers.append(("orjson", Bunny.parse_msg))
+    print("Per-message parse cost (usec), best of " + str(BENCH_REPEAT)
+        + " x " + str(BENCH_ITERS) + " parses")
+    header = "{:<10}".format("message")
+    for name, parser in parsers:
+        header += "{:>14}".format(name)
+    print(header)
+    for msg_name, msg_body in BENCH_MSGS.items():
+        # every parser has to agree before its time means anything
+        expected = parse_legacy(msg_body)
+        row = "{:<10}".format(msg_name)
+        for name, parser in parsers:
+            if (parser(msg_body) != expected):
+                row += "{:>14}".format("MISMATCH")
+                continue
+            row += "{:>14.2f}".format(time_parser(parser, msg_body))
+        print(row)
+    print()
+    bench_wire_formats()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+##
+## File:    bench_rush.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: End-to-end benchmark that runs a synthetic rush-hour evening
+##              (see utils/load_gen.py) through the whole server loop, in a
+##              single process, and reports throughput, handler latency,
+##              database statements per message and peak memory
+##
+## Usage:       python3 -m benchmarks.bench_rush [students] [tutors]
+##              (from the server directory)
+##
+
+# Python libraries
+import sys
+import time
+import tracemalloc
+
+# project libraries
+from utils.macros import *
+from utils.load_gen import LoadGen, percentile
+from transport.mem_transport import MemBroker, MemTransport
+from msg_handlers import REGISTRY
+import mmcga_server
+
+#### GLOBALS    ####
+
+# seed shared by the timing and memory runs, so they replay the same evening
+BENCH_SEED = 42
+
+# handler latencies (method, seconds) of the run in progress
+latencies = []
+
+#### FUNCTIONS  ####
+
+def record_latency(method, elapsed):
+    '''
+    Message registry hook that records how long each handler took
+    :param: method Message method that was handled
+    :param: elapsed Time the handler took, in seconds
+    '''
+    latencies.append((method, elapsed))
+
+def run_rush(students, tutors, content_type=None):
+    '''
+    Runs one simulated evening through a fresh server
+    :param: students Number of students that show up
+    :param: tutors Number of tutors on duty
+    :param: content_type Wire format the clients speak
+    :return: Dictionary of results
+    '''
+    del latencies[:]
+    broker = MemBroker()
+    queue_manager = mmcga_server.init_server(MemTransport(broker), ":memory:")
+    mmcga_server.start_blocking()
+    # count every statement the server runs against the database
+    db_ops = [0]
+    def count_stmt(stmt):
+        db_ops[0] += 1
+    queue_manager.bunny.db_connect.set_trace_callback(count_stmt)
+    server_time = [0.0]
+    def pump():
+        start = time.perf_counter()
+        while (mmcga_server.poll_blocking(0) > 0):
+            pass
+        server_time[0] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    gen = LoadGen(broker, students, tutors, content_type=content_type,
+        seed=BENCH_SEED).run(pump)
+    wall_time = time.perf_counter() - start
+    queue_manager.close()
+    return {
+        "gen":         gen,
+        "server_time": server_time[0],
+        "wall_time":   wall_time,
+        "db_ops":      db_ops[0],
+        "latencies":   list(latencies),
+    }
+
+def report(result):
+    '''
+    Prints the results of a run
+    :param: result Dictionary of results from run_rush()
+    '''
+    gen = result["gen"]
+    handled = gen.sent
+    print(str(gen))
+    print("Messages handled:       " + str(handled))
+    print("Throughput:             {:.0f} msgs/sec (server), "
+        "{:.2f} sec wall".format(handled / result["server_time"],
+        result["wall_time"]))
+    all_lat = [elapsed for method, elapsed in result["latencies"]]
+    print("Handler latency:        p50 {:.1f} usec, p99 {:.1f} usec".format(
+        percentile(all_lat, 50) * 1e6, percentile(all_lat, 99) * 1e6))
+    print("DB statements/message:  {:.2f}".format(result["db_ops"] / handled))
+    print("Student wait:           p50 {:.0f} sec, p99 {:.0f} sec "
+        "(simulated)".format(gen.wait_percentile(50),
+        gen.wait_percentile(99)))
+    print()
+    print("{:<16}{:>8}{:>14}{:>14}".format("method", "count", "p50 (usec)",
+        "p99 (usec)"))
+    by_method = {}
+    for method, elapsed in result["latencies"]:
+        by_method.setdefault(method, []).append(elapsed)
+    for method in sorted(by_method):
+        times = by_method[method]
+        print("{:<16}{:>8}{:>14.1f}{:>14.1f}".format(method, len(times),
+            percentile(times, 50) * 1e6, percentile(times, 99) * 1e6))
+
+#### MAIN       ####
+
+def main():
+    '''
+    Runs the benchmark: one run for timing, then the same evening again
+    under tracemalloc for peak memory (tracing slows everything down, so its
+    timings aren't used)
+    '''
+    students = int(sys.argv[1]) if (len(sys.argv) > 1) else LOAD_STUDENTS
+    tutors = int(sys.argv[2]) if (len(sys.argv) > 2) else LOAD_TUTORS
+    REGISTRY.add_hook(record_latency)
+    print("Rush hour: " + str(students) + " students, " + str(tutors)
+        + " tutors")
+    report(run_rush(students, tutors))
+    tracemalloc.start()
+    run_rush(students, tutors)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print()
+    print("Peak memory:            {:.2f} MiB".format(peak / (1 << 20)))
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,7 @@ class TutorExperience(Datagram):
         # class attributes
         self.title = title
         self.bio = bio
-        self.course_ids = course_ids
+        self.course_ids = list(course_ids)
 
         # override attributes in the map
         if (init_map != None):
@@ -40,7 +40,7 @@ class TutorExperience(Datagram):
             if ("bio" in init_map):
                 self.bio  = init_map["bio"]
             if ("course_ids" in init_map):
-                self.course_ids  = init_map["course_ids"]
+                self.course_ids  = list(init_map["course_ids"])
 
     def __str__(self):
         '''
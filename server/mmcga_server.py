@@ -8,102 +8,163 @@
 ##
 
 # Python libraries
-import pika
+import asyncio
 import sys
 
 # project libraries
 from utils.macros import *
 from utils.utils import printd
 from utils.bunny import Bunny
+from users.user import User
+from utils.ack_batcher import AckBatcher
+from utils.metrics import METRICS, MetricsServer
 from queue_manager import QueueManager
+from msg_handlers import REGISTRY
+from async_server import AsyncServer
 
 #### GLOBALS    ####
-# high-level interface for server interactions
+# high-level interface for server interactions, built by init_server()
 # this needs to be global for the callback function
-queue_manager = QueueManager()
+queue_manager = None
+# acknowledges messages received by the blocking consumer
+# this needs to be global for the callback function
+ack_batcher = None
 
 #### FUNCTIONS  ####
 
-def msg_callback(ch, method, properties, body):
+def init_server(transport=None, db_path=None, clock=None, wal_path=None):
+    '''
+    Builds the server state
+    :param: transport Transport to the message broker; RabbitMQ on
+            SERVER_HOST by default. An in-process MemTransport lets the whole
+            server be driven without RabbitMQ
+    :param: db_path Path of the SQLite database; the default database file if
+            not given
+    :param: clock Clock the server runs on; the system clock if not given
+    :param: wal_path Optional path of the write-ahead log that keeps the
+            queues safe across restarts; the queues are recovered from it
+    :return: QueueManager the server drives
+    '''
+    global queue_manager
+    queue_manager = QueueManager(transport, db_path, clock, wal_path)
+    return queue_manager
+
+def handle_msg(body, content_type=None):
     '''
-    Basic callback function registered with the RMQ connection, passed as a
-    function pointer to the server channel listener
-    :param: ch RMQ channel
-    :param: method RMQ method
-    :param: properties RMQ properties
+    Applies a single message received from a device/user to the server state
     :param: body RMQ body of the message
+    :param: content_type RMQ content type (wire format) of the message
     '''
     # perform actions based on message received
     printd("Msg: " + str(body))
-    msg_map = Bunny.parse_msg(body)
-    method = msg_map[MSG_PARAM_METHOD]
+    msg_map = Bunny.parse_msg(body, content_type)
+    # answer the device in the wire format it spoke to us in; known users
+    # before their message is handled, new users once they have a UID
+    if (isinstance(msg_map, dict) and (MSG_PARAM_UID in msg_map)):
+        queue_manager.bunny.set_codec(msg_map[MSG_PARAM_UID], content_type)
+    result = REGISTRY.dispatch(queue_manager, msg_map)
+    if (isinstance(result, User)):
+        queue_manager.bunny.set_codec(result, content_type)
 
-    ## "registration" commands ##
-    # first-time student registration
-    if (method == MSG_STU_ENTER):
-        name   = msg_map[MSG_PARAM_USER_NAME]
-        passwd = msg_map[MSG_PARAM_USER_PASSWD]
-        f_name = msg_map[MSG_PARAM_USER_F_NAME]
-        l_name = msg_map[MSG_PARAM_USER_L_NAME]
-        queue_manager.register_stu(name, passwd, f_name, l_name)
-    # first-time tutor registration
-    elif (method == MSG_TUT_ENTER):
-        name   = msg_map[MSG_PARAM_USER_NAME]
-        passwd = msg_map[MSG_PARAM_USER_PASSWD]
-        f_name = msg_map[MSG_PARAM_USER_F_NAME]
-        l_name = msg_map[MSG_PARAM_USER_L_NAME]
-        title  = msg_map[MSG_PARAM_USER_TITLE]
-        queue_manager.register_tut(name, passwd, f_name, l_name, title)
-    # returning user login
-    elif (method == MSG_USER_ENTER): 
-        name   = msg_map[MSG_PARAM_USER_NAME]
-        passwd = msg_map[MSG_PARAM_USER_PASSWD]
-        queue_manager.login_user(name, passwd)
-    # user logs out
-    elif (method == MSG_USER_LEAVE):
-        uid = msg_map[MSG_PARAM_UID]
-        queue_manager.deregister_user(uid)
-    ## Student actions ##
-    # student asks a question
-    elif (method == MSG_STU_QUEST):
-        uid = msg_map[MSG_PARAM_UID]
-        queue_manager.stu_ask_q(uid)
-    ## Tutor actions ##
-    # tutor gets done answering a question
-    elif (method == MSG_TUT_DONE):
-        uid = msg_map[MSG_PARAM_UID]
-        queue_manager.tut_ans_q(uid)
-    ## Error - Command not found ##
-    else:
-        printd("Unknown message: " + str(body))
+def msg_callback(delivery_tag, body, content_type):
+    '''
+    Basic callback function registered with the transport, passed as a
+    function pointer to the server queue listener
+    :param: delivery_tag Delivery tag of the message
+    :param: body Body of the message
+    :param: content_type Content type (wire format) of the message
+    '''
+    # messages are only acked once the QueueManager has applied them
+    try:
+        handle_msg(body, content_type)
+    except Exception as err:
+        print("Failed to handle message " + str(body) + ": " + str(err))
+        METRICS.counter("mmcga_msgs_failed_total",
+            "Messages that raised an error while being handled").inc()
+        ack_batcher.reject(delivery_tag)
+        return
+    ack_batcher.ack(delivery_tag)
 
-#### MAIN       ####
+def start_blocking():
+    '''
+    Starts consuming the server queue for the blocking consumer
+    '''
+    global ack_batcher
+    transport = queue_manager.bunny.transport
+    ack_batcher = AckBatcher(transport)
+    # listen to messages on the primary queue and handle them as need be;
+    # the number of un-acked messages the broker pushes to us is bounded
+    transport.consume(SERVER_QUEUE, msg_callback, SERVER_PREFETCH)
 
-def main():
+def poll_blocking(time_limit=SERVER_ACK_FLUSH_TIME):
     '''
-    Main execution point of the program
+    Runs one pass of the blocking consumer: handles the messages that are
+    waiting (or that arrive within the time limit), acks them and lets the
+    QueueManager do its housekeeping. In-process drivers call this directly
+    after start_blocking() to run the server until its queue is empty
+    :param: time_limit Longest time to wait for messages, in seconds
+    :return: Number of messages handled
     '''
+    delivered = queue_manager.bunny.transport.process_events(time_limit)
+    # the queue went quiet; don't sit on a partially filled batch
+    ack_batcher.flush()
+    # a failed housekeeping pass is retried on the next one
+    try:
+        queue_manager.tick()
+    except Exception as err:
+        print("Housekeeping failed: " + str(err))
+    return delivered
 
-    # establish connection to server
+def run_blocking():
+    '''
+    Runs the server with a single blocking consumer; every message is fully
+    handled before the next one is read
+    '''
     print("+ Starting MMCGA Server...")
-    socket = pika.BlockingConnection(pika.ConnectionParameters(SERVER_HOST))
-    channel = socket.channel()
-    # send information to a specific RabbitMQ queue; building this queue for
-    # the first time
-    channel.queue_declare(queue=SERVER_QUEUE)
-    # listen to messages on the primary queue and handle them as need be
-    channel.basic_consume(msg_callback,
-        queue=SERVER_QUEUE,
-        no_ack=True);
-
+    start_blocking()
     # busy loop that waits for messages to come in; clean-up on ckill
     print("Waiting for messages. CTRL-C to exit")
     try:
-        channel.start_consuming()
+        while (True):
+            poll_blocking()
     except KeyboardInterrupt:
         print("\n- Stopping MMCGA Server...")
-        channel.stop_consuming()
-    socket.close()
+        ack_batcher.flush()
+    queue_manager.bunny.transport.cancel()
+
+def run_async():
+    '''
+    Runs the server on the asyncio engine; the server keeps draining the
+    message queue while earlier messages wait on database and network I/O
+    '''
+    print("+ Starting MMCGA Server (async)...")
+    print("Waiting for messages. CTRL-C to exit")
+    asyncio.run(AsyncServer(queue_manager, handle_msg).run())
+    print("\n- Stopping MMCGA Server...")
+
+#### MAIN       ####
+
+def main():
+    '''
+    Main execution point of the program
+    '''
+    wal_path = None
+    if (WAL_ENABLED):
+        wal_path = WAL_PATH_DEBUG if (DEBUG_DB) else WAL_PATH
+    init_server(wal_path=wal_path)
+    # metrics are served from a background thread
+    metrics_server = None
+    if (METRICS_ENABLED):
+        metrics_server = MetricsServer(METRICS)
+        metrics_server.start()
+    # server mode may be selected on the command line
+    if ((SERVER_ASYNC_FLAG in sys.argv[1:]) or SERVER_ASYNC):
+        run_async()
+    else:
+        run_blocking()
+    queue_manager.close()
+    if (metrics_server != None):
+        metrics_server.stop()
 
 if __name__ == "__main__":
     main()
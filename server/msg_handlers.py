@@ -0,0 +1,133 @@
+##
+## File:    msg_handlers.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: This file defines the handlers for every message the server
+##              understands, registered by message method in a MsgRegistry.
+##              Adding a new message is a matter of adding a new handler here
+##
+
+# project libraries
+from utils.macros import *
+from utils.msg_registry import MsgRegistry
+from utils.metrics import METRICS
+
+#### GLOBALS    ####
+
+# dispatch table of every message the server understands; handlers are
+# called with the server's QueueManager followed by the message's fields
+REGISTRY = MsgRegistry()
+
+# per-method handler latency histograms, looked up once per method
+handler_timers = {}
+
+#### FUNCTIONS  ####
+
+def record_handler(method, elapsed):
+    '''
+    Registry hook that records how long a handler took; the count of each
+    histogram doubles as the number of messages handled per method
+    :param: method Message method that was handled
+    :param: elapsed Time the handler took, in seconds
+    '''
+    timer = handler_timers.get(method)
+    if (timer == None):
+        timer = METRICS.histogram("mmcga_handler_seconds",
+            "Time spent handling messages, by method", method=method)
+        handler_timers[method] = timer
+    timer.observe(elapsed)
+
+REGISTRY.add_hook(record_handler)
+
+## "registration" commands ##
+
+@REGISTRY.register(MSG_STU_ENTER,
+    fields=[
+        (MSG_PARAM_USER_NAME,   str),
+        (MSG_PARAM_USER_PASSWD, str),
+        (MSG_PARAM_USER_F_NAME, str),
+        (MSG_PARAM_USER_L_NAME, str),
+    ])
+def stu_enter(queue_manager, name, passwd, f_name, l_name):
+    '''
+    First-time student registration
+    '''
+    return queue_manager.register_stu(name, passwd, f_name, l_name)
+
+@REGISTRY.register(MSG_TUT_ENTER,
+    fields=[
+        (MSG_PARAM_USER_NAME,   str),
+        (MSG_PARAM_USER_PASSWD, str),
+        (MSG_PARAM_USER_F_NAME, str),
+        (MSG_PARAM_USER_L_NAME, str),
+    ],
+    optional=[
+        (MSG_PARAM_USER_TITLE,  str, ""),
+        (MSG_PARAM_COURSE_IDS,  list, None),
+    ])
+def tut_enter(queue_manager, name, passwd, f_name, l_name, title, course_ids):
+    '''
+    First-time tutor registration
+    '''
+    return queue_manager.register_tut(name, passwd, f_name, l_name, title,
+        course_ids)
+
+@REGISTRY.register(MSG_USER_ENTER,
+    fields=[
+        (MSG_PARAM_USER_NAME,   str),
+        (MSG_PARAM_USER_PASSWD, str),
+    ])
+def user_enter(queue_manager, name, passwd):
+    '''
+    Returning user login
+    '''
+    return queue_manager.login_user(name, passwd)
+
+@REGISTRY.register(MSG_USER_LEAVE,
+    fields=[
+        (MSG_PARAM_UID,         str),
+    ])
+def user_leave(queue_manager, uid):
+    '''
+    User logs out
+    '''
+    return queue_manager.deregister_user(uid)
+
+## Student actions ##
+
+@REGISTRY.register(MSG_STU_QUEST,
+    fields=[
+        (MSG_PARAM_UID,         str),
+    ],
+    optional=[
+        (MSG_PARAM_COURSE_ID,   str, ""),
+        (MSG_PARAM_PRIORITY,    int, 0),
+    ])
+def stu_quest(queue_manager, uid, course_id, priority):
+    '''
+    Student asks a question
+    '''
+    return queue_manager.stu_ask_q(uid, course_id, priority)
+
+@REGISTRY.register(MSG_STU_POS,
+    fields=[
+        (MSG_PARAM_UID,         str),
+    ])
+def stu_pos(queue_manager, uid):
+    '''
+    Student asks for their position in line
+    '''
+    return queue_manager.stu_pos_q(uid)
+
+## Tutor actions ##
+
+@REGISTRY.register(MSG_TUT_DONE,
+    fields=[
+        (MSG_PARAM_UID,         str),
+    ])
+def tut_done(queue_manager, uid):
+    '''
+    Tutor gets done answering a question
+    '''
+    return queue_manager.tut_ans_q(uid)
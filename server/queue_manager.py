@@ -9,13 +9,18 @@
 ##
 
 # Python libraries
-import pika
+import heapq
 import sys
 
 # project libraries
 from utils.macros import *
 from utils.utils import printd
 from utils.bunny import Bunny
+from utils.metrics import METRICS
+from utils.clock import Clock, VirtualClock
+from utils.estimators import EWMA, P2Quantile
+from utils.queue_wal import QueueWAL, WAL_FIELD_OP
+from users.user import User
 from users.student import Student
 from users.tutor import Tutor
 from users.queue_stu import QueueStu
@@ -23,6 +28,13 @@ from users.queue_tut import QueueTut
 
 #### GLOBALS    ####
 
+# operations recorded in the write-ahead log
+WAL_OP_USER  = "user"
+WAL_OP_LEAVE = "leave"
+WAL_OP_ASK   = "ask"
+WAL_OP_HELP  = "help"
+WAL_OP_DONE  = "done"
+
 #### CLASS      ####
 
 class QueueManager:
@@ -31,13 +43,66 @@ class QueueManager:
     queue tasks such as adding/removing users to/from the appropriate queue
     '''
 
-    def __init__(self):
+    def __init__(self, transport=None, db_path=None, clock=None,
+            wal_path=None, max_tickets=STU_MAX_TICKETS):
         '''
         Constructs a QueueManager object
+        :param: transport Transport used to reach users' devices; RabbitMQ on
+                SERVER_HOST by default
+        :param: db_path Path of the SQLite database; the normal (or debug)
+                database file by default
+        :param: clock Clock that tells the time; the system clock by default.
+                The simulator runs the server on a VirtualClock
+        :param: wal_path Optional path of a write-ahead log that keeps the
+                queues safe across restarts. The queues are recovered from it
+                right away
+        :param: max_tickets Most questions a student may have waiting in
+                line at once; asking again past that is turned away
         '''
-        self.stu_queue = QueueStu(SERVER_QUEUE)
-        self.tut_queue = QueueTut()
-        self.bunny = Bunny()
+        self.clock = clock if (clock != None) else Clock()
+        self.stu_queue = QueueStu(SERVER_QUEUE, QUEUE_PRIORITY, self.clock)
+        self.tut_queue = QueueTut(QUEUE_TUT_LEAST_LOAD)
+        self.bunny = Bunny(transport, db_path, self.clock)
+        self.max_tickets = max_tickets
+        # when each waiting student started waiting (Student UID -> time) and
+        # when each busy tutor started their session (Tutor UID -> time)
+        self.wait_starts = {}
+        self.session_starts = {}
+        # streaming estimates of how long students wait and how long sessions
+        # take; constant memory and O(1) per update
+        self.wait_avg = EWMA(EST_ALPHA)
+        self.wait_pct = P2Quantile(EST_QUANTILE)
+        self.service_avg = EWMA(EST_ALPHA, EST_SERVICE_TIME)
+        self.service_pct = P2Quantile(EST_QUANTILE)
+        # gauges are read when metrics are scraped; they cost nothing here
+        METRICS.gauge("mmcga_stu_queue_len", self.stu_queue.len,
+            "Students waiting in line")
+        METRICS.gauge("mmcga_tutors", self.tut_queue.len,
+            "Tutors on duty, by state", state="free")
+        METRICS.gauge("mmcga_tutors", lambda: len(self.tut_queue.busy_queue),
+            "Tutors on duty, by state", state="busy")
+        METRICS.gauge("mmcga_users", lambda: len(self.bunny.uid_tbl),
+            "Users registered with the server")
+        METRICS.gauge("mmcga_wait_seconds_estimate",
+            lambda: self.wait_avg.value or 0.0,
+            "Estimated wait for help, by statistic", stat="ewma")
+        METRICS.gauge("mmcga_wait_seconds_estimate",
+            lambda: self.wait_pct.value() or 0.0,
+            "Estimated wait for help, by statistic", stat="quantile")
+        METRICS.gauge("mmcga_session_seconds_estimate",
+            lambda: self.service_avg.value,
+            "Estimated session length, by statistic", stat="ewma")
+        METRICS.gauge("mmcga_session_seconds_estimate",
+            lambda: self.service_pct.value() or 0.0,
+            "Estimated session length, by statistic", stat="quantile")
+        # write-ahead log of every change to the queues; while the log is
+        # being replayed nothing is logged or dispatched
+        self.wal = None
+        self.replaying = False
+        self.last_sync = self.clock.time()
+        if (wal_path != None):
+            self.wal = QueueWAL(wal_path)
+            self.recover()
 
     def __str__(self):
         '''
@@ -52,29 +117,202 @@ class QueueManager:
         result += str(self.bunny)
         return result
 
+    def __log(self, op, **fields):
+        '''
+        Records a change to the queues in the write-ahead log, if there is one
+        :param: op Operation (WAL_OP_*) being recorded
+        :param: fields Fields of the record
+        '''
+        if ((self.wal != None) and not(self.replaying)):
+            self.wal.append(op, t=self.clock.time(), **fields)
+
+    def __event(self, kind, uid, peer_uid=None):
+        '''
+        Records an event in the database's event table. Replayed changes
+        already have their events recorded
+        :param: kind Kind of event (EVENT_*)
+        :param: uid User/UID the event is about
+        :param: peer_uid Optional User/UID of the other user involved
+        '''
+        if not(self.replaying):
+            self.bunny.record_event(kind, uid, peer_uid)
+
+    def __snapshot(self):
+        '''
+        Writes a snapshot of everything the write-ahead log records. Changed
+        users are written to the database first, so the users in a snapshot
+        are never newer than the database
+        '''
+        self.bunny.flush()
+        self.wal.snapshot(self.__snapshot_state())
+
+    def __snapshot_state(self):
+        '''
+        Captures everything the write-ahead log records, for a snapshot
+        :return: Dictionary of the state
+        '''
+        return {
+            "t":        self.clock.time(),
+            "users":    list(self.bunny.uid_tbl.values()),
+            "codecs":   dict((uid, codec.content_type)
+                for uid, codec in self.bunny.codec_tbl.items()),
+            "stu_queue": self.stu_queue.entries(),
+            "tut_queue": self.tut_queue.entries(),
+            "waits":    self.wait_starts,
+            "sessions": self.session_starts,
+        }
+
+    def __restore(self, snap, offset):
+        '''
+        Rebuilds the state from a snapshot
+        :param: snap Dictionary of the state, from __snapshot_state()
+        :param: offset Amount to move the snapshot's times by, so they line
+                up with the current clock
+        '''
+        for json_map in snap["users"]:
+            self.bunny.restore(json_map, False)
+        for uid, content_type in snap["codecs"].items():
+            self.bunny.set_codec(uid, content_type)
+        for stu_uid, course_id, key in snap["stu_queue"]:
+            if (key != None):
+                key += offset
+            self.stu_queue.push(stu_uid, course_id, 0, key)
+        for tut_uid, busy_state, course_ids, load in snap["tut_queue"]:
+            self.tut_queue.restore(tut_uid, busy_state, course_ids, load)
+        self.wait_starts = dict((uid, start + offset)
+            for uid, start in snap["waits"].items())
+        self.session_starts = dict((uid, start + offset)
+            for uid, start in snap["sessions"].items())
+
+    def __replay(self, record):
+        '''
+        Applies a record of the write-ahead log, the same way the change was
+        made the first time
+        :param: record Dictionary of the record
+        '''
+        op = record[WAL_FIELD_OP]
+        if (op == WAL_OP_USER):
+            user = self.bunny.restore(record["user"])
+            if (Student.is_stu(user)):
+                self.__enqueue(user)
+            elif (Tutor.is_tut(user)):
+                self.tut_queue.add(user)
+        elif (op == WAL_OP_LEAVE):
+            self.deregister_user(record["uid"])
+        elif (op == WAL_OP_ASK):
+            self.stu_ask_q(record["uid"], record["course"], record["priority"])
+        elif (op == WAL_OP_HELP):
+            tut = self.bunny.fetch_user(record["tut"])
+            if (tut != None):
+                self.__help(tut, record["course"], self.clock.time())
+        elif (op == WAL_OP_DONE):
+            self.tut_ans_q(record["uid"])
+
+    def __enqueue(self, stu_uid, course_id="", priority=0):
+        '''
+        Puts a student in line and starts timing their wait
+        :param: stu_uid Student object/UID
+        :param: course_id Course the question is about, if any
+        :param: priority Priority of the question
+        '''
+        stu_uid = self.stu_queue.push(stu_uid, course_id, priority)
+        if (stu_uid != None):
+            self.__event(EVENT_ASK, stu_uid)
+        if ((stu_uid != None) and not(stu_uid in self.wait_starts)):
+            self.wait_starts[stu_uid] = self.clock.time()
+
+    def __pos_tbl(self, method, stu_uid):
+        '''
+        Builds a message that tells a student where they are in line
+        :param: method Message method
+        :param: stu_uid Student object/UID
+        :return: Dictionary of the message
+        '''
+        pos = self.stu_queue.position(stu_uid)
+        eta = self.stu_eta(stu_uid, pos)
+        tbl = {}
+        tbl[MSG_PARAM_METHOD]    = method
+        tbl[MSG_PARAM_STU_UID]   = User.get_uid(stu_uid)
+        tbl[MSG_PARAM_STU_POS]   = pos
+        tbl[MSG_PARAM_QUEUE_LEN] = self.stu_queue.len()
+        tbl[MSG_PARAM_STU_ETA]   = None if (eta == None) else int(round(eta))
+        return tbl
+
     def __dispatch_tut(self):
         '''
-        Checks if a tutor is currently available and someone is waiting for a
-        quetion to be answered. If both are true, a Tutor is dispatched to help
-        :return: Tutor dispatched or None if there isn't one
+        Dispatches tutors to help waiting students. Every available tutor is
+        matched with a waiting student in one pass, and all of the resulting
+        notifications are sent out as a single batch
+        Students are routed by course: the longest-waiting student that some
+        available tutor can help is helped first. Only the front of each
+        course's sub-queue is ever looked at, so a pass costs
+        O(courses waiting) no matter how long the line is
+        :return: List of (Tutor UID, Student UID) pairs that were dispatched
         '''
-        # check if there is a tutor available to dispatch
-        if not(self.tut_queue.is_empty() or self.stu_queue.is_empty()):
-            # get the UID of the next available tutor and user
-            tut_uid = self.tut_queue.next()
-            stu_uid = self.stu_queue.pop()
-            # update the tutor
+        # the log already says who was sent to whom
+        if (self.replaying):
+            return []
+        dispatched = []
+        msgs = []
+        now = self.clock.time()
+        # fronts of the course sub-queues, longest wait first
+        heads = self.stu_queue.heads()
+        heapq.heapify(heads)
+        # keep going while there is a tutor available and a student waiting
+        while ((len(heads) > 0) and not(self.tut_queue.is_empty())):
+            rank, course_id = heads[0]
+            # get the UID of the next tutor that can help with the course;
+            # if there isn't one the course waits until a tutor frees up
+            tut_uid = self.tut_queue.next(course_id)
+            if (tut_uid == None):
+                heapq.heappop(heads)
+                continue
             tut = self.bunny.fetch_user(tut_uid)
-            stu = self.bunny.fetch_user(stu_uid)
-            tut.help(stu_uid)
+            # tutor is no longer registered; they can't help anyone
+            if (tut == None):
+                self.tut_queue.remove(tut_uid)
+                continue
+            stu_uid = self.__help(tut, course_id, now)
+            if (self.stu_queue.course_len(course_id) > 0):
+                heapq.heapreplace(heads,
+                    (self.stu_queue.head(course_id), course_id))
+            else:
+                heapq.heappop(heads)
+            dispatched.append((tut_uid, stu_uid))
             # alert users of the change
             tbl = {}
             tbl[MSG_PARAM_METHOD]  = MSG_USER_HELPED
             tbl[MSG_PARAM_STU_UID] = stu_uid
             tbl[MSG_PARAM_TUT_UID] = tut_uid
-            self.bunny.send_msg(stu_uid, tbl)
-            self.bunny.send_msg(tut_uid, tbl)
-        return None
+            msgs.append((stu_uid, tbl))
+            msgs.append((tut_uid, tbl))
+        if (len(msgs) > 0):
+            self.bunny.send_msgs(msgs)
+        return dispatched
+
+    def __help(self, tut, course_id, now):
+        '''
+        Sends a tutor to the student at the front of a course's sub-queue
+        :param: tut Tutor object being sent
+        :param: course_id Course ID of the sub-queue
+        :param: now Current time
+        :return: UID of the student being helped
+        '''
+        # update the tutor and take them off of the available list
+        stu_uid = self.stu_queue.pop_course(course_id)
+        self.__log(WAL_OP_HELP, tut=tut.uid, stu=stu_uid, course=course_id)
+        self.__event(EVENT_HELP, tut, stu_uid)
+        tut.help(stu_uid)
+        self.tut_queue.update(tut)
+        # stats: the student's wait is over and the session starts
+        if (stu_uid in self.wait_starts):
+            wait = now - self.wait_starts.pop(stu_uid)
+            self.wait_avg.update(wait)
+            self.wait_pct.update(wait)
+        if (stu_uid in self.stu_queue):
+            self.wait_starts[stu_uid] = now
+        self.session_starts[tut.uid] = now
+        return stu_uid
 
     def register_stu(self, rit_name, passwd, f_name, l_name):
         '''
@@ -83,16 +321,21 @@ class QueueManager:
         :param: passwd Password, encrypted by client
         :param: f_name First name of the user
         :param: l_name Last name of the user
-        :return: New user object
+        :return: New user object or None if the user couldn't be registered
         '''
         user = Student(rit_name, passwd, f_name, l_name)
-        self.bunny.register(user)
-        self.stu_queue.push(user)
+        # a user that couldn't be registered never reaches the queues
+        if (self.bunny.register(user) == None):
+            return None
+        self.__log(WAL_OP_USER, user=user)
+        self.__event(EVENT_LOGIN, user)
+        self.__enqueue(user)
         # newly registered users should check the queue Student queue
         self.__dispatch_tut()
         return user
 
-    def register_tut(self, rit_name, passwd, f_name, l_name, title=""):
+    def register_tut(self, rit_name, passwd, f_name, l_name, title="",
+            course_ids=None):
         '''
         Registers a tutor with the system
         :param: rit_name Username of the user (RIT email, sans @rit.edu)
@@ -100,10 +343,23 @@ class QueueManager:
         :param: f_name First name of the user
         :param: l_name Last name of the user
         :param: title Optional title of the tutor
-        :return: New user object
+        :param: course_ids Optional list of courses the tutor can help with;
+                tutors without a list can help with anything
+        :return: New user object or None if the course list is malformed or
+                 the user couldn't be registered
         '''
+        # a bad course ID must be caught before the tutor is indexed
+        if ((course_ids != None) and not(all(isinstance(course_id, str)
+                for course_id in course_ids))):
+            printd("Malformed course list: " + str(course_ids))
+            return None
         user = Tutor(rit_name, passwd, f_name, l_name, title)
-        self.bunny.register(user)
+        if (course_ids != None):
+            user.exp.course_ids = list(course_ids)
+        if (self.bunny.register(user) == None):
+            return None
+        self.__log(WAL_OP_USER, user=user)
+        self.__event(EVENT_LOGIN, user)
         self.tut_queue.add(user)
         # newly registered tutors should check the queue Student queue
         self.__dispatch_tut()
@@ -117,9 +373,12 @@ class QueueManager:
         '''
         # pull user from the DB
         user = self.bunny.login(user_name, passwd)
+        if (user != None):
+            self.__log(WAL_OP_USER, user=user)
+            self.__event(EVENT_LOGIN, user)
         # determine user type and add them to the correct queue
         if (Student.is_stu(user)):
-            self.stu_queue.push(user)
+            self.__enqueue(user)
         elif (Tutor.is_tut(user)):
             self.tut_queue.add(user)
         # newly registered users should check the queue Student queue
@@ -133,36 +392,178 @@ class QueueManager:
         :return: Removed UID or None if failed
         '''
         uid = self.bunny.deregister(uid)
+        if (uid != None):
+            self.__log(WAL_OP_LEAVE, uid=uid)
+            self.__event(EVENT_LOGOUT, uid)
+        self.wait_starts.pop(uid, None)
+        self.session_starts.pop(uid, None)
         if (uid in self.stu_queue):
-            self.stu_queue.purge(uid)
+            # every question the student had waiting goes with them
+            while (uid in self.stu_queue):
+                self.stu_queue.purge(uid)
         elif (uid in self.tut_queue):
             self.tut_queue.remove(uid)
         return uid
 
-    def stu_ask_q(self, stu_uid):
+    def stu_ask_q(self, stu_uid, course_id="", priority=0):
         '''
         Function that gets called when a student has a question to be answered
         :param: stu_uid Student object/UID asking the question
+        :param: course_id Optional course the question is about; only tutors
+                that know the course (or generalists) will be sent
+        :param: priority Optional priority of the question (e.g. the
+                assignment is due tonight); only used if the student queue is
+                in priority mode
+        :return: Student UID put in line or None if the student isn't
+                 registered or already holds max_tickets places in line
         '''
-        self.stu_queue.push(stu_uid)
+        # only registered students may ask; nothing is logged, queued or sent
+        # otherwise
+        stu = self.bunny.fetch_user(User.get_uid(stu_uid))
+        if not(Student.is_stu(stu)):
+            return None
+        # a student that already has every ticket they may hold (e.g. they
+        # tapped "ask" twice) keeps their place and is told so. The log only
+        # holds asks that were let through, so replayed asks are not checked
+        if (not(self.replaying)
+                and (self.stu_queue.tickets(stu) >= self.max_tickets)):
+            self.bunny.send_msg(stu, self.__pos_tbl(MSG_ERR_STU_QUEUED, stu))
+            return None
+        self.__log(WAL_OP_ASK, uid=stu.uid, course=course_id,
+            priority=priority)
+        self.__enqueue(stu, course_id, priority)
         # stats: track questions asked
-        stu = self.bunny.fetch_user(stu_uid)
         stu.q_increment()
+        self.bunny.mark_dirty(stu)
         # student should cause a check to dispatch a tutor
         self.__dispatch_tut()
+        return User.get_uid(stu_uid)
+
+    def stu_pos_q(self, stu_uid):
+        '''
+        Function that gets called when a student asks for their position in
+        line. The position and the expected wait are sent back to the student
+        :param: stu_uid Student object/UID asking for their position
+        :return: 1-based position in line or None if not in line
+        '''
+        tbl = self.__pos_tbl(MSG_STU_POS, stu_uid)
+        self.bunny.send_msg(stu_uid, tbl)
+        return tbl[MSG_PARAM_STU_POS]
+
+    def stu_eta(self, stu_uid, pos=None):
+        '''
+        Estimates how much longer a student will wait for help: the tutors on
+        duty help one student per (average) session length each, so the
+        student is reached after position * session length / tutors
+        :param: stu_uid Student object/UID
+        :param: pos Optional position of the student in line, if known
+        :return: Expected wait in seconds, or None if the student isn't in
+                 line or no tutors are on duty
+        '''
+        if (pos == None):
+            pos = self.stu_queue.position(stu_uid)
+        tutors = self.tut_queue.len() + len(self.tut_queue.busy_queue)
+        if ((pos == None) or (tutors == 0)):
+            return None
+        return pos * self.service_avg.value / tutors
 
     def tut_ans_q(self, tut_uid):
         '''
         Function that gets called when a tutor has just answered a question
         :param: tut_uid Tutor object/UID answering a question
+        :return: Tutor UID or None if the tutor isn't registered or wasn't
+                 helping anyone (e.g. a repeated "done")
         '''
-        # stats: track questions asked
-        tut = self.bunny.fetch_user(tut_uid)
+        tut = self.bunny.fetch_user(User.get_uid(tut_uid))
+        if not(Tutor.is_tut(tut)):
+            return None
+        # only a tutor in a session can finish one
+        start = self.session_starts.pop(tut.uid, None)
+        if ((start == None) and not(tut.busy_status())):
+            return None
+        self.__log(WAL_OP_DONE, uid=tut.uid)
+        self.__event(EVENT_DONE, tut,
+            tut.helped[-1] if (len(tut.helped) > 0) else None)
+        # stats: track questions answered
         tut.q_increment()
-        # update tutor state
+        self.bunny.mark_dirty(tut)
+        # stats: time the session that just ended
+        if (start != None):
+            service = self.clock.time() - start
+            self.service_avg.update(service)
+            self.service_pct.update(service)
+        # update tutor state; they're available again
         tut.done()
+        self.tut_queue.update(tut)
         # tutor should see if there is somebody else to help
         self.__dispatch_tut()
+        return tut.uid
+
+    def tick(self):
+        '''
+        Periodic housekeeping, called by the server loop whenever it is idle
+        or on a timer
+        '''
+        self.bunny.tick()
+        if (self.wal != None):
+            now = self.clock.time()
+            if (self.wal.since_snap >= WAL_SNAPSHOT_EVERY):
+                self.__snapshot()
+                self.last_sync = now
+            elif (now - self.last_sync >= WAL_SYNC_INTERVAL):
+                self.wal.sync()
+                self.last_sync = now
+
+    def recover(self):
+        '''
+        Rebuilds the queues after a restart from the latest snapshot plus the
+        records logged after it, then compacts everything into a new
+        snapshot. Time the server was down doesn't count as waiting
+        :return: Number of log records replayed
+        '''
+        snap, records = self.wal.load()
+        if ((snap != None) or (len(records) > 0)):
+            # the old server's clock is lined up with ours at the last thing
+            # it logged
+            last = records[-1]["t"] if (len(records) > 0) else snap["t"]
+            offset = self.clock.time() - last
+            clock = self.clock
+            replay_clock = VirtualClock()
+            self.clock = self.stu_queue.clock = self.bunny.clock = replay_clock
+            self.replaying = True
+            try:
+                if (snap != None):
+                    replay_clock.advance(snap["t"] + offset)
+                    self.__restore(snap, offset)
+                for record in records:
+                    replay_clock.advance(record["t"] + offset)
+                    # a record that can't be applied (e.g. it names a user
+                    # that is gone) is dropped rather than stopping start up
+                    try:
+                        self.__replay(record)
+                    except (AttributeError, KeyError, TypeError,
+                            ValueError) as err:
+                        printd("Dropped log record " + str(record) + ": "
+                            + str(err))
+            finally:
+                self.replaying = False
+                self.clock = self.stu_queue.clock = self.bunny.clock = clock
+                self.bunny.last_flush = clock.time()
+            printd("Recovered " + str(len(self.bunny.uid_tbl)) + " users and "
+                + str(self.stu_queue.len()) + " students in line")
+        self.wal.open()
+        self.__snapshot()
+        return len(records)
+
+    def close(self):
+        '''
+        Shuts down the QueueManager, releasing any connections it holds. The
+        queues are saved in a snapshot so the next start up is quick
+        '''
+        if (self.wal != None):
+            self.__snapshot()
+            self.wal.close()
+        self.bunny.close()
 
 #### MAIN       ####
 
@@ -170,7 +571,9 @@ def main():
     '''
     Test program for this class
     '''
-    qm = QueueManager()
+    # devices are reached through an in-process broker, so no RabbitMQ server
+    # is needed
+    qm = QueueManager(MemTransport())
     # Register operations; with "random" ordering
     print("##### Register commands #####")
     tut0 = qm.register_tut("tut0001", "pass", "tutor", "a", "sli")
@@ -209,9 +612,132 @@ def main():
     # clean-up
     print(qm.deregister_user(tut0))
     print(qm.deregister_user(stu0))
+
+    # students are only sent tutors that know their course
+    print("##### Routing commands #####")
+    tut2 = qm.register_tut("tut0003", "pass", "Tutor", "C", "TA", ["CS1"])
+    stu6 = qm.register_stu("eel1234", "pass", "Eel", "Man")
+    print(tut2.busy_status() and (tut2.helped[-1] == stu6.uid))
+    stu7 = qm.register_stu("fox1234", "pass", "Fox", "Man")
+    qm.stu_queue.purge(stu7)
+    qm.stu_ask_q(stu7, "CS2")
+    qm.stu_ask_q(stu6, "CS1")
+    qm.tut_ans_q(tut2)
+    # the CS2 student is passed over for the later CS1 student
+    print(tut2.helped[-1] == stu6.uid)
+    print(qm.stu_queue.position(stu7) == 1)
+    tut3 = qm.register_tut("tut0004", "pass", "Tutor", "D", "SLI")
+    print(tut3.helped[-1] == stu7.uid)
+    # course lists that aren't all strings are turned away untouched
+    print(qm.register_tut("tut0005", "pass", "Tutor", "E", "TA", [["CS1"]])
+        == None)
+    print(qm.bunny.fetch_user(User.get_uid("tut0005")) == None)
+    # neither is a student whose user name belongs to a tutor
+    lt_count = qm.stu_queue.lt_count
+    print(qm.register_stu("tut0004", "pass", "Not", "Tutor") == None)
+    print(qm.stu_queue.lt_count == lt_count)
+
+    # expected waits come from the timed sessions
+    print("##### Estimate commands #####")
+    print(qm.service_avg.count == 1)
+    stu8 = qm.register_stu("gnu1234", "pass", "Gnu", "Man")
+    print(qm.stu_eta(stu8) == 1 * qm.service_avg.value / 2)
+    print(qm.stu_pos_q(stu8) == 1)
+    print(qm.stu_eta(stu6) == None)
+
+    # asking again while already in line doesn't add a second place
+    print("##### Duplicate ask commands #####")
+    lt_count = qm.stu_queue.lt_count
+    print(qm.stu_ask_q(stu8) == None)
+    print(qm.stu_queue.tickets(stu8) == 1)
+    print(qm.stu_queue.lt_count == lt_count)
+    print(qm.bunny.fetch_user(stu8).stats.stat_count("q_count") == 0)
+    qm.max_tickets = 2
+    print(qm.stu_ask_q(stu8, "CS2") == stu8.uid)
+    print(qm.stu_ask_q(stu8) == None)
+    print(qm.stu_queue.tickets(stu8) == 2)
+    # unknown students are turned away before the ticket check
+    lt_count = qm.stu_queue.lt_count
+    print(qm.stu_ask_q("stu_nobody") == None)
+    print(qm.stu_queue.lt_count == lt_count)
+    qm.max_tickets = STU_MAX_TICKETS
+    qm.deregister_user(stu8)
+    print(qm.stu_queue.tickets(stu8) == 0)
+    for user in (tut2, tut3, stu6, stu7):
+        qm.deregister_user(user)
+    qm.close()
+
+    # the queues survive the server being killed and restarted
+    print("##### Recovery commands #####")
+    wal_path = os.path.join(tempfile.mkdtemp(), "test.wal")
+    clock = VirtualClock()
+    qm = QueueManager(MemTransport(), ":memory:", clock, wal_path)
+    tut0 = qm.register_tut("tut0001", "pass", "Tutor", "A", "SLI", ["CS1"])
+    stus = [qm.register_stu("wal" + str(i), "pass", "Wal", str(i))
+        for i in range(0, 5)]
+    clock.advance(60)
+    qm.stu_ask_q(stus[0], "CS2")
+    qm.deregister_user(stus[2])
+    clock.advance(120)
+    qm.tut_ans_q(tut0)
+    state = (qm.stu_queue.entries(), qm.tut_queue.entries(),
+        sorted(qm.bunny.uid_tbl), dict(qm.wait_starts))
+    # everything that happened is in the event table, in order
+    print(qm.bunny.fetch_events(uid=stus[2]) == [(0, EVENT_LOGIN, stus[2].uid,
+        None), (0, EVENT_ASK, stus[2].uid, None), (60, EVENT_LOGOUT,
+        stus[2].uid, None)])
+    print(qm.bunny.fetch_events(60, 61) == [(60, EVENT_ASK, stus[0].uid, None),
+        (60, EVENT_LOGOUT, stus[2].uid, None)])
+    print([(ts, kind, peer_uid) for ts, kind, uid, peer_uid
+        in qm.bunny.fetch_events(uid=tut0)] == [(0, EVENT_LOGIN, None),
+        (0, EVENT_HELP, stus[0].uid), (120, EVENT_DONE, stus[0].uid),
+        (120, EVENT_HELP, stus[1].uid)])
+    # no clean shutdown; a new server picks up from the log
+    qm2 = QueueManager(MemTransport(), ":memory:", VirtualClock(1000), wal_path)
+    print(qm2.stu_queue.entries() == state[0])
+    print(qm2.tut_queue.entries() == state[1])
+    print(sorted(qm2.bunny.uid_tbl) == state[2])
+    print(qm2.bunny.fetch_user(tut0.uid).helped == tut0.helped)
+    print(qm2.wait_starts[stus[4].uid] == 1000 - 120)
+    print(qm2.bunny.fetch_events() == [])
+    # and again from the snapshot written on recovery, plus a short log
+    qm2.stu_ask_q(stus[1])
+    state = (qm2.stu_queue.entries(), qm2.tut_queue.entries())
+    qm2.close()
+    qm3 = QueueManager(MemTransport(), ":memory:", VirtualClock(), wal_path)
+    print((qm3.stu_queue.entries(), qm3.tut_queue.entries()) == state)
+    print(qm3.wal.since_snap == 0)
+    # asks from unknown students aren't logged, and the log still opens
+    print(qm3.stu_ask_q("stu_nobody") == None)
+    print(not("stu_nobody" in qm3.stu_queue))
+    qm3.close()
+    # and a record that can't be applied is dropped instead of failing
+    with open(wal_path, "a", encoding="utf-8") as fptr:
+        fptr.write('{"n":1000000,"op":"ask","t":0}\n')
+    qm4 = QueueManager(MemTransport(), ":memory:", VirtualClock(), wal_path)
+    print(qm4.stu_queue.entries() == state[0])
+    qm4.close()
+
+    # a "done" from a tutor that isn't helping anyone changes nothing
+    print("##### Done commands #####")
+    qm = QueueManager(MemTransport(), ":memory:", VirtualClock())
+    tut0 = qm.register_tut("tut0001", "pass", "Tutor", "A", "SLI")
+    stu0 = qm.register_stu("aic4242", "pass", "Alice", "in Chains")
+    print(qm.tut_ans_q(tut0) == tut0.uid)
+    print(qm.tut_ans_q(tut0) == None)
+    print(qm.tut_ans_q("tut_nobody") == None)
+    print(tut0.stats.stat_count("q_count") == 1)
+    print([kind for ts, kind, uid, peer_uid
+        in qm.bunny.fetch_events(uid=tut0)] == [EVENT_LOGIN, EVENT_HELP,
+        EVENT_DONE])
+    qm.close()
     #print(tut0 == qm.deregister_user(tut0))
     #print(stu0 == qm.deregister_user(stu0))
 
 
 if __name__ == "__main__":
+    # packages only used for testing purposes
+    import os
+    import tempfile
+    from transport.mem_transport import MemTransport
     main()
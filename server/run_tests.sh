@@ -42,33 +42,58 @@ fi
 
 if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 4 ]; then
     echo "###################### TEST 4: Bunny Class ######################"
-    # start the RabbitMQ server for this test
-    ./utils/rmq.sh "start"
-    # Rabbit MQ server command failed
-    if [ "$?" -ne 0 ]; then
-        echo "ERROR: Rabbit MQ Server Failure!"
-        exit 42
-    fi
-
+    # devices are reached through an in-process broker; no RabbitMQ needed
     python3 -m utils.bunny
-
-    # kill the RabbitMQ server
-    ./utils/rmq.sh "stop"
 fi
 
 if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 5 ]; then
     echo "###################### TEST 5: QueueManager ######################"
-    # start the RabbitMQ server for this test
-    ./utils/rmq.sh "start"
-    # Rabbit MQ server command failed
-    if [ "$?" -ne 0 ]; then
-        echo "ERROR: Rabbit MQ Server Failure!"
-        exit 42
-    fi
-
+    # devices are reached through an in-process broker; no RabbitMQ needed
     python3 -m queue_manager
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 6 ]; then
+    echo "###################### TEST 6: Fenwick Tree ######################"
+    python3 -m utils.fenwick_tree
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 7 ]; then
+    echo "###################### TEST 7: LRU Cache ######################"
+    python3 -m utils.lru_cache
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 8 ]; then
+    echo "###################### TEST 8: Message Registry ######################"
+    python3 -m utils.msg_registry
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 9 ]; then
+    echo "###################### TEST 9: Message Codecs ######################"
+    python3 -m utils.codec
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 10 ]; then
+    echo "###################### TEST 10: In-Memory Transport ######################"
+    python3 -m transport.mem_transport
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 11 ]; then
+    echo "###################### TEST 11: Metrics ######################"
+    python3 -m utils.metrics
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 12 ]; then
+    echo "###################### TEST 12: Clocks ######################"
+    python3 -m utils.clock
+fi
+
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 13 ]; then
+    echo "###################### TEST 13: Estimators ######################"
+    python3 -m utils.estimators
+fi
 
-    # kill the RabbitMQ server
-    ./utils/rmq.sh "stop"
+if [ "${test_id}" -eq 0 ] || [ "${test_id}" -eq 14 ]; then
+    echo "###################### TEST 14: Queue Write-Ahead Log ######################"
+    python3 -m utils.queue_wal
 fi
 echo "######################  END TESTS  ######################"
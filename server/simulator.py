@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+##
+## File:    simulator.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Discrete-event simulator for tutor staffing. Simulated
+##              evenings (see utils/load_gen.py) are run through the real
+##              server, QueueManager and queues on a virtual clock and an
+##              in-process broker, so an evening takes a fraction of a second
+##              instead of hours. Reports how long students waited for each
+##              number of tutors on duty
+##
+## Usage:       python3 simulator.py [-h] [-e EVENINGS] [-s STUDENTS]
+##                  [-t TUTORS [TUTORS ...]] [--service SECONDS] [-j JOBS]
+##
+
+# Python libraries
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# project libraries
+from utils.macros import *
+from utils.clock import VirtualClock
+from utils.load_gen import LoadGen, percentile
+from transport.mem_transport import MemBroker, MemTransport
+import mmcga_server
+
+#### GLOBALS    ####
+
+#### FUNCTIONS  ####
+
+def simulate_evening(tutors, seed, students=LOAD_STUDENTS,
+        service_time=LOAD_SERVICE_TIME):
+    '''
+    Simulates a single evening
+    :param: tutors Number of tutors on duty
+    :param: seed Random seed of the evening; evenings with the same seed see
+            the same students, whatever the staffing level
+    :param: students Number of students that show up
+    :param: service_time Mean session length, in seconds
+    :return: List of the times (seconds) students waited to be helped
+    '''
+    clock = VirtualClock()
+    broker = MemBroker()
+    queue_manager = mmcga_server.init_server(MemTransport(broker), ":memory:",
+        clock)
+    mmcga_server.start_blocking()
+
+    def pump():
+        while (mmcga_server.poll_blocking(0) > 0):
+            pass
+
+    # position checks don't change anyone's wait, so they are skipped
+    gen = LoadGen(broker, students, tutors, service_time=service_time,
+        poll_time=0, seed=seed, clock=clock).run(pump)
+    queue_manager.close()
+    return gen.waits
+
+def simulate_staffing(staffing, evenings, students, service_time, jobs):
+    '''
+    Simulates every staffing level over the same set of evenings
+    :param: staffing List of numbers of tutors on duty
+    :param: evenings Number of evenings per staffing level
+    :param: students Number of students that show up each evening
+    :param: service_time Mean session length, in seconds
+    :param: jobs Number of worker processes
+    :return: Dictionary of staffing level -> list of waits over all evenings
+    '''
+    waits = dict((tutors, []) for tutors in staffing)
+    tasks = [(tutors, seed) for tutors in staffing
+        for seed in range(0, evenings)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [(tutors, pool.submit(simulate_evening, tutors, seed,
+            students, service_time)) for tutors, seed in tasks]
+        for tutors, future in futures:
+            waits[tutors] += future.result()
+    return waits
+
+def report(waits, target):
+    '''
+    Prints a table of wait times per staffing level
+    :param: waits Dictionary of staffing level -> list of waits
+    :param: target Waits longer than this many seconds are counted
+    '''
+    print("{:>7}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}".format("tutors",
+        "mean", "p50", "p90", "p99", "max", "> " + str(target // 60)
+        + " min"))
+    for tutors in sorted(waits):
+        w = waits[tutors]
+        if (len(w) == 0):
+            continue
+        over = sum(1 for wait in w if wait > target) / len(w)
+        print("{:>7}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}{:>11.1f}%"
+            .format(tutors, sum(w) / len(w) / 60,
+            percentile(w, 50) / 60, percentile(w, 90) / 60,
+            percentile(w, 99) / 60, max(w) / 60, over * 100))
+    print("(wait times in minutes)")
+
+#### MAIN       ####
+
+def main():
+    '''
+    Main execution point of the program
+    '''
+    parser = argparse.ArgumentParser(
+        description="Simulates Mentoring Center evenings to size tutor shifts")
+    parser.add_argument("-e", "--evenings", type=int, default=SIM_EVENINGS,
+        help="evenings simulated per staffing level")
+    parser.add_argument("-s", "--students", type=int, default=LOAD_STUDENTS,
+        help="students that show up each evening")
+    parser.add_argument("-t", "--tutors", type=int, nargs="+",
+        default=SIM_STAFFING, help="numbers of tutors on duty to compare")
+    parser.add_argument("--service", type=float, default=LOAD_SERVICE_TIME,
+        help="mean session length, in seconds")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+        help="worker processes")
+    args = parser.parse_args()
+
+    print("Simulating " + str(args.evenings) + " evenings of "
+        + str(args.students) + " students for " + str(len(args.tutors))
+        + " staffing levels...")
+    start = time.perf_counter()
+    waits = simulate_staffing(args.tutors, args.evenings, args.students,
+        args.service, args.jobs)
+    elapsed = time.perf_counter() - start
+    report(waits, SIM_WAIT_TARGET)
+    print("Simulated " + str(args.evenings * len(args.tutors))
+        + " evenings in {:.1f} sec".format(elapsed))
+
+if __name__ == "__main__":
+    main()
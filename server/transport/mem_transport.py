@@ -0,0 +1,325 @@
+##
+## File:    mem_transport.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that implement the Transport interface on top
+##              of an in-process message broker. This lets the whole server
+##              loop be driven, tested and benchmarked in a single process on
+##              a machine without RabbitMQ
+##
+
+# Python libraries
+import threading
+import time
+from collections import deque, OrderedDict
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+from transport.transport import Transport
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class MemBroker:
+    '''
+    MemBroker object, an in-process stand-in for the RabbitMQ server. It
+    holds named message queues that any number of MemTransports (and test
+    clients) publish to and read from; it is safe to use from multiple threads
+    '''
+
+    def __init__(self):
+        '''
+        Constructs an empty MemBroker
+        '''
+        # queue name -> deque of (message body, content type)
+        self.queues = {}
+        # guards the queues; consumers wait on it for messages to arrive
+        self.cond = threading.Condition()
+        # names of the queues that have messages waiting
+        self.ready = set()
+        # number of messages published, ever
+        self.published = 0
+
+    def __str__(self):
+        '''
+        Converts broker to a string equivalent
+        '''
+        with self.cond:
+            result = "===== MemBroker =====\n"
+            for msg_queue in self.queues:
+                result += (msg_queue + ": " + str(len(self.queues[msg_queue]))
+                    + " messages\n")
+        return result
+
+    def __queue(self, msg_queue):
+        '''
+        Fetches a message queue, building it the first time it is used; the
+        caller must hold the lock
+        :param: msg_queue Name of the queue
+        :return: deque of the queue's messages
+        '''
+        if not(msg_queue in self.queues):
+            self.queues[msg_queue] = deque()
+        return self.queues[msg_queue]
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Adds a message to the back of a queue
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send; text is sent as UTF-8 bytes, the
+                way RabbitMQ would deliver it
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        if (isinstance(body, str)):
+            body = body.encode("utf-8")
+        with self.cond:
+            self.__queue(msg_queue).append((body, content_type))
+            self.ready.add(msg_queue)
+            self.published += 1
+            self.cond.notify_all()
+
+    def requeue(self, msg_queue, msgs):
+        '''
+        Puts messages back at the front of a queue, keeping their order
+        :param: msg_queue Message queue the messages came from
+        :param: msgs List of (message body, content type) pairs
+        '''
+        with self.cond:
+            self.__queue(msg_queue).extendleft(reversed(msgs))
+            if (len(msgs) > 0):
+                self.ready.add(msg_queue)
+            self.cond.notify_all()
+
+    def take(self, msg_queue, count):
+        '''
+        Removes messages from the front of a queue
+        :param: msg_queue Message queue to read from
+        :param: count Maximum number of messages to remove
+        :return: List of (message body, content type) pairs
+        '''
+        msgs = []
+        with self.cond:
+            q = self.__queue(msg_queue)
+            while ((len(msgs) < count) and (len(q) > 0)):
+                msgs.append(q.popleft())
+            if (len(q) == 0):
+                self.ready.discard(msg_queue)
+        return msgs
+
+    def get(self, msg_queue):
+        '''
+        Removes a single message from the front of a queue, without any
+        acknowledgement; used by test clients to read their replies
+        :param: msg_queue Message queue to read from
+        :return: (message body, content type) or None if the queue is empty
+        '''
+        msgs = self.take(msg_queue, 1)
+        if (len(msgs) == 0):
+            return None
+        return msgs[0]
+
+    def pending(self):
+        '''
+        Lists the queues that have messages waiting, without scanning every
+        queue; used by test clients to find the replies they were sent
+        :return: List of queue names
+        '''
+        with self.cond:
+            return list(self.ready)
+
+    def depth(self, msg_queue):
+        '''
+        Returns the number of messages waiting on a queue
+        :param: msg_queue Message queue to check
+        :return: Number of waiting messages
+        '''
+        with self.cond:
+            if not(msg_queue in self.queues):
+                return 0
+            return len(self.queues[msg_queue])
+
+    def wait(self, msg_queue, time_limit):
+        '''
+        Waits for a queue to have messages waiting
+        :param: msg_queue Message queue to wait on
+        :param: time_limit Longest time to wait, in seconds
+        :return: True if the queue has messages, False otherwise
+        '''
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: len(self.__queue(msg_queue)) > 0, time_limit)
+
+class MemTransport(Transport):
+    '''
+    MemTransport object, a Transport that talks to a MemBroker. Consuming
+    follows RabbitMQ's rules: at most `prefetch` messages are un-acked at a
+    time, and un-acked messages go back on their queue when the transport is
+    closed
+    '''
+
+    def __init__(self, broker=None):
+        '''
+        Constructs a MemTransport
+        :param: broker MemBroker to talk to; a new one is built if not given
+        '''
+        self.broker = broker if (broker != None) else MemBroker()
+        # consumer state, set up by consume()
+        self.msg_queue = None
+        self.callback = None
+        self.prefetch = 0
+        self.consuming = False
+        # delivery tag -> (message body, content type), in delivery order
+        self.unacked = OrderedDict()
+        self.next_tag = 1
+        # number of messages dropped by nack()
+        self.dropped = 0
+
+    def __str__(self):
+        '''
+        Converts transport to a string equivalent
+        '''
+        return ("MemTransport(" + str(self.msg_queue) + ", "
+            + str(len(self.unacked)) + " un-acked)")
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Publishes a message to a specific message queue
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        self.broker.publish(msg_queue, body, content_type)
+
+    def consume(self, msg_queue, callback, prefetch=SERVER_PREFETCH):
+        '''
+        Starts consuming a message queue with manual acknowledgements
+        :param: msg_queue Message queue to consume
+        :param: callback Function called as
+                callback(delivery tag, message body, content type)
+        :param: prefetch Maximum number of un-acked messages handed over
+        '''
+        self.msg_queue = msg_queue
+        self.callback = callback
+        self.prefetch = max(1, prefetch)
+        self.consuming = True
+        printd("MemTransport consuming " + msg_queue)
+
+    def process_events(self, time_limit=0):
+        '''
+        Delivers waiting messages to the consumer callback, waiting up to
+        time_limit seconds for messages if there are none
+        :param: time_limit Longest time to wait, in seconds
+        :return: Number of messages delivered
+        '''
+        room = self.prefetch - len(self.unacked)
+        # nothing can be delivered; wait out the time limit like a real
+        # connection would, so polling loops don't spin
+        if (not(self.consuming) or (room <= 0)):
+            if (time_limit > 0):
+                time.sleep(time_limit)
+            return 0
+        if ((time_limit > 0)
+                and not(self.broker.wait(self.msg_queue, time_limit))):
+            return 0
+        msgs = self.broker.take(self.msg_queue, room)
+        # hand messages over outside the broker's lock; handlers publish
+        for body, content_type in msgs:
+            delivery_tag = self.next_tag
+            self.next_tag += 1
+            self.unacked[delivery_tag] = (body, content_type)
+            self.callback(delivery_tag, body, content_type)
+        return len(msgs)
+
+    def ack(self, delivery_tag, multiple=False):
+        '''
+        Acknowledges a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: multiple If True, also acknowledges every earlier message
+        '''
+        if not(delivery_tag in self.unacked):
+            raise ValueError("Unknown delivery tag " + str(delivery_tag))
+        if not(multiple):
+            del self.unacked[delivery_tag]
+            return
+        while (len(self.unacked) > 0):
+            tag, msg = self.unacked.popitem(last=False)
+            if (tag == delivery_tag):
+                break
+
+    def nack(self, delivery_tag, requeue=False):
+        '''
+        Rejects a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: requeue If True, the message is put back on its queue,
+                otherwise it is dropped
+        '''
+        if not(delivery_tag in self.unacked):
+            raise ValueError("Unknown delivery tag " + str(delivery_tag))
+        msg = self.unacked.pop(delivery_tag)
+        if (requeue):
+            self.broker.requeue(self.msg_queue, [msg])
+        else:
+            self.dropped += 1
+
+    def cancel(self):
+        '''
+        Stops consuming. Messages already delivered can still be acked
+        '''
+        self.consuming = False
+
+    def close(self):
+        '''
+        Stops consuming and puts every un-acked message back on its queue
+        '''
+        self.cancel()
+        if (len(self.unacked) > 0):
+            self.broker.requeue(self.msg_queue, list(self.unacked.values()))
+            self.unacked.clear()
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    broker = MemBroker()
+    server = MemTransport(broker)
+    client = MemTransport(broker)
+    received = []
+    for i in range(0, 5):
+        client.publish("q", "msg" + str(i), CONTENT_TYPE_JSON)
+    server.consume("q", lambda tag, body, ctype: received.append(tag),
+        prefetch=2)
+    print("##### Prefetch commands #####")
+    print(server.process_events() == 2)
+    print(server.process_events() == 0)
+    print(broker.depth("q") == 3)
+    print("##### Ack commands #####")
+    server.ack(2, multiple=True)
+    print(server.process_events() == 2)
+    server.nack(3, requeue=True)
+    server.nack(4)
+    print((server.dropped == 1) and (broker.depth("q") == 2))
+    print(server.process_events() == 2)
+    print(received == [1, 2, 3, 4, 5, 6])
+    print("##### Close commands #####")
+    server.close()
+    print(broker.depth("q") == 2)
+    print(broker.get("q") == (b"msg2", CONTENT_TYPE_JSON))
+    print(broker.pending() == ["q"])
+    broker.take("q", 10)
+    print(broker.pending() == [])
+    print(server.process_events(0.01) == 0)
+    print("##### Wait commands #####")
+    waiter = MemTransport(broker)
+    waiter.consume("w", lambda tag, body, ctype: received.append(body))
+    print(waiter.process_events(0.01) == 0)
+    threading.Timer(0.01, client.publish, ("w", b"late")).start()
+    print(waiter.process_events(1.0) == 1)
+    print(received[-1] == b"late")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+##
+## File:    pika_transport.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that implements the Transport interface on top
+##              of a RabbitMQ server, using pika
+##
+
+# Python libraries
+import pika
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+from utils.rmq_pool import RMQPool
+from transport.transport import Transport
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class PikaTransport(Transport):
+    '''
+    PikaTransport object, talks to a RabbitMQ server. Out-going messages are
+    published through a pooled connection (RMQPool); consuming uses a second
+    connection of its own, so the two sides can run on different threads
+    '''
+
+    def __init__(self, host=SERVER_HOST, exchange=""):
+        '''
+        Constructs a PikaTransport. No connection is made until the first
+        message is published or consume() is called
+        :param: host Host name of the RabbitMQ server
+        :param: exchange RabbitMQ exchange to publish messages to
+        '''
+        self.host = host
+        # long-lived publisher connection; all out-going messages share it
+        self.publisher = RMQPool(host, exchange)
+        # consumer connection and channel, built by consume()
+        self.socket = None
+        self.channel = None
+        self.consumer_tag = None
+        # messages delivered by the current process_events() call
+        self.delivered = 0
+
+    def __str__(self):
+        '''
+        Converts transport to a string equivalent
+        '''
+        return "PikaTransport(" + self.host + ", " + str(self.publisher) + ")"
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Publishes a message to a specific message queue
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        self.publisher.publish(msg_queue, body, content_type)
+
+    def publish_batch(self, msgs):
+        '''
+        Publishes a batch of messages back-to-back on a single warm channel
+        :param: msgs List of (message queue, message body) pairs or
+                (message queue, message body, content type) triples to send
+        '''
+        self.publisher.publish_batch(msgs)
+
+    def consume(self, msg_queue, callback, prefetch=SERVER_PREFETCH):
+        '''
+        Starts consuming a message queue with manual acknowledgements
+        :param: msg_queue Message queue to consume
+        :param: callback Function called as
+                callback(delivery tag, message body, content type)
+        :param: prefetch Maximum number of un-acked messages handed over
+        '''
+        if (self.socket == None):
+            self.socket = pika.BlockingConnection(
+                pika.ConnectionParameters(self.host))
+            self.channel = self.socket.channel()
+        # building this queue for the first time, if need be
+        self.channel.queue_declare(queue=msg_queue)
+        # bound the number of un-acked messages RabbitMQ pushes to us
+        self.channel.basic_qos(prefetch_count=prefetch)
+
+        def on_msg(ch, method, properties, body):
+            self.delivered += 1
+            callback(method.delivery_tag, body, properties.content_type)
+
+        self.consumer_tag = self.channel.basic_consume(on_msg,
+            queue=msg_queue,
+            no_ack=False)
+        printd("PikaTransport consuming " + msg_queue)
+
+    def process_events(self, time_limit=0):
+        '''
+        Delivers waiting messages to the consumer callback, waiting up to
+        time_limit seconds for messages if there are none
+        :param: time_limit Longest time to wait, in seconds
+        :return: Number of messages delivered
+        '''
+        self.delivered = 0
+        self.socket.process_data_events(time_limit=time_limit)
+        return self.delivered
+
+    def ack(self, delivery_tag, multiple=False):
+        '''
+        Acknowledges a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: multiple If True, also acknowledges every earlier message
+        '''
+        self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+
+    def nack(self, delivery_tag, requeue=False):
+        '''
+        Rejects a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: requeue If True, the message is put back on its queue,
+                otherwise it is dropped
+        '''
+        self.channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def cancel(self):
+        '''
+        Stops consuming. Messages already delivered can still be acked
+        '''
+        if (self.consumer_tag != None):
+            self.channel.basic_cancel(self.consumer_tag)
+            self.consumer_tag = None
+
+    def close(self):
+        '''
+        Closes the publisher and consumer connections
+        '''
+        self.publisher.close()
+        if ((self.socket != None) and self.socket.is_open):
+            self.socket.close()
+        self.socket = None
+        self.channel = None
+        self.consumer_tag = None
@@ -0,0 +1,103 @@
+##
+## File:    transport.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that defines the interface the server uses to
+##              talk to a message broker. The server only ever goes through
+##              this interface, so it can run on RabbitMQ or on an in-process
+##              broker without any other changes
+##
+
+# project libraries
+from utils.macros import *
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class Transport:
+    '''
+    Transport object, the interface to a message broker. Messages are
+    published to named queues, and a single queue can be consumed with manual
+    acknowledgements and a bounded prefetch window
+    Publishing may happen on a different thread than consuming, but each side
+    must only ever be used by one thread at a time
+    '''
+
+    def __str__(self):
+        '''
+        Converts transport to a string equivalent
+        '''
+        return type(self).__name__
+
+    ## Publishing ##
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Publishes a message to a specific message queue
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        raise NotImplementedError
+
+    def publish_batch(self, msgs):
+        '''
+        Publishes a batch of messages, in order
+        :param: msgs List of (message queue, message body) pairs or
+                (message queue, message body, content type) triples to send
+        '''
+        for msg in msgs:
+            self.publish(*msg)
+
+    ## Consuming ##
+
+    def consume(self, msg_queue, callback, prefetch=SERVER_PREFETCH):
+        '''
+        Starts consuming a message queue. Messages are handed to the callback
+        from inside process_events() and must be acked (or nacked) once handled
+        :param: msg_queue Message queue to consume
+        :param: callback Function called as
+                callback(delivery tag, message body, content type)
+        :param: prefetch Maximum number of un-acked messages handed over
+        '''
+        raise NotImplementedError
+
+    def process_events(self, time_limit=0):
+        '''
+        Delivers waiting messages to the consumer callback, waiting up to
+        time_limit seconds for messages if there are none
+        :param: time_limit Longest time to wait, in seconds
+        :return: Number of messages delivered
+        '''
+        raise NotImplementedError
+
+    def ack(self, delivery_tag, multiple=False):
+        '''
+        Acknowledges a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: multiple If True, also acknowledges every earlier message
+        '''
+        raise NotImplementedError
+
+    def nack(self, delivery_tag, requeue=False):
+        '''
+        Rejects a consumed message
+        :param: delivery_tag Delivery tag of the message
+        :param: requeue If True, the message is put back on its queue,
+                otherwise it is dropped
+        '''
+        raise NotImplementedError
+
+    def cancel(self):
+        '''
+        Stops consuming. Messages already delivered can still be acked
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        '''
+        Releases the transport's connections
+        '''
+        pass
@@ -4,12 +4,270 @@
 ## Author:  Schuyler Martin <sam8050@rit.edu>
 ##
 ## Description: Python class that defines a Student Queue data structure for
-##              the server. For now there will only be one Queue of students,
-##              but there could be one per Tutor later on
+##              the server. There is one line of students, split into
+##              per-course sub-queues so tutors can be routed to the students
+##              they are able to help. Students are helped in FIFO order, or
+##              in priority order with aging if the queue is in priority mode
 ##
 
+import heapq
+from bisect import bisect_left
+from collections import OrderedDict, deque
+
 from users.student import Student
 from users.user import User
+from utils.clock import Clock
+from utils.fenwick_tree import FenwickTree
+from utils.macros import QUEUE_RANK_MIN_SIZE, QUEUE_AGING_WEIGHT, \
+    QUEUE_PRIORITY_MAX, QUEUE_HEAP_MIN_SIZE
+
+class _FifoLine:
+    '''
+    FIFO line of queue entries, used for each course sub-queue of a FIFO
+    queue. Entries are ranked by their sequence number
+    '''
+
+    def __init__(self):
+        '''
+        Line constructor
+        '''
+        # arrival sequence number -> Student UID, in arrival order
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        '''
+        Returns the number of entries in the line
+        '''
+        return len(self.entries)
+
+    def push(self, seq, stu_uid, key):
+        '''
+        Adds an entry to the back of the line
+        :param: seq Sequence number of the entry
+        :param: stu_uid Student UID of the entry
+        :param: key Priority key of the entry; unused, the line is FIFO
+        '''
+        self.entries[seq] = stu_uid
+
+    def head(self):
+        '''
+        Returns the rank of the entry at the front of the line
+        :return: Sequence number of the front entry or None if empty
+        '''
+        if (len(self.entries) > 0):
+            return next(iter(self.entries))
+        return None
+
+    def front(self):
+        '''
+        Returns the entry at the front of the line
+        :return: Sequence number of the front entry
+        '''
+        return next(iter(self.entries))
+
+    def remove(self, seq):
+        '''
+        Removes an entry from anywhere in the line
+        :param: seq Sequence number of the entry
+        '''
+        del self.entries[seq]
+
+class _HeapLine:
+    '''
+    Priority line of queue entries, used for each course sub-queue of a
+    priority queue. Entries are ranked by (priority key, sequence number) in a
+    binary heap; removals from the middle of the line are lazy, so pushes,
+    pops and removals are all O(log n) amortized
+    '''
+
+    def __init__(self):
+        '''
+        Line constructor
+        '''
+        # heap of (priority key, sequence number), including removed entries
+        self.heap = []
+        # entries still in line (sequence number -> priority key)
+        self.live = {}
+
+    def __len__(self):
+        '''
+        Returns the number of entries in the line
+        '''
+        return len(self.live)
+
+    def __prune(self):
+        '''
+        Drops removed entries from the top of the heap
+        '''
+        while ((len(self.heap) > 0) and not(self.heap[0][1] in self.live)):
+            heapq.heappop(self.heap)
+
+    def push(self, seq, stu_uid, key):
+        '''
+        Adds an entry to the line
+        :param: seq Sequence number of the entry
+        :param: stu_uid Student UID of the entry
+        :param: key Priority key of the entry; smaller keys are helped first
+        '''
+        heapq.heappush(self.heap, (key, seq))
+        self.live[seq] = key
+
+    def head(self):
+        '''
+        Returns the rank of the entry at the front of the line
+        :return: (priority key, sequence number) of the front entry or None
+                 if empty
+        '''
+        self.__prune()
+        if (len(self.heap) > 0):
+            return self.heap[0]
+        return None
+
+    def front(self):
+        '''
+        Returns the entry at the front of the line
+        :return: Sequence number of the front entry
+        '''
+        self.__prune()
+        return self.heap[0][1]
+
+    def remove(self, seq):
+        '''
+        Removes an entry from anywhere in the line. The entry stays in the heap
+        until it reaches the top, or until removed entries make up most of the
+        heap and it is rebuilt
+        :param: seq Sequence number of the entry
+        '''
+        del self.live[seq]
+        if (len(self.heap) > max(QUEUE_HEAP_MIN_SIZE, 2 * len(self.live))):
+            self.heap = [(key, seq) for seq, key in self.live.items()]
+            heapq.heapify(self.heap)
+
+class _KeyChain:
+    '''
+    Chain of priority queue entries, sorted by (priority key, sequence
+    number). Entries are only ever appended, so the chain stays sorted; a
+    Fenwick tree over chain positions marks the entries still in line
+    '''
+
+    def __init__(self):
+        '''
+        Chain constructor
+        '''
+        # (priority key, sequence number) of every entry, including removed
+        # entries until the chain is rebuilt
+        self.ranks = []
+        # position in the chain of every entry still in line
+        self.index = {}
+        self.live = FenwickTree(QUEUE_RANK_MIN_SIZE)
+
+    def __len__(self):
+        '''
+        Returns the number of entries of the chain still in line
+        '''
+        return len(self.index)
+
+    def __rebuild(self):
+        '''
+        Rebuilds the chain once it runs past the end of its tree. Removed
+        entries are dropped and the tree is sized to twice the entries left,
+        so rebuilds cost O(1) amortized per push
+        '''
+        self.ranks = [rank for rank in self.ranks if (rank[1] in self.index)]
+        self.index = dict((rank[1], pos)
+            for pos, rank in enumerate(self.ranks))
+        values = [0] * max(QUEUE_RANK_MIN_SIZE, 2 * len(self.ranks))
+        for pos in range(0, len(self.ranks)):
+            values[pos] = 1
+        self.live = FenwickTree(values=values)
+
+    def last(self):
+        '''
+        Returns the largest priority key in the chain
+        :return: Priority key of the last entry appended
+        '''
+        return self.ranks[-1][0]
+
+    def push(self, key, seq):
+        '''
+        Appends an entry; its key must be no smaller than last()
+        :param: key Priority key of the entry
+        :param: seq Sequence number of the entry
+        '''
+        if (len(self.ranks) >= self.live.size):
+            self.__rebuild()
+        self.index[seq] = len(self.ranks)
+        self.live.add(len(self.ranks), 1)
+        self.ranks.append((key, seq))
+
+    def remove(self, seq):
+        '''
+        Removes an entry
+        :param: seq Sequence number of the entry
+        '''
+        self.live.add(self.index.pop(seq), -1)
+
+    def count_before(self, rank):
+        '''
+        Counts the entries still in line that are ahead of a rank, in
+        O(log n)
+        :param: rank (priority key, sequence number) to compare against
+        :return: Number of entries with a smaller rank
+        '''
+        return self.live.prefix_sum(bisect_left(self.ranks, rank) - 1)
+
+class _KeyRanks:
+    '''
+    Order-statistics structure over the ranks of a priority queue's entries,
+    used to answer "what's my position" in O(log n). Keys are the push time
+    less priority * aging weight, so the entries of each priority level are
+    pushed in key order. An entry is appended to the chain with the largest
+    last key that isn't bigger than its own, which keeps the number of chains
+    no larger than the number of priority levels in use
+    '''
+
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self.chains = []
+        # chain of every entry (sequence number -> _KeyChain)
+        self.where = {}
+
+    def push(self, key, seq):
+        '''
+        Adds an entry
+        :param: key Priority key of the entry
+        :param: seq Sequence number of the entry
+        '''
+        best = None
+        for chain in self.chains:
+            if ((chain.last() <= key)
+                    and ((best == None) or (chain.last() > best.last()))):
+                best = chain
+        if (best == None):
+            best = _KeyChain()
+            self.chains.append(best)
+        best.push(key, seq)
+        self.where[seq] = best
+
+    def remove(self, seq):
+        '''
+        Removes an entry
+        :param: seq Sequence number of the entry
+        '''
+        chain = self.where.pop(seq)
+        chain.remove(seq)
+        if (len(chain) == 0):
+            self.chains.remove(chain)
+
+    def count_before(self, rank):
+        '''
+        Counts the entries that are ahead of a rank
+        :param: rank (priority key, sequence number) to compare against
+        :return: Number of entries with a smaller rank
+        '''
+        return sum(chain.count_before(rank) for chain in self.chains)
 
 class QueueStu:
     '''
@@ -17,23 +275,55 @@ class QueueStu:
     Manages who's next based on who currently has unanswered questions
     '''
 
-    def __init__(self, name):
+    def __init__(self, name, priority=False, clock=None,
+            aging_weight=QUEUE_AGING_WEIGHT):
         '''
         Queue constructor
         :param: name Name of the queue
+        :param: priority Optional parameter that puts the queue in priority
+                mode. Students with a higher priority are helped earlier, but
+                every student "ages" as they wait, so nobody starves
+        :param: clock Clock used to age students in priority mode; the system
+                clock by default
+        :param: aging_weight Seconds of waiting that one priority level is
+                worth in priority mode
         '''
         self.name = name
-        # queue implementation is a Python list
-        self.queue = []
+        self.priority = priority
+        self.clock = clock if (clock != None) else Clock()
+        self.aging_weight = aging_weight
+        # queue implementation is an ordered dictionary that maps the arrival
+        # sequence number of each entry to a Student UID. This keeps arrival
+        # ordering while allowing O(1) pushes, pops and removals from the
+        # middle of the line
+        self.queue = OrderedDict()
+        # index of the entries each student has in the queue (UID -> FIFO of
+        # sequence numbers), giving O(1) membership checks and purges
+        self.index = {}
+        # per-course sub-queues (course ID -> _FifoLine or _HeapLine);
+        # questions without a course are under "". The front of the queue is
+        # the lowest-ranked front of a sub-queue. Only courses with students
+        # waiting have a sub-queue
+        self.courses = {}
+        # course ID of every entry in the queue (sequence number -> course ID)
+        self.entry_course = {}
         # total "life time" count of students who have entered the queue
+        # this also serves as the sequence number of the next entry
         self.lt_count = 0
+        # order-statistics tree over sequence numbers (1 if that entry is
+        # still in line) used to answer "what's my position" in O(log n)
+        # position i of the tree tracks sequence number rank_base + i
+        self.rank_base = 0
+        self.ranks = FenwickTree(QUEUE_RANK_MIN_SIZE)
+        # in priority mode, the same over (priority key, sequence number)
+        self.key_ranks = _KeyRanks()
 
     def __str__(self):
         '''
         Converts queue to a string equivalent
         '''
         result = "===== " + self.name + " =====\n"
-        for stu in self.queue:
+        for stu in self.queue.values():
             result += str(stu) + "\n"
         return result
 
@@ -44,7 +334,78 @@ class QueueStu:
         :return: True if the UID is found, False otherwise
         '''
         uid = User.get_uid(uid)
-        return uid in self.queue
+        return uid in self.index
+
+    def __unindex(self, stu_uid, seq):
+        '''
+        Removes an entry from the per-student index
+        :param: stu_uid UID of the student the entry belongs to
+        :param: seq Sequence number of the entry
+        '''
+        seqs = self.index[stu_uid]
+        # entries leave in FIFO order, so this is almost always the front
+        if (seqs[0] == seq):
+            seqs.popleft()
+        else:
+            seqs.remove(seq)
+        if (len(seqs) == 0):
+            del self.index[stu_uid]
+
+    def __remove(self, seq):
+        '''
+        Removes an entry from the queue and every index of it
+        :param: seq Sequence number of the entry
+        :return: Student UID of the entry
+        '''
+        stu_uid = self.queue.pop(seq)
+        self.__unindex(stu_uid, seq)
+        self.ranks.add(seq - self.rank_base, -1)
+        course_id = self.entry_course.pop(seq)
+        line = self.courses[course_id]
+        line.remove(seq)
+        if (self.priority):
+            self.key_ranks.remove(seq)
+        if (len(line) == 0):
+            del self.courses[course_id]
+        return stu_uid
+
+    def __rank(self, seq):
+        '''
+        Finds the rank of an entry; lower ranks are helped first
+        :param: seq Sequence number of the entry
+        :return: Rank of the entry, comparable with those of other entries
+        '''
+        if (self.priority):
+            return self.courses[self.entry_course[seq]].live[seq], seq
+        return seq
+
+    def __front(self):
+        '''
+        Finds the entry at the front of the queue
+        :return: Sequence number of the entry
+        '''
+        # in FIFO mode the earliest arrival is always next
+        if not(self.priority):
+            return next(iter(self.queue))
+        rank, course_id = min((line.head(), course_id)
+            for course_id, line in self.courses.items())
+        return self.courses[course_id].front()
+
+    def __rank_rebuild(self):
+        '''
+        Rebuilds the rank tree once sequence numbers run past its end. The
+        tree is re-based at the front of the line and sized to twice the
+        current span so rebuilds cost O(1) amortized per push
+        '''
+        if (self.is_empty()):
+            self.rank_base = self.lt_count
+        else:
+            self.rank_base = next(iter(self.queue))
+        span = self.lt_count - self.rank_base + 1
+        values = [0] * max(QUEUE_RANK_MIN_SIZE, 2 * span)
+        for seq in self.queue:
+            values[seq - self.rank_base] = 1
+        self.ranks = FenwickTree(values=values)
 
     def len(self):
         '''
@@ -66,7 +427,7 @@ class QueueStu:
         :return: Student UID at the top of the queue or None if empty
         '''
         if not(self.is_empty()):
-            return self.queue[0]
+            return self.queue[self.__front()]
         else:
             return None
 
@@ -76,46 +437,160 @@ class QueueStu:
         :return: Student UID at the top of the queue or None if empty
         '''
         if not(self.is_empty()):
-            return self.queue.pop(0)
+            return self.__remove(self.__front())
         else:
             return None
 
-    def push(self, stu_uid):
+    def heads(self):
+        '''
+        Lists the front of every course sub-queue, next to be helped first
+        :return: List of (rank, course ID) pairs; the entry with the lowest
+                 rank is helped first
+        '''
+        return sorted((line.head(), course_id)
+            for course_id, line in self.courses.items())
+
+    def head(self, course_id=""):
+        '''
+        Returns the rank of the front of a course's sub-queue
+        :param: course_id Course ID; "" for questions without a course
+        :return: Rank, comparable with those from heads(), or None if nobody
+                 is waiting for that course
+        '''
+        if (course_id in self.courses):
+            return self.courses[course_id].head()
+        return None
+
+    def pop_course(self, course_id=""):
+        '''
+        Removes the student at the front of a course's sub-queue
+        :param: course_id Course ID; "" for questions without a course
+        :return: Student UID or None if nobody is waiting for that course
+        '''
+        if (course_id in self.courses):
+            return self.__remove(self.courses[course_id].front())
+        return None
+
+    def course_len(self, course_id=""):
+        '''
+        Returns the number of students waiting for help with a course
+        :param: course_id Course ID; "" for questions without a course
+        :return: Length of the course's sub-queue
+        '''
+        if (course_id in self.courses):
+            return len(self.courses[course_id])
+        return 0
+
+    def push(self, stu_uid, course_id="", priority=0, key=None):
         '''
         Adds a student to the back of the queue
         :param: stu_uid UID/Student object to add
+        :param: course_id Course the question is about; "" (or None) if the
+                question isn't about a particular course
+        :param: priority Priority of the question, from 0 (normal) to
+                QUEUE_PRIORITY_MAX. Only used in priority mode, where each
+                level puts the student ahead of anyone that arrived less than
+                aging_weight seconds before them
+        :param: key Optional priority key that replaces the one worked out
+                from the clock and the priority; used to restore a queue
         :return: Student UID added or None if there's an error
         '''
         stu_uid = User.get_uid(stu_uid)
         if (Student.is_stu(stu_uid)):
-            self.queue.append(stu_uid)
+            seq = self.lt_count
+            if (seq - self.rank_base >= self.ranks.size):
+                self.__rank_rebuild()
+            self.ranks.add(seq - self.rank_base, 1)
+            self.queue[seq] = stu_uid
+            if not(stu_uid in self.index):
+                self.index[stu_uid] = deque()
+            self.index[stu_uid].append(seq)
+            if (course_id == None):
+                course_id = ""
+            if not(self.priority):
+                key = None
+            elif (key == None):
+                priority = max(0, min(priority, QUEUE_PRIORITY_MAX))
+                key = self.clock.time() - priority * self.aging_weight
+            if (self.priority):
+                if not(course_id in self.courses):
+                    self.courses[course_id] = _HeapLine()
+            elif not(course_id in self.courses):
+                self.courses[course_id] = _FifoLine()
+            self.courses[course_id].push(seq, stu_uid, key)
+            if (self.priority):
+                self.key_ranks.push(key, seq)
+            self.entry_course[seq] = course_id
             self.lt_count += 1
             return stu_uid
         return None
 
+    def entries(self):
+        '''
+        Lists every entry in the queue in arrival order; pushing them back in
+        this order (with their keys) rebuilds the queue
+        :return: List of (Student UID, course ID, priority key) tuples; keys
+                 are None in FIFO mode
+        '''
+        return [(stu_uid, self.entry_course[seq],
+            self.courses[self.entry_course[seq]].live[seq]
+                if (self.priority) else None)
+            for seq, stu_uid in self.queue.items()]
+
     def purge_all(self):
         '''
         Purges all students from the queue
         '''
-        self.queue = []
+        self.queue.clear()
+        self.index.clear()
+        self.courses.clear()
+        self.entry_course.clear()
+        self.key_ranks = _KeyRanks()
+        self.__rank_rebuild()
 
     def purge(self, stu):
         '''
         Purges a student from the queue (at any position in the queue)
+        If the student is in the queue more than once, their earliest entry
+        is the one removed
         :param: stu Student object or Student UID to purge
         :return: Student UID purged or None if there's an error
         '''
         ret = None
         if ((type(stu) is Student) or (type(stu) is str)):
-            for i in range(0, self.len()):
-                # equals overloaded to check against UID strings
-                if (self.queue[i] == stu):
-                    ret = self.queue[i]
-                    break
-            if (ret != None):
-                self.queue.pop(i)
+            stu_uid = User.get_uid(stu)
+            if (stu_uid in self.index):
+                ret = self.__remove(self.index[stu_uid][0])
         return ret
 
+    def tickets(self, stu_uid):
+        '''
+        Counts the entries a student has in the queue, in O(1)
+        :param: stu_uid UID/Student object to look up
+        :return: Number of times the student is in line
+        '''
+        stu_uid = User.get_uid(stu_uid)
+        if (stu_uid in self.index):
+            return len(self.index[stu_uid])
+        return 0
+
+    def position(self, stu_uid):
+        '''
+        Finds a student's position in line. If the student is in the queue
+        more than once, the position of their earliest entry is returned.
+        This is O(log n) in both FIFO and priority mode
+        :param: stu_uid UID/Student object to look up
+        :return: 1-based position in the queue (1 is next to be helped) or
+                 None if the student isn't in the queue
+        '''
+        stu_uid = User.get_uid(stu_uid)
+        if not(stu_uid in self.index):
+            return None
+        seq = self.index[stu_uid][0]
+        if (self.priority):
+            return 1 + self.key_ranks.count_before(self.__rank(seq))
+        return self.ranks.prefix_sum(seq - self.rank_base)
+
 #### MAIN       ####
 
 def main():
@@ -149,8 +624,135 @@ def main():
     print(stu1 in queue)
     print(queue.purge_all() == None)
     print(str(queue))
+    print("##### Repeat entry commands #####")
+    queue.push(stu0)
+    queue.push(stu1)
+    queue.push(stu0)
+    print(queue.len() == 3)
+    print(queue.tickets(stu0) == 2)
+    print(queue.tickets(stu2) == 0)
+    print(queue.purge(stu0) == stu0)
+    print(stu0 in queue)
+    print(queue.pop() == stu1)
+    print(queue.pop() == stu0)
+    print(not(stu0 in queue))
+    print(queue.is_empty())
+    print("##### Position commands #####")
+    stus = [Student("pos" + str(i), "pass", "Pos", str(i)) for i in range(0, 50)]
+    for stu in stus:
+        queue.push(stu)
+    print(queue.position(stus[0]) == 1)
+    print(queue.position(stus[49]) == 50)
+    print(queue.position(tut0) == None)
+    queue.pop()
+    queue.purge(stus[10])
+    queue.purge(stus[30])
+    print(queue.position(stus[1]) == 1)
+    print(queue.position(stus[20]) == 19)
+    print(queue.position(stus[49]) == 47)
+    print(queue.position(stus[10]) == None)
+    # positions stay correct as the line turns over many times
+    for i in range(0, 200):
+        queue.pop()
+        queue.push(stus[i % 50])
+    print(all(queue.position(stu) == i + 1
+        for i, stu in enumerate(queue.queue.values())))
+    print("##### Course commands #####")
+    queue.purge_all()
+    queue.push(stu0, "CS1")
+    queue.push(stu1)
+    queue.push(stu2, "CS2")
+    queue.push(stus[0], "CS1")
+    print(queue.course_len("CS1") == 2)
+    print([course for seq, course in queue.heads()] == ["CS1", "", "CS2"])
+    print(queue.pop_course("CS2") == stu2)
+    print(queue.pop_course("CS2") == None)
+    print(queue.position(stus[0]) == 3)
+    print(queue.pop() == stu0)
+    print(queue.purge(stu1) == stu1)
+    print(queue.heads() == [(queue.index[stus[0].uid][0], "CS1")])
+    print(queue.pop_course("CS1") == stus[0])
+    print(queue.is_empty() and (len(queue.courses) == 0))
+    print("##### Priority commands #####")
+    clock = VirtualClock()
+    queue = QueueStu("Priority Queue", True, clock, 600)
+    queue.push(stu0)
+    clock.advance(100)
+    queue.push(stu1)
+    clock.advance(200)
+    # a priority 1 student jumps ahead of anyone who arrived < 10 min ago
+    queue.push(stu2, "CS1", 1)
+    print(queue.top() == stu2)
+    print(queue.position(stu0) == 2)
+    print(queue.position(stu1) == 3)
+    print(queue.heads()[0][1] == "CS1")
+    # ...but not ahead of anyone that has waited longer than that
+    clock.advance(300 + QUEUE_PRIORITY_MAX * 600)
+    queue.push(stus[0], "", QUEUE_PRIORITY_MAX + 5)
+    print(queue.position(stus[0]) == 4)
+    print(queue.pop() == stu2)
+    print(queue.purge(stu0) == stu0)
+    print(queue.pop() == stu1)
+    print(queue.pop() == stus[0])
+    print(queue.is_empty() and (queue.pop() == None))
+    # lazily removed entries don't pile up in the heap
+    for i in range(0, 200):
+        queue.push(stus[i % 50], "", i % 3)
+    for i in range(0, 3):
+        for stu in stus:
+            queue.purge(stu)
+    print(queue.len() == 50)
+    print(len(queue.courses[""].heap) <= max(QUEUE_HEAP_MIN_SIZE, 2 * 50))
+    last = None
+    ordered = True
+    while not(queue.is_empty()):
+        rank = queue.heads()[0][0]
+        ordered = ordered and ((last == None) or (last <= rank))
+        last = rank
+        queue.pop()
+    print(ordered)
+    # positions match counting the line, through pushes, pops and purges,
+    # and there is no more than one chain per priority level
+    rng = random.Random(42)
+    stus = [Student("rnk" + str(i), "pass", "Rnk", str(i))
+        for i in range(0, 300)]
+    matches = True
+    for i in range(0, 2000):
+        clock.advance(clock.time() + rng.random() * 60)
+        stu = rng.choice(stus)
+        if (rng.random() < 0.55):
+            queue.push(stu, rng.choice(["", "CS1", "CS2"]),
+                rng.randint(0, QUEUE_PRIORITY_MAX))
+        elif (rng.random() < 0.5):
+            queue.pop()
+        else:
+            queue.purge(stu)
+        if (i % 50 == 0):
+            ranks = [(queue.courses[queue.entry_course[seq]].live[seq], seq)
+                for seq in queue.queue]
+            for stu in stus[:30]:
+                if (stu.uid in queue):
+                    seq = queue.index[stu.uid][0]
+                    rank = (queue.courses[queue.entry_course[seq]].live[seq],
+                        seq)
+                    matches = matches and (queue.position(stu)
+                        == 1 + sum(1 for other in ranks if (other < rank)))
+    print(matches)
+    print(len(queue.key_ranks.chains) <= QUEUE_PRIORITY_MAX + 1)
+    queue.purge_all()
+    print("##### Entry commands #####")
+    queue.push(stu0, "CS1", 1)
+    clock.advance(clock.time() + 10)
+    queue.push(stu1)
+    copy = QueueStu("Copy", True, clock, 600)
+    for stu_uid, course_id, key in queue.entries():
+        copy.push(stu_uid, course_id, 0, key)
+    print(copy.entries() == queue.entries())
+    print(copy.top() == stu0)
 
 if __name__ == "__main__":
     # package only used for testing purposes
     from users.tutor import Tutor
+    import random
+    from utils.clock import VirtualClock
     main()
@@ -7,11 +7,17 @@
 ##              the server. It makes sense to only ever have one queue of
 ##              tutors and queue probably isn't the best term for Tutor
 ##              management; Tutors can become available at any one point and
-##              may come and go as their shifts end
+##              may come and go as their shifts end. Work is spread evenly
+##              across tutors: the tutor that has been available the longest
+##              (or, optionally, has helped the fewest students) goes next
 ##
 
+import heapq
+from collections import OrderedDict
+
 from users.tutor import Tutor
 from users.user import User
+from utils.macros import QUEUE_HEAP_MIN_SIZE
 
 class QueueTut:
     '''
@@ -19,17 +25,44 @@ class QueueTut:
     Manages which tutors are on duty and are available to answer questions
     '''
 
-    def __init__(self):
+    def __init__(self, least_load=False):
         '''
         Queue constructor
+        :param: least_load Optional parameter that sends the available tutor
+                that has helped the fewest students this shift, instead of the
+                one that has been available the longest
         '''
         # queue implementation is actually two Python dictionaries
         # these could be sets but I'd prefer to use dictionaries because they
         # have more functionality. This does mean that the keys are the
         # also the values (UID -> UID)
+        # available tutors are kept in the order they became available, so
+        # the front of free_queue is the least-recently-busy tutor
         self.busy_queue = {}
-        self.free_queue = {}
+        self.free_queue = OrderedDict()
         self.name = "Tutor Queue"
+        # courses each tutor on duty can help with (UID -> tuple of course
+        # IDs); tutors with no courses listed are generalists
+        self.courses = {}
+        # inverted index of available tutors by course (course ID -> UID ->
+        # UID) and the available generalists, so a tutor for a course is
+        # found in O(1). Only courses with a tutor available have an entry.
+        # These keep the same least-recently-busy order as free_queue
+        self.free_courses = {}
+        self.free_general = OrderedDict()
+        # number of students each tutor on duty has been sent to this shift
+        self.load = {}
+        # least-load mode: heaps of (load, stamp, UID) over every available
+        # tutor, the available generalists and the available tutors of each
+        # course. An entry is only valid while the tutor's stamp matches;
+        # entries of tutors that have been sent or have left are skipped
+        # when they reach the top, and heaps are compacted as they fill up
+        self.least_load = least_load
+        self.stamps = {}
+        self.stamp_count = 0
+        self.load_heap = []
+        self.general_heap = []
+        self.course_heaps = {}
 
     def __str__(self):
         '''
@@ -52,6 +85,83 @@ class QueueTut:
         uid = User.get_uid(uid)
         return (uid in self.busy_queue) or (uid in self.free_queue)
 
+    def __free(self, tut_uid):
+        '''
+        Marks a tutor as available, indexing them by the courses they know
+        :param: tut_uid UID of the tutor
+        '''
+        self.free_queue[tut_uid] = tut_uid
+        courses = self.courses[tut_uid]
+        if (len(courses) == 0):
+            self.free_general[tut_uid] = tut_uid
+        for course_id in courses:
+            if not(course_id in self.free_courses):
+                self.free_courses[course_id] = OrderedDict()
+            self.free_courses[course_id][tut_uid] = tut_uid
+        if (self.least_load):
+            self.stamp_count += 1
+            self.stamps[tut_uid] = self.stamp_count
+            self.__load_push(self.load_heap, self.free_queue, tut_uid)
+            if (len(courses) == 0):
+                self.__load_push(self.general_heap, self.free_general,
+                    tut_uid)
+            for course_id in courses:
+                if not(course_id in self.course_heaps):
+                    self.course_heaps[course_id] = []
+                self.__load_push(self.course_heaps[course_id],
+                    self.free_courses[course_id], tut_uid)
+
+    def __unfree(self, tut_uid):
+        '''
+        Takes a tutor off of the available list and out of the course index
+        :param: tut_uid UID of the tutor
+        :return: UID of the tutor
+        '''
+        val = self.free_queue.pop(tut_uid)
+        courses = self.courses[tut_uid]
+        if (len(courses) == 0):
+            del self.free_general[tut_uid]
+        for course_id in courses:
+            tuts = self.free_courses[course_id]
+            del tuts[tut_uid]
+            if (len(tuts) == 0):
+                del self.free_courses[course_id]
+                self.course_heaps.pop(course_id, None)
+        # the tutor's heap entries are now stale
+        self.stamps.pop(tut_uid, None)
+        return val
+
+    def __load_push(self, heap, tuts, tut_uid):
+        '''
+        Adds an available tutor to a least-load heap, compacting the heap
+        instead if most of its entries are stale
+        :param: heap Heap to add to
+        :param: tuts Available tutors the heap covers, including the tutor
+        :param: tut_uid UID of the tutor
+        '''
+        if (len(heap) >= max(QUEUE_HEAP_MIN_SIZE, 2 * len(tuts))):
+            heap[:] = [(self.load[uid], self.stamps[uid], uid) for uid in tuts]
+            heapq.heapify(heap)
+        else:
+            heapq.heappush(heap, (self.load[tut_uid], self.stamps[tut_uid],
+                tut_uid))
+
+    def __pick(self, tuts, heap):
+        '''
+        Picks the next tutor from a set of available tutors
+        :param: tuts Available tutors, least-recently-busy first
+        :param: heap Least-load heap covering the same tutors
+        :return: UID of the tutor or None if there are none
+        '''
+        if (len(tuts) == 0):
+            return None
+        if not(self.least_load):
+            return next(iter(tuts))
+        # drop stale entries; there is a valid one since tuts isn't empty
+        while (self.stamps.get(heap[0][2]) != heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0][2]
+
     def len(self):
         '''
         Returns the length of the queue/number of tutors currently available
@@ -68,34 +178,63 @@ class QueueTut:
         '''
         return self.len() == 0
 
-    def next(self):
+    def next(self, course_id=""):
         '''
         Returns the next available tutor by UID
+        :param: course_id Course the tutor has to be able to help with; ""
+                (or None) if any tutor will do. Tutors that list the course
+                are preferred over generalists, keeping generalists free for
+                courses nobody else knows
         :return: Next available tutor or None if no such tutor is available
         '''
-        if not(self.is_empty()):
-            # this should be practically random, which is fine
-            key = next(iter(self.free_queue))
-            return key
-        else:
-            return None
+        if ((course_id != None) and (course_id != "")):
+            if (course_id in self.free_courses):
+                return self.__pick(self.free_courses[course_id],
+                    self.course_heaps.get(course_id))
+            return self.__pick(self.free_general, self.general_heap)
+        return self.__pick(self.free_queue, self.load_heap)
 
-    def add(self, tut_uid, busy_state=False):
+    def add(self, tut_uid, busy_state=False, course_ids=None):
         '''
         Add a tutor to the queue; presumably they just went on duty
         :param: tut_uid UID/Tutor object to add
         :param: busy_state Optional parameter specifies if the tutor is busy
+        :param: course_ids Optional list of courses the tutor can help with;
+                if not given, the courses the tutor was last added with (or
+                none, making them a generalist)
         :return: Tutor UID added or None if there's an error
         '''
-        # override busy state if tutor object is provided
+        # override busy state and courses if tutor object is provided
         if (type(tut_uid) is Tutor):
             busy_state = tut_uid.busy_status()
+            course_ids = tut_uid.exp.course_ids
         tut_uid = User.get_uid(tut_uid)
         if (Tutor.is_tut(tut_uid)):
+            if (course_ids != None):
+                course_ids = tuple(course_ids)
+            # an available tutor that stays available keeps their place
+            if ((tut_uid in self.free_queue) and not(busy_state)
+                    and (course_ids in (None, self.courses[tut_uid]))):
+                return tut_uid
+            # a tutor that is already on duty is re-filed
+            if (tut_uid in self.busy_queue):
+                del self.busy_queue[tut_uid]
+            elif (tut_uid in self.free_queue):
+                self.__unfree(tut_uid)
+                # an available tutor being sent to a student
+                if (busy_state):
+                    self.load[tut_uid] += 1
+            if (course_ids != None):
+                self.courses[tut_uid] = course_ids
+            elif not(tut_uid in self.courses):
+                self.courses[tut_uid] = ()
+            if not(tut_uid in self.load):
+                self.load[tut_uid] = 0
             if (busy_state):
                 self.busy_queue[tut_uid] = tut_uid
             else:
-                self.free_queue[tut_uid] = tut_uid
+                # newly available tutors go to the back of the line
+                self.__free(tut_uid)
             return tut_uid
         return None
 
@@ -112,8 +251,9 @@ class QueueTut:
                 val = self.busy_queue[tut_uid]
                 del self.busy_queue[tut_uid]
             elif (tut_uid in self.free_queue):
-                val = self.free_queue[tut_uid]
-                del self.free_queue[tut_uid]
+                val = self.__unfree(tut_uid)
+            self.courses.pop(tut_uid, None)
+            self.load.pop(tut_uid, None)
             return val
         return None
 
@@ -130,21 +270,56 @@ class QueueTut:
             busy_state = tut_uid.busy_status()
         tut_uid = User.get_uid(tut_uid)
         if (Tutor.is_tut(tut_uid)):
-            # remove the tutor from either queue
-            self.remove(tut_uid)
-            # re-assign the tutor
+            # re-assign the tutor; they keep the courses they were added with
             self.add(tut_uid, busy_state)
             # return the current status of the Tutor
             return busy_state
         else:
             return None
 
+    def entries(self):
+        '''
+        Lists every tutor on duty, available tutors first in the order they
+        will be sent; adding them back in this order rebuilds the queue
+        :return: List of (Tutor UID, busy state, course IDs, load) tuples
+        '''
+        return ([(uid, False, list(self.courses[uid]), self.load[uid])
+            for uid in self.free_queue]
+            + [(uid, True, list(self.courses[uid]), self.load[uid])
+            for uid in self.busy_queue])
+
+    def restore(self, tut_uid, busy_state, course_ids, load):
+        '''
+        Puts a tutor back on duty, as listed by entries()
+        :param: tut_uid UID of the tutor
+        :param: busy_state True if the tutor is busy
+        :param: course_ids Courses the tutor can help with
+        :param: load Number of students the tutor has been sent this shift
+        :return: Tutor UID added or None if there's an error
+        '''
+        tut_uid = self.add(tut_uid, busy_state, course_ids)
+        if (tut_uid != None):
+            self.load[tut_uid] = load
+            # heap entries were made with the old load
+            if (tut_uid in self.free_queue):
+                self.__unfree(tut_uid)
+                self.__free(tut_uid)
+        return tut_uid
+
     def purge_all(self):
         '''
         Purges all tutors from the queue
         '''
         self.busy_queue.clear()
         self.free_queue.clear()
+        self.courses.clear()
+        self.free_courses.clear()
+        self.free_general.clear()
+        self.load.clear()
+        self.stamps.clear()
+        self.load_heap.clear()
+        self.general_heap.clear()
+        self.course_heaps.clear()
 
 #### MAIN       ####
 
@@ -192,6 +367,72 @@ def main():
     print(str(queue))
     print(queue.purge_all() == None)
     print(str(queue))
+    print("##### Course commands #####")
+    tut0.exp.course_ids = ["CS1", "CS2"]
+    tut1.exp.course_ids = ["CS2"]
+    queue.add(tut0)
+    queue.add(tut1)
+    print(queue.next("CS1") == tut0.uid)
+    print(queue.next("CS3") == None)
+    print(queue.next() in (tut0.uid, tut1.uid))
+    print(tut0.help(stu0) == stu0)
+    print(queue.update(tut0) == True)
+    print(queue.next("CS1") == None)
+    print(queue.next("CS2") == tut1.uid)
+    queue.add(tut2)
+    print(queue.next("CS1") == tut2.uid)
+    print(queue.next("CS2") == tut1.uid)
+    print(tut0.done() == stu0)
+    print(queue.update(tut0.uid) == False)
+    print(queue.next("CS1") == tut0.uid)
+    print(queue.remove(tut0) == tut0.uid)
+    print(not("CS1" in queue.free_courses))
+    print(queue.len() == 2)
+    print("##### Fairness commands #####")
+    queue.purge_all()
+    tuts = [Tutor("fair" + str(i), "pass", "Fair", str(i)) for i in range(0, 4)]
+    stus = [Student("fstu" + str(i), "pass", "Stu", str(i))
+        for i in range(0, 3)]
+    for tut in tuts:
+        queue.add(tut)
+    # tutors are sent least-recently-busy first, and staying available
+    # doesn't cost a tutor their place
+    print(queue.next() == tuts[0].uid)
+    print(queue.update(tuts[0]) == False)
+    print(queue.next() == tuts[0].uid)
+    by_uid = dict((tut.uid, tut) for tut in tuts)
+    for i in range(0, 3):
+        tut = by_uid[queue.next()]
+        tut.help(stus[i])
+        queue.update(tut)
+    print(queue.next() == tuts[3].uid)
+    tuts[1].done()
+    queue.update(tuts[1])
+    tuts[0].done()
+    queue.update(tuts[0])
+    print(list(queue.free_queue) == [tuts[3].uid, tuts[1].uid, tuts[0].uid])
+    print(queue.load[tuts[0].uid] == 1)
+    # least-load mode sends whoever has helped the fewest students
+    queue = QueueTut(True)
+    for tut in tuts:
+        tut.busy = False
+        queue.add(tut)
+    counts = dict((tut.uid, 0) for tut in tuts)
+    for i in range(0, 400):
+        tut_uid = queue.next("CS9" if (i % 2) else "")
+        counts[tut_uid] += 1
+        queue.update(tut_uid, True)
+        queue.update(tut_uid, False)
+    print(max(counts.values()) - min(counts.values()) <= 1)
+    print(len(queue.load_heap) <= max(QUEUE_HEAP_MIN_SIZE, 2 * len(tuts)))
+    print(queue.remove(tuts[0]) == tuts[0].uid)
+    print(queue.next() != tuts[0].uid)
+    print("##### Entry commands #####")
+    copy = QueueTut(True)
+    for entry in queue.entries():
+        copy.restore(*entry)
+    print(copy.entries() == queue.entries())
+    print(copy.next("CS9") == queue.next("CS9"))
 
 if __name__ == "__main__":
     # package only used for testing purposes
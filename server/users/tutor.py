@@ -49,7 +49,8 @@ class Tutor(User):
             if ("busy" in init_map):
                 self.busy  = init_map["busy"]
             if ("helped" in init_map):
-                self.helped  = init_map["helped"]
+                # copied so the tutor never shares a list with the map
+                self.helped  = list(init_map["helped"])
 
     def __str__(self):
         '''
@@ -102,7 +102,7 @@ class User:
         Increments the number of questions a user has asked/answered
         :return: Current question count
         '''
-        return self.stats.q_increment("q_count")
+        return self.stats.stat_increment("q_count")
 
     def login_increment(self):
         '''
@@ -0,0 +1,79 @@
+##
+## File:    ack_batcher.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that batches up message acknowledgements so that
+##              a consumer doesn't pay for a round trip per message
+##
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class AckBatcher:
+    '''
+    AckBatcher object, collects acknowledgements for messages that have been
+    fully handled and sends them to the broker as a single multiple=True ack
+    Messages must be acknowledged in the order they were delivered by the
+    transport, which is always the case for the MMCGA server
+    '''
+
+    def __init__(self, transport, batch_size=SERVER_ACK_BATCH,
+            prefetch=SERVER_PREFETCH):
+        '''
+        Constructs an AckBatcher object
+        :param: transport Transport the messages were consumed from
+        :param: batch_size Number of handled messages that triggers an ack
+        :param: prefetch Prefetch window of the consumer. A batch can't be
+                larger than this or the server would stop delivering messages
+                before the batch is ever full
+        '''
+        self.transport = transport
+        self.batch_size = max(1, min(batch_size, prefetch))
+        # most recent delivery tag that has been handled but not acked
+        self.last_tag = None
+        # number of messages covered by the next ack
+        self.pending = 0
+
+    def __str__(self):
+        '''
+        Converts batcher to a string equivalent
+        '''
+        return ("AckBatcher(" + str(self.pending) + "/"
+            + str(self.batch_size) + " pending)")
+
+    def ack(self, delivery_tag):
+        '''
+        Marks a message as handled; the ack is sent once a batch fills up
+        :param: delivery_tag Delivery tag of the handled message
+        '''
+        self.last_tag = delivery_tag
+        self.pending += 1
+        if (self.pending >= self.batch_size):
+            self.flush()
+
+    def reject(self, delivery_tag):
+        '''
+        Rejects a message that could not be handled. The message is dropped
+        instead of re-queued, so a malformed message can't wedge the server
+        :param: delivery_tag Delivery tag of the rejected message
+        '''
+        # acks for earlier messages go out first so they aren't lost in the
+        # multiple=True ack range
+        self.flush()
+        self.transport.nack(delivery_tag, requeue=False)
+        printd("Rejected message " + str(delivery_tag))
+
+    def flush(self):
+        '''
+        Sends an ack covering every handled message that hasn't been acked yet
+        '''
+        if (self.pending > 0):
+            self.transport.ack(self.last_tag, multiple=True)
+            self.last_tag = None
+            self.pending = 0
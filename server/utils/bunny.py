@@ -9,19 +9,41 @@
 
 # Python libraries
 import json
-import pika
 import sqlite3
+import time
 
 # project libraries
-from datagrams.json_db_encoder import JSON_DB_Encoder
 from utils.macros import *
 from utils.utils import printd
+from utils.lru_cache import LRUCache
+from utils.metrics import METRICS
+from utils.clock import Clock
+from utils.codec import JSON_CODEC, get_codec
 from users.user import User
 from users.student import Student
 from users.tutor import Tutor
 
 #### GLOBALS    ####
 
+# columns of the user table, in order, with their types. Tutor experience
+# columns are NULL for students
+USER_COLS = [
+    (DB_FIELD_UID,     DB_F_TYPE_TXT + " PRIMARY KEY"),
+    (DB_FIELD_UNAME,   DB_F_TYPE_TXT),
+    (DB_FIELD_EMAIL,   DB_F_TYPE_TXT),
+    (DB_FIELD_PASSWD,  DB_F_TYPE_TXT),
+    (DB_FIELD_F_NAME,  DB_F_TYPE_TXT),
+    (DB_FIELD_L_NAME,  DB_F_TYPE_TXT),
+    (DB_FIELD_Q_COUNT, DB_F_TYPE_INT + " NOT NULL DEFAULT 0"),
+    (DB_FIELD_LOGINS,  DB_F_TYPE_INT + " NOT NULL DEFAULT 0"),
+    (DB_FIELD_TITLE,   DB_F_TYPE_TXT),
+    (DB_FIELD_BIO,     DB_F_TYPE_TXT),
+    (DB_FIELD_BUSY,    DB_F_TYPE_INT),
+]
+USER_FIELDS = [field for field, field_type in USER_COLS]
+# errors that mean a batch couldn't be written; the transaction is rolled back
+DB_STORE_ERRORS = (sqlite3.Error, AttributeError, TypeError, ValueError)
+
 #### CLASS      ####
 
 class Bunny:
@@ -30,9 +52,14 @@ class Bunny:
     This class keeps track of who we are messaging
     '''
 
-    def __init__(self):
+    def __init__(self, transport=None, db_path=None, clock=None):
         '''
         Constructs a Bunny object, an interface/wrapper for RabbitMQ messaging
+        :param: transport Transport used to reach users' devices; RabbitMQ on
+                SERVER_HOST by default
+        :param: db_path Path of the SQLite database (or ":memory:"); the
+                normal (or debug) database file by default
+        :param: clock Clock that tells the time; the system clock by default
         '''
         # table that tracks connected/registered Users
         # originally I thought we would need to track User IPs but that's
@@ -41,6 +68,49 @@ class Bunny:
         self.uid_tbl = {}
         # default RabbitMQ exchange to use for out-going messages
         self.exchange = ""
+        # transport to the message broker; pika is only needed (and imported)
+        # when talking to a real RabbitMQ server
+        if (transport == None):
+            from transport.pika_transport import PikaTransport
+            transport = PikaTransport(SERVER_HOST, self.exchange)
+        self.transport = transport
+        # all out-going messages are published through here
+        self.publisher = transport
+        # database file and its long-lived connection, opened on first use
+        if (db_path == None):
+            db_path = SQL_DB_DEBUG if (DEBUG_DB) else SQL_DB
+        self.db_path = db_path
+        self.db_connect = None
+        # SQL statement texts that have already been built
+        self.db_stmts = {}
+        # write-behind cache of users whose state has changed but hasn't been
+        # written to the database yet (UID -> User). Repeated changes to the
+        # same user are coalesced into one write
+        self.dirty = {}
+        # user name -> UID of the users in the write-behind cache
+        self.dirty_names = {}
+        # events waiting to be written to the event table, in the order they
+        # happened: (time, kind, UID, peer UID)
+        self.events = []
+        # time source for housekeeping
+        self.clock = clock if (clock != None) else Clock()
+        # last time the write-behind cache was flushed
+        self.last_flush = self.clock.time()
+        # read-through cache of decoded user records loaded from the database,
+        # keyed by both ("uid", UID) and ("uname", user name)
+        self.user_cache = LRUCache(DB_USER_CACHE_SIZE)
+        # metrics recorded for database operations and out-going messages
+        self.db_timers = {}
+        for op in ("lookup", "load", "store", "events"):
+            self.db_timers[op] = METRICS.histogram("mmcga_db_seconds",
+                "Time spent on database operations", op=op)
+        self.pub_timer = METRICS.histogram("mmcga_publish_seconds",
+            "Time spent publishing out-going messages (per publish call)")
+        self.pub_count = METRICS.counter("mmcga_published_total",
+            "Out-going messages published")
+        # wire format each user's device asked for (UID -> codec); users that
+        # aren't in here are sent JSON
+        self.codec_tbl = {}
         # init the database, if need be
         self.__db_init()
 
@@ -51,6 +121,7 @@ class Bunny:
         result = "===== Bunny Interface =====\n"
         for key in self.uid_tbl:
             result += str(key) + "\n -> " + str(self.uid_tbl[key]) + "\n"
+        result += "User " + str(self.user_cache) + "\n"
         return result
 
     def __contains__(self, uid):
@@ -65,53 +136,74 @@ class Bunny:
     #### BEGIN: Internal Functions ####
     def __send_msg(self, msg_queue, var_tbl):
         '''
-        Sends a message to a specific message queue
+        Sends a message to a specific message queue, in the wire format the
+        device listening on that queue asked for
         :param: msg_queue Message queue to write to 
         :param: var_tbl Dictionary hash table that stores values to send over
                 the network in a packaged way.
-        :return: JSON string sent to device or None if there is a failure
+        :return: Encoded message sent to device (a JSON string by default) or
+                 None if there is a failure
         '''
-        # convert variable table into a JSON string to send over
-        json_str = json.dumps(var_tbl)
-
-        # connect to the targeted device by establishing connection to server
-        socket = pika.BlockingConnection(
-            pika.ConnectionParameters(SERVER_HOST)
-        )
-        channel = socket.channel()
-        # send information to a specific RabbitMQ queue
-        channel.queue_declare(queue=msg_queue)
-        # actually submit the message
-        channel.basic_publish(exchange=self.exchange,
-            routing_key=msg_queue,
-            body=json_str);
+        # convert variable table into the device's wire format
+        codec = self.codec_tbl.get(msg_queue, JSON_CODEC)
+        msg_body = codec.encode(var_tbl)
+        # send information to a specific RabbitMQ queue over a warm channel
+        start = time.perf_counter()
+        self.publisher.publish(msg_queue, msg_body, codec.content_type)
+        self.pub_timer.observe(time.perf_counter() - start)
+        self.pub_count.inc()
         printd("Sent to queue " + msg_queue + ":")
-        printd(json_str)
-        # close the connection
-        socket.close()
-        return json_str
+        printd(msg_body)
+        return msg_body
 
     ## BEGIN: DB Functions ##
 
     def __db_connect(self):
         '''
-        Connects to the database
+        Connects to the database. The connection is opened once and then kept
+        for the lifetime of the Bunny, so a request only costs a few statement
+        executions instead of file opens and fsyncs
         :return: Database connection object
         '''
-        # connect to the database
-        if (DEBUG_DB):
-            db_connect = sqlite3.connect(SQL_DB_DEBUG)
-        else:
-            db_connect = sqlite3.connect(SQL_DB)
-        return db_connect
+        if (self.db_connect == None):
+            # the async server hands DB work to a worker thread; the Bunny is
+            # only ever used by one thread at a time
+            self.db_connect = sqlite3.connect(self.db_path,
+                check_same_thread=False,
+                cached_statements=DB_STMT_CACHE)
+            for pragma in DB_PRAGMAS:
+                self.db_connect.execute("PRAGMA " + pragma + ";")
+        return self.db_connect
 
-    def __db_disconnect(self, db_connect):
+    def __db_commit(self, db_connect):
         '''
-        Disconnects to the database and commit changes
+        Commits changes to the database
         :param: db_connect Connection to the database
         '''
         db_connect.commit()
-        db_connect.close()
+
+    def __db_rollback(self, db_connect):
+        '''
+        Throws away the changes made since the last commit
+        :param: db_connect Connection to the database
+        '''
+        db_connect.rollback()
+
+    def __db_stmt(self, template, **fields):
+        '''
+        Builds the text of a SQL statement, filling in table and field names.
+        Values are never formatted into the text; they are passed as
+        parameters. Statement texts are cached so that each distinct statement
+        is built once and always has the same text, which lets SQLite reuse
+        its prepared form from the connection's statement cache
+        :param: template SQL statement template with {name} placeholders
+        :param: fields Table and field names to fill into the template
+        :return: SQL statement text
+        '''
+        stmt_key = (template, tuple(sorted(fields.items())))
+        if not(stmt_key in self.db_stmts):
+            self.db_stmts[stmt_key] = template.format(**fields)
+        return self.db_stmts[stmt_key]
 
     def __db_get_tables(self):
         '''
@@ -127,7 +219,6 @@ class Bunny:
             ORDER BY name;\
             """)
         lst = cur.fetchall()
-        self.__db_disconnect(db_connect)
         return lst
 
     def __db_tbl_exists(self, tbl_name):
@@ -146,44 +237,150 @@ class Bunny:
             """.format(tbl=tbl_name))
         if (cur.fetchone() != None):
             is_there = True
-        self.__db_disconnect(db_connect)
         return is_there
 
     def __db_init(self):
         '''
-        Initializes the database for the first time
+        Initializes the database for the first time, or migrates it to the
+        current schema
         '''
         db_connect = self.__db_connect()
-        # check for tables; build if missing
+        version = db_connect.execute("PRAGMA user_version;").fetchone()[0]
+        # check for tables; build if missing, migrate if out of date
         if not(self.__db_tbl_exists(DB_USER_TBL)):
-            # make the user table that stores:
-            # - UIDs as the Primary Key
-            # - User names as an index
-            # - JSON serialization of Python object state
+            self.__db_create_users()
+            db_connect.execute("PRAGMA user_version={version};".format(
+                version=DB_SCHEMA_VERSION))
+        elif (version < DB_SCHEMA_VERSION):
+            self.__db_migrate()
+        if not(self.__db_tbl_exists(DB_EVENT_TBL)):
+            # make the append-only event table that stores:
+            # - an increasing event ID as the Primary Key
+            # - time, kind and the users involved
+            # time and UID are indexed, so reports over an evening or a user
+            # don't have to scan the whole table
             db_connect.execute(
                 """\
                 CREATE TABLE {tbl_name} (\
                     {f0} {t0} PRIMARY KEY,\
-                    {f1} {t1},\
-                    {f2} {t2}\
+                    {f1} {t1} NOT NULL,\
+                    {f2} {t2} NOT NULL,\
+                    {f3} {t3},\
+                    {f4} {t4}\
                 );\
                 """.format(
-                    tbl_name=DB_USER_TBL,
-                    f0=DB_FIELD_UID,   t0=DB_F_TYPE_TXT,
-                    f1=DB_FIELD_UNAME, t1=DB_F_TYPE_TXT,
-                    f2=DB_FIELD_JSON,  t2=DB_F_TYPE_TXT,
+                    tbl_name=DB_EVENT_TBL,
+                    f0=DB_FIELD_EVENT_ID, t0=DB_F_TYPE_INT,
+                    f1=DB_FIELD_TS,       t1=DB_F_TYPE_REAL,
+                    f2=DB_FIELD_KIND,     t2=DB_F_TYPE_TXT,
+                    f3=DB_FIELD_UID,      t3=DB_F_TYPE_TXT,
+                    f4=DB_FIELD_PEER_UID, t4=DB_F_TYPE_TXT,
+                )
+            )
+            for tbl_idx, field in ((DB_EVENT_TS_IDX, DB_FIELD_TS),
+                    (DB_EVENT_UID_IDX, DB_FIELD_UID)):
+                db_connect.execute(
+                    """
+                    CREATE INDEX {tbl_idx} ON {tbl_name}({f0});
+                    """.format(
+                        tbl_idx=tbl_idx,
+                        tbl_name=DB_EVENT_TBL,
+                        f0=field,
+                    )
                 )
+        self.__db_commit(db_connect)
+
+    def __db_create_users(self):
+        '''
+        Builds the user table and its side tables
+        '''
+        db_connect = self.__db_connect()
+        # make the user table that stores:
+        # - UIDs as the Primary Key
+        # - User names as an index
+        # - a typed column for every piece of user state, so reports can be
+        #   answered in SQL. Question counts are indexed for "top askers"
+        db_connect.execute(
+            """
+            CREATE TABLE {tbl_name} ({cols});
+            """.format(
+                tbl_name=DB_USER_TBL,
+                cols=", ".join(field + " " + field_type
+                    for field, field_type in USER_COLS),
             )
+        )
+        for tbl_idx, unique, field in (
+                (DB_UNAME_IDX, "UNIQUE ", DB_FIELD_UNAME),
+                (DB_Q_COUNT_IDX, "", DB_FIELD_Q_COUNT)):
             db_connect.execute(
                 """
-                CREATE UNIQUE INDEX {tbl_idx} ON {tbl_name}({f1});
+                CREATE {unique}INDEX {tbl_idx} ON {tbl_name}({f0});
                 """.format(
-                    tbl_idx=DB_UNAME_IDX,
+                    unique=unique,
+                    tbl_idx=tbl_idx,
                     tbl_name=DB_USER_TBL,
-                    f1=DB_FIELD_UNAME,
+                    f0=field,
                 )
             )
-        self.__db_disconnect(db_connect)
+        # lists of a tutor are kept one row per item, in list order:
+        # - the courses a tutor can help with, indexed by course
+        # - the students a tutor has helped
+        for tbl_name, field in ((DB_COURSE_TBL, DB_FIELD_COURSE),
+                (DB_HELPED_TBL, DB_FIELD_STU_UID)):
+            db_connect.execute(
+                """\
+                CREATE TABLE {tbl_name} (\
+                    {f0} {t0} NOT NULL,\
+                    {f1} {t1} NOT NULL,\
+                    {f2} {t2},\
+                    PRIMARY KEY ({f0}, {f1})\
+                ) WITHOUT ROWID;\
+                """.format(
+                    tbl_name=tbl_name,
+                    f0=DB_FIELD_UID, t0=DB_F_TYPE_TXT,
+                    f1=DB_FIELD_POS, t1=DB_F_TYPE_INT,
+                    f2=field,        t2=DB_F_TYPE_TXT,
+                )
+            )
+        db_connect.execute(
+            """
+            CREATE INDEX {tbl_idx} ON {tbl_name}({f0});
+            """.format(
+                tbl_idx=DB_COURSE_IDX,
+                tbl_name=DB_COURSE_TBL,
+                f0=DB_FIELD_COURSE,
+            )
+        )
+
+    def __db_migrate(self):
+        '''
+        Migrates a version 0 database, which stored each user as a JSON
+        string, to the current schema. The old table is moved out of the way,
+        every user is copied over and the old table is dropped, all in a
+        single transaction
+        '''
+        db_connect = self.__db_connect()
+        old_tbl = DB_USER_TBL + "_v0"
+        db_connect.execute("BEGIN;")
+        db_connect.execute("DROP INDEX IF EXISTS {tbl_idx};".format(
+            tbl_idx=DB_UNAME_IDX))
+        db_connect.execute("ALTER TABLE {tbl_name} RENAME TO {old_tbl};".format(
+            tbl_name=DB_USER_TBL, old_tbl=old_tbl))
+        self.__db_create_users()
+        cur = db_connect.execute("SELECT {json} FROM {old_tbl};".format(
+            json=DB_FIELD_JSON, old_tbl=old_tbl))
+        users = []
+        for (json_str,) in cur.fetchall():
+            user = Bunny.__user_from_map(json.loads(json_str))
+            if (user != None):
+                users.append(user)
+        self.__db_store_users(users, commit=False)
+        db_connect.execute("DROP TABLE {old_tbl};".format(old_tbl=old_tbl))
+        db_connect.execute("PRAGMA user_version={version};".format(
+            version=DB_SCHEMA_VERSION))
+        self.__db_commit(db_connect)
+        printd("Migrated " + str(len(users)) + " users to schema version "
+            + str(DB_SCHEMA_VERSION))
 
     def __db_lookup(self, key, key_val, tbl):
         '''
@@ -195,33 +392,33 @@ class Bunny:
         '''
         is_there = False
         db_connect = self.__db_connect()
-        # check if the table exists
-        if (self.__db_tbl_exists(DB_USER_TBL)):
-            # perform lookup
-            cur = db_connect.execute(
-                """
-                SELECT {key} FROM {tbl_name} WHERE {key}='{key_val}';
-                """.format(
-                    key=key, key_val=key_val, tbl_name=tbl,
-                )
-            )
-            if (cur.fetchone() != None):
-                is_there = True
-        self.__db_disconnect(db_connect)
+        # perform lookup; the table is always built by __db_init()
+        sql = self.__db_stmt(
+            """
+            SELECT {key} FROM {tbl_name} WHERE {key}=?;
+            """,
+            key=key, tbl_name=tbl,
+        )
+        start = time.perf_counter()
+        cur = db_connect.execute(sql, (key_val,))
+        if (cur.fetchone() != None):
+            is_there = True
+        self.db_timers["lookup"].observe(time.perf_counter() - start)
         return is_there
 
-    def __db_lookup_uid(self, uid):
+    def __db_lookup_uid(self, uid, tbl=DB_USER_TBL):
         '''
         Checks if a specific UID key value is in the database table
         :param: uid Value of the UID key to look up
         :param: tbl Table to look into
         :return: True if the key is there, False otherwise
         '''
-        return self.__db_lookup(self, DB_FIELD_UID, uid, tbl)
+        return self.__db_lookup(DB_FIELD_UID, uid, tbl)
 
     def __db_load(self, key, key_val, tbl):
         '''
-        Loads a JSON map from the a JSON string in the database
+        Loads a user's JSON map from their row in the database (and, for
+        tutors, the side tables)
         :param: key Key (name) to load
         :param: key_val Value of the key to load
         :param: tbl Table to load from
@@ -229,24 +426,45 @@ class Bunny:
         '''
         db_connect = self.__db_connect()
         # perform access
-        cur = db_connect.execute(
+        sql = self.__db_stmt(
             """
-            SELECT {json} FROM {tbl_name} WHERE {key}='{key_val}';
-            """.format(
-                key=key, key_val=key_val, tbl_name=tbl, json=DB_FIELD_JSON,
-            )
+            SELECT {cols} FROM {tbl_name} WHERE {key}=?;
+            """,
+            key=key, tbl_name=tbl, cols=", ".join(USER_FIELDS),
         )
-        json_str = cur.fetchone()
-        self.__db_disconnect(db_connect)
+        start = time.perf_counter()
+        row = db_connect.execute(sql, (key_val,)).fetchone()
         # failure to retrieve anything from the DB
-        if (json_str == None):
+        if (row == None):
+            self.db_timers["load"].observe(time.perf_counter() - start)
             return None
-        # extract data out of tuple given to us
-        json_str = json_str[0]
-        # remove ''s from SQL storage
-        json_str = json_str.replace("''", "'")
+        course_ids = []
+        helped = []
+        if (Tutor.is_tut(row[0])):
+            course_ids = self.__db_load_list(DB_COURSE_TBL, DB_FIELD_COURSE,
+                row[0])
+            helped = self.__db_load_list(DB_HELPED_TBL, DB_FIELD_STU_UID,
+                row[0])
+        self.db_timers["load"].observe(time.perf_counter() - start)
         # it is now up to classes to know how to turn the map into an object
-        return json.loads(json_str)
+        return Bunny.__user_map(row, course_ids, helped)
+
+    def __db_load_list(self, tbl, field, uid):
+        '''
+        Loads one of a tutor's lists from its side table
+        :param: tbl Side table to load from
+        :param: field Field that holds the list's items
+        :param: uid UID of the tutor
+        :return: List of items, in order
+        '''
+        sql = self.__db_stmt(
+            """
+            SELECT {field} FROM {tbl_name} WHERE {uid}=? ORDER BY {pos};
+            """,
+            field=field, tbl_name=tbl, uid=DB_FIELD_UID, pos=DB_FIELD_POS,
+        )
+        cur = self.__db_connect().execute(sql, (uid,))
+        return [item for (item,) in cur.fetchall()]
 
     def __db_load_uid(self, uid, tbl):
         '''
@@ -255,6 +473,11 @@ class Bunny:
         :param: tbl Table to load from
         :return: JSON dictionary mappings from the database
         '''
+        # users waiting to be written are newer than what's in the database
+        if ((tbl == DB_USER_TBL) and (uid in self.dirty)):
+            return self.__wb_load(uid)
+        if (tbl == DB_USER_TBL):
+            return self.__cache_load(DB_FIELD_UID, uid)
         return self.__db_load(DB_FIELD_UID, uid, tbl)
 
     def __db_load_uname(self, uname, tbl):
@@ -264,82 +487,266 @@ class Bunny:
         :param: tbl Table to load from
         :return: JSON dictionary mappings from the database
         '''
+        # users waiting to be written are newer than what's in the database
+        if ((tbl == DB_USER_TBL) and (uname in self.dirty_names)):
+            return self.__wb_load(self.dirty_names[uname])
+        if (tbl == DB_USER_TBL):
+            return self.__cache_load(DB_FIELD_UNAME, uname)
         return self.__db_load(DB_FIELD_UNAME, uname, tbl)
 
-    def __db_store(self, key, key_val, tbl, obj, idx=None, idx_val=None):
+    def __db_store_users(self, users, commit=True):
         '''
-        Takes an object, serializes it into JSON, and stores it in the database
-        :param: key Key (name) to load
-        :param: key_val Value of the key to load
-        :param: tbl Table to store to
-        :param: obj Object to serialize and store
-        :param: idx Optional index (secondary key)
-        :param: idx_val Optional index value (secondary key)
-        :return: JSON string stored in the database
-        '''
-        json_str = JSON_DB_Encoder.dumps(obj)
-        # double up on 's to escape them for SQL storage
-        json_str = json_str.replace("'", "''")
-        # update if key exists
-        if (self.__db_lookup(key, key_val, tbl)):
-            db_connect = self.__db_connect()
-            # update object in the database
-            cur = db_connect.execute(
-                """\
-                UPDATE {tbl_name}\
-                SET {json}='{json_val}'\
-                WHERE {key}='{key_val}';\
-                """.format(
-                    tbl_name=tbl,
-                    key=key, key_val=key_val,
-                    json=DB_FIELD_JSON, json_val=json_str,
-                )
-            )
-        # otherwise, insert for the first time
-        else:
-            # store object in the database
-            db_connect = self.__db_connect()
-            cur = db_connect.execute(
-                """\
-                INSERT INTO {tbl_name} ({key}, {json})\
-                VALUES ('{key_val}', '{json_val}');\
-                """.format(
-                    tbl_name=tbl,
-                    key=key, key_val=key_val,
-                    json=DB_FIELD_JSON, json_val=json_str,
-                )
-            )
-        # if an index value is specified, set them in the row only if the value
-        # is not new, don't bother updating it
-        if ((idx != None) and (idx_val != None)):
-            if not(self.__db_lookup(idx, idx_val, tbl)):
-                cur = db_connect.execute(
-                    """\
-                    UPDATE {tbl_name}\
-                    SET {idx}='{idx_val}'\
-                    WHERE {key}='{key_val}';\
-                    """.format(
-                        tbl_name=tbl,
-                        idx=idx, idx_val=idx_val,
-                        key=key, key_val=key_val,
-                    )
-                )
-        self.__db_disconnect(db_connect)
-        return json_str
+        Stores a batch of users in the database in a single transaction
+        :param: users List of User objects to store
+        :param: commit Optional parameter; False to leave the transaction open
+        :return: List of JSON dictionary mappings of the users, as they would
+                 be loaded back
+        '''
+        rows = [Bunny.__user_row(user) for user in users]
+        tuts = [user for user in users if (isinstance(user, Tutor))]
+        db_connect = self.__db_connect()
+        # insert the row for the first time or update it in place; either way
+        # it's a single statement. The user name is only filled in if the
+        # row doesn't already have one
+        sql = self.__db_stmt(
+            """
+            INSERT INTO {tbl_name} ({cols}) VALUES ({marks})
+            ON CONFLICT({key}) DO UPDATE SET
+                {sets},
+                {idx}=COALESCE({tbl_name}.{idx}, excluded.{idx});
+            """,
+            tbl_name=DB_USER_TBL, key=DB_FIELD_UID, idx=DB_FIELD_UNAME,
+            cols=", ".join(USER_FIELDS),
+            marks=", ".join("?" for field in USER_FIELDS),
+            sets=", ".join(field + "=excluded." + field
+                for field in USER_FIELDS[2:]),
+        )
+        start = time.perf_counter()
+        db_connect.executemany(sql, rows)
+        # a tutor's courses are short and rarely change; they are rewritten
+        self.__db_exec_many(
+            """
+            DELETE FROM {tbl_name} WHERE {uid}=?;
+            """,
+            [(tut.uid,) for tut in tuts],
+            tbl_name=DB_COURSE_TBL, uid=DB_FIELD_UID,
+        )
+        self.__db_exec_many(
+            """
+            INSERT INTO {tbl_name} ({uid}, {pos}, {field}) VALUES (?, ?, ?);
+            """,
+            [(tut.uid, pos, course_id) for tut in tuts
+                for pos, course_id in enumerate(tut.exp.course_ids)],
+            tbl_name=DB_COURSE_TBL, uid=DB_FIELD_UID, pos=DB_FIELD_POS,
+            field=DB_FIELD_COURSE,
+        )
+        # the students a tutor has helped only ever grow, so only the ones
+        # added since the last store are written
+        helped_rows = []
+        for tut in tuts:
+            last = db_connect.execute(self.__db_stmt(
+                """
+                SELECT MAX({pos}) FROM {tbl_name} WHERE {uid}=?;
+                """,
+                tbl_name=DB_HELPED_TBL, uid=DB_FIELD_UID, pos=DB_FIELD_POS,
+            ), (tut.uid,)).fetchone()[0]
+            last = -1 if (last == None) else last
+            for pos in range(last + 1, len(tut.helped)):
+                helped_rows.append((tut.uid, pos, tut.helped[pos]))
+        self.__db_exec_many(
+            """
+            INSERT INTO {tbl_name} ({uid}, {pos}, {field}) VALUES (?, ?, ?);
+            """,
+            helped_rows,
+            tbl_name=DB_HELPED_TBL, uid=DB_FIELD_UID, pos=DB_FIELD_POS,
+            field=DB_FIELD_STU_UID,
+        )
+        if (commit):
+            self.__db_commit(db_connect)
+        self.db_timers["store"].observe(time.perf_counter() - start)
+        return [Bunny.__user_record(user) for user in users]
 
-    def __db_store_uid(self, uid, tbl, obj, idx=None, idx_val=None):
+    def __db_store_events(self, rows):
+        '''
+        Appends a batch of events to the event table in a single transaction
+        :param: rows List of (time, kind, UID, peer UID) tuples
         '''
-        Takes an object, serializes it into JSON, and stores it in the database
-        :param: uid Value of the UID key to store
-        :param: tbl Table to store to
-        :param: obj Object to serialize and store
-        :param: idx Optional index (secondary key)
-        :param: idx_val Optional index value (secondary key)
-        :return: JSON string stored in the database
+        db_connect = self.__db_connect()
+        sql = self.__db_stmt(
+            """
+            INSERT INTO {tbl_name} ({ts}, {kind}, {uid}, {peer})
+            VALUES (?, ?, ?, ?);
+            """,
+            tbl_name=DB_EVENT_TBL, ts=DB_FIELD_TS, kind=DB_FIELD_KIND,
+            uid=DB_FIELD_UID, peer=DB_FIELD_PEER_UID,
+        )
+        start = time.perf_counter()
+        db_connect.executemany(sql, rows)
+        self.__db_commit(db_connect)
+        self.db_timers["events"].observe(time.perf_counter() - start)
+
+    def __db_exec_many(self, template, params, **fields):
         '''
-        return self.__db_store(DB_FIELD_UID, uid, tbl, obj, idx, idx_val)
-        
+        Runs a statement once for every set of parameters, if there are any
+        :param: template SQL statement template with {name} placeholders
+        :param: params List of parameter tuples
+        :param: fields Table and field names to fill into the template
+        '''
+        if (len(params) > 0):
+            self.__db_connect().executemany(
+                self.__db_stmt(template, **fields), params)
+
     ## END: DB Functions ##
+
+    ## BEGIN: Cache Functions ##
+
+    def __cache_load(self, key, key_val):
+        '''
+        Loads a user's JSON map through the user cache, falling back to the
+        database on a miss. Loaded records are cached by both UID and user
+        name, since logins look users up by name and everything else by UID
+        :param: key Key (name) to load by; DB_FIELD_UID or DB_FIELD_UNAME
+        :param: key_val Value of the key to load
+        :return: JSON dictionary mappings of the user or None if failure
+        '''
+        json_map = self.user_cache.get((key, key_val))
+        if (json_map != None):
+            return json_map
+        json_map = self.__db_load(key, key_val, DB_USER_TBL)
+        if (json_map != None):
+            self.__cache_store(json_map)
+        return json_map
+
+    def __cache_store(self, json_map):
+        '''
+        Caches a user's decoded record under both its UID and user name
+        :param: json_map JSON dictionary mappings of the user
+        '''
+        if ((DB_FIELD_UID in json_map) and ("name" in json_map)):
+            self.user_cache.put((DB_FIELD_UID, json_map[DB_FIELD_UID]),
+                json_map)
+            self.user_cache.put((DB_FIELD_UNAME, json_map["name"]), json_map)
+
+    def __cache_invalidate(self, user):
+        '''
+        Drops a user's cached record; called whenever the user is changed
+        :param: user User object being stored
+        '''
+        self.user_cache.invalidate((DB_FIELD_UID, user.uid))
+        self.user_cache.invalidate((DB_FIELD_UNAME, user.name))
+
+    ## END: Cache Functions ##
+
+    ## BEGIN: Write-Behind Functions ##
+
+    def __wb_load(self, uid):
+        '''
+        Loads a JSON map of a user that is waiting to be written to the
+        database, exactly as it would be loaded once written
+        :param: uid UID of the user to load
+        :return: JSON dictionary mappings of the user
+        '''
+        return Bunny.__user_record(self.dirty[uid])
+
+    def __wb_store(self, users):
+        '''
+        Writes a batch of changed users to the database. If the batch fails,
+        the users are written one at a time and any user that still can't be
+        written is dropped, so one bad record can't hold back the rest
+        :param: users List of User objects to store
+        :return: List of JSON dictionary mappings of the users written
+        '''
+        try:
+            return self.__db_store_users(users)
+        except DB_STORE_ERRORS:
+            self.__db_rollback(self.__db_connect())
+        json_maps = []
+        for user in users:
+            try:
+                json_maps += self.__db_store_users([user])
+            except DB_STORE_ERRORS as err:
+                self.__db_rollback(self.__db_connect())
+                print("Dropped unwritable user " + str(user.uid) + ": "
+                    + str(err))
+        return json_maps
+
+    ## END: Write-Behind Functions ##
+
+    ## BEGIN: Record Functions ##
+
+    @staticmethod
+    def __user_row(user):
+        '''
+        Builds a user's row of the user table
+        :param: user User object
+        :return: Tuple of values, in the order of USER_FIELDS
+        '''
+        title = None
+        bio = None
+        busy = None
+        if (isinstance(user, Tutor)):
+            title = user.exp.title
+            bio = user.exp.bio
+            busy = int(user.busy)
+        return (user.uid, user.name, user.email, user.passwd, user.f_name,
+            user.l_name, user.stats.q_count, user.stats.login_count, title,
+            bio, busy)
+
+    @staticmethod
+    def __user_map(row, course_ids, helped):
+        '''
+        Builds a user's JSON map, shaped like the user's JSON serialization,
+        from their row of the user table
+        :param: row Tuple of values, in the order of USER_FIELDS
+        :param: course_ids Courses the user can help with (tutors only)
+        :param: helped UIDs of the students the user has helped (tutors only)
+        :return: JSON dictionary mappings of the user
+        '''
+        uid = row[0]
+        json_map = {
+            "uid":    uid,
+            "name":   row[1],
+            "email":  row[2],
+            "passwd": row[3],
+            "f_name": row[4],
+            "l_name": row[5],
+            "stats":  {"uid": uid, "q_count": row[6], "login_count": row[7]},
+        }
+        if (Tutor.is_tut(uid)):
+            json_map["exp"] = {"uid": uid, "title": row[8], "bio": row[9],
+                "course_ids": list(course_ids)}
+            json_map["busy"] = bool(row[10])
+            json_map["helped"] = list(helped)
+        return json_map
+
+    @staticmethod
+    def __user_record(user):
+        '''
+        Builds a user's JSON map, exactly as it would be loaded from the
+        database
+        :param: user User object
+        :return: JSON dictionary mappings of the user
+        '''
+        if (isinstance(user, Tutor)):
+            return Bunny.__user_map(Bunny.__user_row(user), user.exp.course_ids,
+                user.helped)
+        return Bunny.__user_map(Bunny.__user_row(user), [], [])
+
+    @staticmethod
+    def __user_from_map(json_map):
+        '''
+        Builds the right kind of User object out of a JSON map
+        :param: json_map JSON dictionary mappings of the user
+        :return: Student or Tutor object, or None if the UID is unknown
+        '''
+        uid = json_map.get(DB_FIELD_UID)
+        if (Tutor.is_tut(uid)):
+            return Tutor(init_map=json_map)
+        elif (Student.is_stu(uid)):
+            return Student(init_map=json_map)
+        return None
+
+    ## END: Record Functions ##
     #### END: Internal Functions ####
 
     def register(self, user):
@@ -357,19 +764,20 @@ class Bunny:
             # ...if we are in a debug mode, we ignore this issue for testing
             if (DEBUG_MACRO or DEBUG_DB):
                 uid = json_map[DB_FIELD_UID]
+                # a tutor's UID can't be handed to a student, or vice versa
+                if (Tutor.is_tut(uid) != isinstance(user, Tutor)):
+                    return None
                 user.uid = uid
             # ...otherwise, don't let the user log in
             else:
                 return None
-        print(uid)
-        print(user)
+        printd("Registered " + str(user))
         # hash on the uid
         self.uid_tbl[uid] = user
         # TODO error checking before alerting the user of success
         # check for duplicates
         # register user with DB
-        self.__db_store_uid(uid, DB_USER_TBL, user, idx=DB_FIELD_UNAME,
-            idx_val=user.name)
+        self.mark_dirty(user)
         # send a message so that the client can pick up their UID
         var_tbl = {}
         var_tbl[MSG_PARAM_METHOD] = MSG_USER_ENTER
@@ -403,16 +811,29 @@ class Bunny:
             self.__send_msg(UID_BOOTSTRAP_QUEUE, var_tbl)
             return None
 
-        uid = json_map[DB_FIELD_UID]
-        user = None
         # decide which user gets generated
-        if (Tutor.is_tut(uid)):
-            user = Tutor(init_map=json_map)
-        elif (Student.is_stu(uid)):
-            user = Student(init_map=json_map)
+        user = Bunny.__user_from_map(json_map)
         # register the user with the current status of the system
         return self.register(user)
 
+    def restore(self, json_map, dirty=True):
+        '''
+        Puts a user back in the system after a server restart, from a record
+        of the user as it was stored. Nothing is sent to the user's device
+        :param: json_map Dictionary of the user, as stored in the database
+        :param: dirty Optional parameter; False if the database is known to
+                be at least as fresh as the record
+        :return: User object restored or None if failure
+        '''
+        user = Bunny.__user_from_map(json_map)
+        if (user == None):
+            return None
+        self.uid_tbl[user.uid] = user
+        # the record may be newer than what made it to the database
+        if (dirty):
+            self.mark_dirty(user)
+        return user
+
     def deregister(self, uid):
         '''
         Removes a user; user disconnects from the system as they leave the
@@ -424,8 +845,9 @@ class Bunny:
         # remove look up in both directions
         if ((type(uid) is str) and (uid in self.uid_tbl)):
             # update user in DB
-            self.__db_store_uid(uid, DB_USER_TBL, self.uid_tbl[uid])
+            self.mark_dirty(self.uid_tbl[uid])
             del self.uid_tbl[uid]
+            self.codec_tbl.pop(uid, None)
             return uid
         # failure; UID is not a string or in the table
         return None
@@ -436,7 +858,8 @@ class Bunny:
         :param: uid User/UID that identifies who we are trying to talk to 
         :param: var_tbl Dictionary hash table that stores values to send over
                 the network in a packaged way.
-        :return: JSON string sent to device or None if there is a failure
+        :return: Encoded message sent to device (a JSON string by default) or
+                 None if there is a failure
         '''
         # perform some type checking and data validation
         uid = User.get_uid(uid)
@@ -444,6 +867,52 @@ class Bunny:
             return None
         return self.__send_msg(uid, var_tbl)
 
+    def send_msgs(self, msgs):
+        '''
+        Sends a batch of messages to user devices in a single publish
+        :param: msgs List of (User/UID, variable table) pairs to send
+        :return: List of encoded messages sent, with None for each message
+                 whose user isn't registered
+        '''
+        batch = []
+        result = []
+        for uid, var_tbl in msgs:
+            uid = User.get_uid(uid)
+            if not(uid in self.uid_tbl):
+                result.append(None)
+                continue
+            codec = self.codec_tbl.get(uid, JSON_CODEC)
+            msg_body = codec.encode(var_tbl)
+            batch.append((uid, msg_body, codec.content_type))
+            result.append(msg_body)
+        if (len(batch) > 0):
+            start = time.perf_counter()
+            self.publisher.publish_batch(batch)
+            self.pub_timer.observe(time.perf_counter() - start)
+            self.pub_count.inc(len(batch))
+            printd("Sent batch of " + str(len(batch)) + " messages")
+        return result
+
+    def set_codec(self, uid, content_type):
+        '''
+        Records the wire format a user's device speaks, so that messages sent
+        to it are encoded the same way as the messages it sends
+        :param: uid User/UID of the device
+        :param: content_type Content type of a message received from the
+                device; None or an unknown type means JSON
+        :return: Codec now used for the user or None if the user isn't
+                 registered
+        '''
+        uid = User.get_uid(uid)
+        if not(uid in self.uid_tbl):
+            return None
+        codec = get_codec(content_type)
+        if (codec is JSON_CODEC):
+            self.codec_tbl.pop(uid, None)
+        else:
+            self.codec_tbl[uid] = codec
+        return codec
+
     def fetch_user(self, uid):
         '''
         Fetches a User object that is registered to the system
@@ -454,19 +923,167 @@ class Bunny:
             return self.uid_tbl[uid]
         return None
 
+    def mark_dirty(self, user):
+        '''
+        Marks a user as changed. The user's state is written to the database
+        later, together with other changed users, once DB_FLUSH_SIZE users
+        are waiting or DB_FLUSH_INTERVAL seconds have passed
+        :param: user User object whose state changed
+        :return: Number of users waiting to be written
+        '''
+        if not(isinstance(user, User)):
+            return len(self.dirty)
+        self.dirty[user.uid] = user
+        self.dirty_names[user.name] = user.uid
+        self.__cache_invalidate(user)
+        if (len(self.dirty) >= DB_FLUSH_SIZE):
+            self.flush()
+        return len(self.dirty)
+
+    def record_event(self, kind, uid, peer_uid=None):
+        '''
+        Records something that happened in the Mentoring Center. Events are
+        kept in memory and appended to the event table later, in a batch
+        :param: kind Kind of event (EVENT_*)
+        :param: uid User/UID the event is about
+        :param: peer_uid Optional User/UID of the other user involved
+        :return: Number of events waiting to be written
+        '''
+        self.events.append((self.clock.time(), kind, User.get_uid(uid),
+            User.get_uid(peer_uid)))
+        if (len(self.events) >= DB_EVENT_FLUSH_SIZE):
+            self.flush()
+        return len(self.events)
+
+    def fetch_events(self, start=None, end=None, uid=None):
+        '''
+        Fetches recorded events, oldest first; e.g. all of an evening's
+        events, or everything a user did. Waiting events are written first
+        :param: start Optional time; only events at or after it are fetched
+        :param: end Optional time; only events before it are fetched
+        :param: uid Optional User/UID; only events about the user are fetched
+        :return: List of (time, kind, UID, peer UID) tuples
+        '''
+        self.flush()
+        conds = []
+        params = []
+        if (start != None):
+            conds.append(DB_FIELD_TS + ">=?")
+            params.append(start)
+        if (end != None):
+            conds.append(DB_FIELD_TS + "<?")
+            params.append(end)
+        if (uid != None):
+            conds.append(DB_FIELD_UID + "=?")
+            params.append(User.get_uid(uid))
+        sql = self.__db_stmt(
+            """
+            SELECT {ts}, {kind}, {uid}, {peer} FROM {tbl_name}
+            WHERE {conds} ORDER BY {event_id};
+            """,
+            tbl_name=DB_EVENT_TBL, ts=DB_FIELD_TS, kind=DB_FIELD_KIND,
+            uid=DB_FIELD_UID, peer=DB_FIELD_PEER_UID,
+            event_id=DB_FIELD_EVENT_ID,
+            conds=" AND ".join(conds) if (len(conds) > 0) else "1",
+        )
+        cur = self.__db_connect().execute(sql, params)
+        return cur.fetchall()
+
+    def fetch_top_users(self, uid_prefix=UID_PREFIX_STU, limit=10):
+        '''
+        Fetches the users that asked (students) or answered (tutors) the most
+        questions. Answered in SQL off the question count index; changed
+        users are written first
+        :param: uid_prefix UID prefix of the kind of user to rank
+        :param: limit Most users to fetch
+        :return: List of (UID, user name, question count) tuples, most
+                 questions first
+        '''
+        self.flush()
+        sql = self.__db_stmt(
+            """
+            SELECT {uid}, {uname}, {q_count} FROM {tbl_name}
+            WHERE {uid} LIKE ? ESCAPE '!'
+            ORDER BY {q_count} DESC LIMIT ?;
+            """,
+            tbl_name=DB_USER_TBL, uid=DB_FIELD_UID, uname=DB_FIELD_UNAME,
+            q_count=DB_FIELD_Q_COUNT,
+        )
+        # "_" is a wildcard in LIKE patterns
+        pattern = uid_prefix.replace("!", "!!").replace("_", "!_") + "%"
+        cur = self.__db_connect().execute(sql, (pattern, limit))
+        return cur.fetchall()
+
+    def flush(self):
+        '''
+        Writes every changed user to the database in a single transaction,
+        and appends the waiting events to the event table in another. Events
+        that can't be written are kept for the next flush
+        :return: Number of users flushed
+        '''
+        if (len(self.events) > 0):
+            events = self.events
+            self.events = []
+            try:
+                self.__db_store_events(events)
+                printd("Flushed " + str(len(events))
+                    + " events to the database")
+            except sqlite3.Error as err:
+                # keep the events, in order, for the next flush
+                self.__db_rollback(self.__db_connect())
+                self.events = events + self.events
+                print("Failed to flush events: " + str(err))
+        count = len(self.dirty)
+        if (count > 0):
+            json_maps = self.__wb_store(list(self.dirty.values()))
+            # the records just written are now the freshest copy; cache them
+            # so the next login doesn't have to go back to the database
+            for json_map in json_maps:
+                self.__cache_store(json_map)
+            self.dirty.clear()
+            self.dirty_names.clear()
+            printd("Flushed " + str(count) + " users to the database")
+        self.last_flush = self.clock.time()
+        return count
+
+    def tick(self):
+        '''
+        Periodic housekeeping; flushes changed users and events to the
+        database if they have been waiting for longer than DB_FLUSH_INTERVAL
+        seconds
+        :return: Number of users written
+        '''
+        if (((len(self.dirty) > 0) or (len(self.events) > 0))
+                and (self.clock.time() - self.last_flush
+                    >= DB_FLUSH_INTERVAL)):
+            return self.flush()
+        return 0
+
+    def close(self):
+        '''
+        Releases the resources held by the Bunny, such as the transport's
+        connections to the message broker and the database connection. Any
+        changed users are written to the database first
+        '''
+        self.flush()
+        self.transport.close()
+        if (self.db_connect != None):
+            self.__db_commit(self.db_connect)
+            self.db_connect.close()
+            self.db_connect = None
+
     @staticmethod
-    def parse_msg(msg_body):
+    def parse_msg(msg_body, content_type=None):
         '''
         Takes a message from a device/RabbitMQ and parses it into a hash table
-        :param: msg_body RabbitMQ body message received from a device/user
+        :param: msg_body RabbitMQ body message received from a device/user;
+                the raw bytes (or a memoryview/string) of the message
+        :param: content_type Content type (wire format) of the message, from
+                its RabbitMQ properties; None means JSON
         :return: Dictionary hash table that stores values to received over
                 the network in a packaged way.
         '''
-        json_str = str(msg_body)
-        # strip RabbitMQ's weird body tag information: b'<JSON>'
-        json_str = json_str[2:-1]
-        # return dictionary map
-        return json.loads(json_str)
+        return get_codec(content_type).decode(msg_body)
 
 #### MAIN       ####
 
@@ -474,7 +1091,88 @@ def main():
     '''
     Test program for this class
     '''
-    bunny = Bunny()
+    import os
+    import tempfile
+    from datagrams.json_db_encoder import JSON_DB_Encoder
+    from transport.mem_transport import MemTransport
+    # a database from before typed columns is migrated on start up
+    print("##### Database commands #####")
+    db_path = os.path.join(tempfile.mkdtemp(), "test.db")
+    stu9 = Student("old1234", "pass", "Old", "Timer")
+    stu9.q_increment()
+    tut9 = Tutor("tut9999", "pass", "Tutor", "Z", "TA")
+    tut9.exp.course_ids = ["CS1", "CS2"]
+    tut9.help(stu9.uid)
+    db_connect = sqlite3.connect(db_path)
+    db_connect.execute("CREATE TABLE Users (uid TEXT PRIMARY KEY, "
+        + "user_name TEXT, json_str TEXT);")
+    db_connect.execute("CREATE UNIQUE INDEX user_name_idx ON Users(user_name);")
+    for user in (stu9, tut9):
+        db_connect.execute("INSERT INTO Users VALUES (?, ?, ?);",
+            (user.uid, user.name, JSON_DB_Encoder.dumps(user)))
+    db_connect.commit()
+    db_connect.close()
+    bunny = Bunny(MemTransport(), db_path)
+    print(bunny.db_connect.execute("PRAGMA user_version;").fetchone()[0]
+        == DB_SCHEMA_VERSION)
+    stu = bunny.login("old1234", "pass")
+    print((stu.uid == stu9.uid) and (stu.stats.q_count == 1))
+    tut = bunny.login("tut9999", "pass")
+    print(tut.exp.course_ids == ["CS1", "CS2"])
+    print((tut.helped == [stu9.uid]) and tut.busy_status())
+    # changes are stored in the typed columns and side tables
+    tut.done()
+    tut.help("stu_other")
+    tut.exp.course_ids = ["CS3"]
+    bunny.mark_dirty(tut)
+    stu1 = Student("new1234", "pass", "New", "Comer")
+    bunny.register(stu1)
+    for i in range(0, 3):
+        stu1.q_increment()
+    bunny.mark_dirty(stu1)
+    print(bunny.fetch_top_users() == [(stu1.uid, "new1234", 3),
+        (stu9.uid, "old1234", 1)])
+    print(bunny.fetch_top_users(UID_PREFIX_TUT) == [(tut9.uid, "tut9999", 0)])
+    bunny.close()
+    bunny = Bunny(MemTransport(), db_path)
+    tut = bunny.login("tut9999", "pass")
+    print(tut.helped == [stu9.uid, "stu_other"])
+    print(tut.exp.course_ids == ["CS3"])
+    print(bunny.login("new1234", "pass").stats.q_count == 3)
+    # an unwritable user is dropped without holding back the others
+    bunny.flush()
+    tut.exp.course_ids = [["CS1"]]
+    bunny.mark_dirty(tut)
+    stu = bunny.login("old1234", "pass")
+    stu.q_increment()
+    bunny.mark_dirty(stu)
+    print(bunny.flush() == 2)
+    print(len(bunny.dirty) == 0)
+    # events survive a failed flush and are written by the next one
+    bunny.record_event(EVENT_LOGIN, stu)
+    bunny.db_connect.execute("ALTER TABLE " + DB_EVENT_TBL
+        + " RENAME TO held;")
+    bunny.flush()
+    print(len(bunny.events) == 1)
+    bunny.db_connect.execute("ALTER TABLE held RENAME TO "
+        + DB_EVENT_TBL + ";")
+    bunny.flush()
+    print((len(bunny.events) == 0) and (len(bunny.fetch_events()) == 1))
+    bunny.close()
+    bunny = Bunny(MemTransport(), db_path)
+    print(bunny.login("old1234", "pass").stats.q_count == 2)
+    print(bunny.login("tut9999", "pass").exp.course_ids == ["CS3"])
+    # a user name is never re-registered as the other type of user
+    if (DEBUG_MACRO or DEBUG_DB):
+        print(bunny.register(Student("tut9999", "pass", "Not", "Tutor"))
+            == None)
+        print(bunny.register(Tutor("old1234", "pass", "Not", "Student"))
+            == None)
+        stu = Student("old1234", "pass", "Old", "Timer")
+        print(bunny.register(stu).uid == stu9.uid)
+    bunny.close()
+
+    bunny = Bunny(MemTransport())
     stu0 = Student("aic4242", "pass", "Alice", "in Chains")
     stu1 = Student("bob8888", "pass", "Bob", "Man")
     stu2 = Student("exo6666", "xkcd", "Evil", "Oscar")
@@ -489,8 +1187,8 @@ def main():
     print("Deleted: " + str(bunny.deregister(stu2.uid)))
     print(bunny)
 
-    # send some stuff to RabbitMQ
-    print("Sending to RabbitMQ...")
+    # send some stuff to a device, through an in-process broker
+    print("Sending to a device...")
     test_vars = {}
     test_vars['name'] = stu0.name
     test_vars['uid'] = stu0.uid
@@ -499,7 +1197,19 @@ def main():
     print(bunny.send_msg(stu0, test_vars) == test_vars_json)
     print(bunny.send_msg(stu1, test_vars) == None)
     print("Parse JSON to Python dictionary:")
-    print(str(Bunny.parse_msg("b'" + test_vars_json + "'")))
+    print(str(Bunny.parse_msg(test_vars_json.encode("utf-8"))))
+    uni_json = json.dumps({"name": "Zo\u00eb", "q": "it's \"quoted\""},
+        ensure_ascii=False).encode("utf-8")
+    print(Bunny.parse_msg(uni_json)["name"] == "Zo\u00eb")
+    print(Bunny.parse_msg(memoryview(uni_json)) == Bunny.parse_msg(uni_json))
+    print("Binary wire format:")
+    print(bunny.set_codec(stu0, CONTENT_TYPE_BIN) != None)
+    bin_msg = bunny.send_msg(stu0, test_vars)
+    print(Bunny.parse_msg(bin_msg, CONTENT_TYPE_BIN) == test_vars)
+    print(bunny.set_codec(stu1, CONTENT_TYPE_BIN) == None)
+    bunny.set_codec(stu0, CONTENT_TYPE_JSON)
+    print(bunny.send_msg(stu0, test_vars) == test_vars_json)
+    bunny.close()
 
 if __name__ == "__main__":
     # package only used for testing purposes
@@ -0,0 +1,82 @@
+##
+## File:    clock.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that tell the server what time it is. The
+##              server normally runs on the system's monotonic clock; the
+##              simulator runs it on a virtual clock that only moves when the
+##              simulation says so
+##
+
+# Python libraries
+import time
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class Clock:
+    '''
+    Clock object, the system's monotonic clock
+    '''
+
+    def __str__(self):
+        '''
+        Converts clock to a string equivalent
+        '''
+        return "Clock(" + str(self.time()) + ")"
+
+    def time(self):
+        '''
+        Returns the current time
+        :return: Current time, in seconds
+        '''
+        return time.monotonic()
+
+class VirtualClock(Clock):
+    '''
+    VirtualClock object, a clock that is moved forward by hand
+    '''
+
+    def __init__(self, start=0.0):
+        '''
+        Constructs a VirtualClock
+        :param: start Time the clock starts at, in seconds
+        '''
+        self.now = start
+
+    def time(self):
+        '''
+        Returns the current (virtual) time
+        :return: Current time, in seconds
+        '''
+        return self.now
+
+    def advance(self, now):
+        '''
+        Moves the clock forward; the clock never goes backwards
+        :param: now New time, in seconds
+        :return: Current time, in seconds
+        '''
+        if (now > self.now):
+            self.now = now
+        return self.now
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    clock = Clock()
+    start = clock.time()
+    print(clock.time() >= start)
+    v_clock = VirtualClock(10.0)
+    print(v_clock.time() == 10.0)
+    print(v_clock.advance(12.5) == 12.5)
+    print(v_clock.advance(11.0) == 12.5)
+    print(v_clock.time() == 12.5)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+##
+## File:    codec.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that encode/decode messages sent between the
+##              server and client devices. JSON is the default wire format; a
+##              compact binary format is also supported for clients that ask
+##              for it. The format of a message is identified by the content
+##              type set on its RabbitMQ properties
+##
+
+# Python libraries
+import json
+import struct
+import uuid
+# faster JSON parser that works directly on bytes, if it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# project libraries
+from utils.macros import *
+
+#### GLOBALS    ####
+
+# shared JSON decoder for parsing incoming messages
+JSON_DECODER = json.JSONDecoder()
+
+# Binary format wire tables. Methods and field names are sent as small
+# integer codes (their position in these lists, starting at 1). These lists
+# are part of the wire format: only ever append to them
+BIN_METHODS = [
+    MSG_STU_ENTER,
+    MSG_TUT_ENTER,
+    MSG_USER_ENTER,
+    MSG_USER_LEAVE,
+    MSG_USER_HELPED,
+    MSG_STU_QUEST,
+    MSG_STU_ANS,
+    MSG_TUT_HELP,
+    MSG_TUT_DONE,
+    MSG_STU_POS,
+    MSG_ERR_USER_LOGIN,
+    MSG_ERR_STU_QUEUED,
+]
+BIN_FIELDS = [
+    MSG_PARAM_METHOD,
+    MSG_PARAM_USER_NAME,
+    MSG_PARAM_USER_PASSWD,
+    MSG_PARAM_USER_F_NAME,
+    MSG_PARAM_USER_L_NAME,
+    MSG_PARAM_USER_TITLE,
+    MSG_PARAM_USER_UID,
+    MSG_PARAM_STU_UID,
+    MSG_PARAM_TUT_UID,
+    MSG_PARAM_STU_POS,
+    MSG_PARAM_QUEUE_LEN,
+    MSG_PARAM_STU_ETA,
+]
+# UID prefixes that can be packed as a code plus the raw 16 UUID bytes
+BIN_UID_PREFIXES = [
+    UID_PREFIX_STU,
+    UID_PREFIX_TUT,
+]
+
+# version byte that starts every binary message
+BIN_VERSION = 1
+# field code for a field that isn't in BIN_FIELDS; its name follows as a string
+BIN_FIELD_NAMED = 0
+# value type codes
+BIN_T_NONE   = 0
+BIN_T_FALSE  = 1
+BIN_T_TRUE   = 2
+BIN_T_INT    = 3
+BIN_T_FLOAT  = 4
+BIN_T_STR    = 5
+BIN_T_METHOD = 6
+BIN_T_UID    = 7
+BIN_T_LIST   = 8
+BIN_T_MAP    = 9
+
+# reverse look ups of the wire tables
+BIN_METHOD_CODES = {method: i + 1 for i, method in enumerate(BIN_METHODS)}
+BIN_FIELD_CODES  = {field: i + 1 for i, field in enumerate(BIN_FIELDS)}
+BIN_UID_CODES    = {prefix: i + 1 for i, prefix in enumerate(BIN_UID_PREFIXES)}
+BIN_FLOAT        = struct.Struct("<d")
+
+#### CLASS      ####
+
+class JsonCodec:
+    '''
+    JsonCodec object, encodes messages as JSON text
+    '''
+
+    def __init__(self):
+        '''
+        Constructs a JsonCodec
+        '''
+        self.content_type = CONTENT_TYPE_JSON
+
+    def __str__(self):
+        '''
+        Converts codec to a string equivalent
+        '''
+        return "JsonCodec(" + self.content_type + ")"
+
+    def encode(self, var_tbl):
+        '''
+        Encodes a message
+        :param: var_tbl Dictionary hash table of the message
+        :return: JSON string of the message
+        '''
+        return json.dumps(var_tbl)
+
+    def decode(self, msg_body):
+        '''
+        Decodes a message
+        :param: msg_body Raw bytes (or a memoryview/string) of a JSON message
+        :return: Dictionary hash table of the message
+        '''
+        # the faster parser reads bytes, memoryviews and strings as they are
+        if (orjson != None):
+            return orjson.loads(msg_body)
+        # otherwise decode the UTF-8 body straight from the buffer; a shared
+        # decoder skips json.loads() argument handling on every message
+        if not(isinstance(msg_body, str)):
+            msg_body = str(msg_body, "utf-8")
+        return JSON_DECODER.decode(msg_body)
+
+class BinCodec:
+    '''
+    BinCodec object, encodes messages in a compact binary format:
+      message := version-byte field*
+      field   := field-code value | 0 string value
+      value   := type-byte payload
+    Methods are sent as integer codes, field names as one-byte codes, student
+    and tutor UIDs as a prefix code plus 16 raw bytes, and integers/lengths as
+    variable-length integers
+    '''
+
+    def __init__(self):
+        '''
+        Constructs a BinCodec
+        '''
+        self.content_type = CONTENT_TYPE_BIN
+
+    def __str__(self):
+        '''
+        Converts codec to a string equivalent
+        '''
+        return "BinCodec(" + self.content_type + ")"
+
+    #### BEGIN: Internal Functions ####
+    def __put_varint(self, out, num):
+        '''
+        Writes a non-negative integer, 7 bits per byte
+        :param: out bytearray to write to
+        :param: num Integer to write
+        '''
+        if (num < 0x80):
+            out.append(num)
+            return
+        while (num >= 0x80):
+            out.append((num & 0x7F) | 0x80)
+            num >>= 7
+        out.append(num)
+
+    def __get_varint(self, buf, pos):
+        '''
+        Reads a non-negative integer written by __put_varint()
+        :param: buf Buffer to read from
+        :param: pos Position to read at
+        :return: (integer, position after the integer)
+        '''
+        if (buf[pos] < 0x80):
+            return buf[pos], pos + 1
+        num = 0
+        shift = 0
+        while (True):
+            byte = buf[pos]
+            pos += 1
+            num |= (byte & 0x7F) << shift
+            if (byte < 0x80):
+                return num, pos
+            shift += 7
+
+    def __put_str(self, out, val):
+        '''
+        Writes a length-prefixed UTF-8 string
+        :param: out bytearray to write to
+        :param: val String to write
+        '''
+        raw = val.encode("utf-8")
+        self.__put_varint(out, len(raw))
+        out += raw
+
+    def __get_str(self, buf, pos):
+        '''
+        Reads a string written by __put_str()
+        :param: buf Buffer to read from
+        :param: pos Position to read at
+        :return: (string, position after the string)
+        '''
+        length, pos = self.__get_varint(buf, pos)
+        end = pos + length
+        if (end > len(buf)):
+            raise ValueError("Truncated binary message")
+        return str(buf[pos:end], "utf-8"), end
+
+    def __uid_code(self, val):
+        '''
+        Checks if a string is a UID that can be packed
+        :param: val String to check
+        :return: (prefix code, UUID) or (None, None) if it can't be packed
+        '''
+        if (len(val) != 40):
+            return None, None
+        code = BIN_UID_CODES.get(val[:4])
+        if (code == None):
+            return None, None
+        try:
+            raw = bytes.fromhex(val[4:].replace("-", ""))
+        except ValueError:
+            return None, None
+        # only pack UIDs that will unpack to exactly the same string
+        if ((len(raw) != 16) or (self.__uid_str(raw) != val[4:])):
+            return None, None
+        return code, raw
+
+    def __uid_str(self, raw):
+        '''
+        Formats 16 raw UUID bytes the way str(uuid.UUID) does
+        :param: raw UUID bytes
+        :return: UUID string
+        '''
+        h = raw.hex()
+        return (h[:8] + "-" + h[8:12] + "-" + h[12:16] + "-" + h[16:20] + "-"
+            + h[20:])
+
+    def __put_value(self, out, val, is_method=False):
+        '''
+        Writes a type-tagged value
+        :param: out bytearray to write to
+        :param: val Value to write
+        :param: is_method True if the value is a message method
+        '''
+        if (val == None):
+            out.append(BIN_T_NONE)
+        elif (val is False):
+            out.append(BIN_T_FALSE)
+        elif (val is True):
+            out.append(BIN_T_TRUE)
+        elif (isinstance(val, int)):
+            out.append(BIN_T_INT)
+            # zig-zag encoding keeps small negative numbers small
+            self.__put_varint(out, (val << 1) if (val >= 0) else ((-val << 1) - 1))
+        elif (isinstance(val, float)):
+            out.append(BIN_T_FLOAT)
+            out += BIN_FLOAT.pack(val)
+        elif (isinstance(val, str)):
+            if (is_method and (val in BIN_METHOD_CODES)):
+                out.append(BIN_T_METHOD)
+                self.__put_varint(out, BIN_METHOD_CODES[val])
+                return
+            code, raw = self.__uid_code(val)
+            if (code != None):
+                out.append(BIN_T_UID)
+                out.append(code)
+                out += raw
+            else:
+                out.append(BIN_T_STR)
+                self.__put_str(out, val)
+        elif (isinstance(val, (list, tuple))):
+            out.append(BIN_T_LIST)
+            self.__put_varint(out, len(val))
+            for item in val:
+                self.__put_value(out, item)
+        elif (isinstance(val, dict)):
+            out.append(BIN_T_MAP)
+            self.__put_varint(out, len(val))
+            self.__put_fields(out, val)
+        else:
+            raise TypeError("Can't binary encode " + str(type(val)))
+
+    def __get_code(self, table, code, what):
+        '''
+        Looks up a code of one of the wire tables
+        :param: table Wire table (e.g. BIN_METHODS) the code indexes
+        :param: code Code read off the wire; codes start at 1
+        :param: what What the code stands for, for the error message
+        :return: Entry of the table
+        '''
+        if not(1 <= code <= len(table)):
+            raise ValueError("Unknown binary " + what + " code " + str(code))
+        return table[code - 1]
+
+    def __get_value(self, buf, pos):
+        '''
+        Reads a value written by __put_value()
+        :param: buf Buffer to read from
+        :param: pos Position to read at
+        :return: (value, position after the value)
+        '''
+        v_type = buf[pos]
+        pos += 1
+        if (v_type == BIN_T_NONE):
+            return None, pos
+        if (v_type == BIN_T_FALSE):
+            return False, pos
+        if (v_type == BIN_T_TRUE):
+            return True, pos
+        if (v_type == BIN_T_INT):
+            num, pos = self.__get_varint(buf, pos)
+            return ((num >> 1) if not(num & 1) else -((num + 1) >> 1)), pos
+        if (v_type == BIN_T_FLOAT):
+            return BIN_FLOAT.unpack_from(buf, pos)[0], pos + BIN_FLOAT.size
+        if (v_type == BIN_T_STR):
+            return self.__get_str(buf, pos)
+        if (v_type == BIN_T_METHOD):
+            code, pos = self.__get_varint(buf, pos)
+            return self.__get_code(BIN_METHODS, code, "method"), pos
+        if (v_type == BIN_T_UID):
+            prefix = self.__get_code(BIN_UID_PREFIXES, buf[pos], "UID prefix")
+            raw = bytes(buf[pos + 1:pos + 17])
+            if (len(raw) != 16):
+                raise ValueError("Truncated binary message")
+            return prefix + self.__uid_str(raw), pos + 17
+        if (v_type == BIN_T_LIST):
+            count, pos = self.__get_varint(buf, pos)
+            lst = []
+            for i in range(0, count):
+                item, pos = self.__get_value(buf, pos)
+                lst.append(item)
+            return lst, pos
+        if (v_type == BIN_T_MAP):
+            count, pos = self.__get_varint(buf, pos)
+            return self.__get_fields(buf, pos, count)
+        raise ValueError("Unknown binary value type " + str(v_type))
+
+    def __put_fields(self, out, var_tbl):
+        '''
+        Writes the fields of a map
+        :param: out bytearray to write to
+        :param: var_tbl Dictionary to write
+        '''
+        for key, val in var_tbl.items():
+            code = BIN_FIELD_CODES.get(key)
+            if (code != None):
+                out.append(code)
+            else:
+                out.append(BIN_FIELD_NAMED)
+                self.__put_str(out, str(key))
+            self.__put_value(out, val, key == MSG_PARAM_METHOD)
+
+    def __get_fields(self, buf, pos, count=None):
+        '''
+        Reads fields written by __put_fields()
+        :param: buf Buffer to read from
+        :param: pos Position to read at
+        :param: count Number of fields to read, or None to read to the end
+        :return: (dictionary, position after the fields)
+        '''
+        var_tbl = {}
+        while (((count == None) and (pos < len(buf)))
+                or ((count != None) and (len(var_tbl) < count))):
+            code = buf[pos]
+            pos += 1
+            if (code == BIN_FIELD_NAMED):
+                key, pos = self.__get_str(buf, pos)
+            else:
+                key = self.__get_code(BIN_FIELDS, code, "field")
+            var_tbl[key], pos = self.__get_value(buf, pos)
+        return var_tbl, pos
+    #### END: Internal Functions ####
+
+    def encode(self, var_tbl):
+        '''
+        Encodes a message
+        :param: var_tbl Dictionary hash table of the message
+        :return: Bytes of the binary message
+        '''
+        out = bytearray()
+        out.append(BIN_VERSION)
+        self.__put_fields(out, var_tbl)
+        return bytes(out)
+
+    def decode(self, msg_body):
+        '''
+        Decodes a message
+        :param: msg_body Raw bytes (or a memoryview) of a binary message
+        :return: Dictionary hash table of the message
+        '''
+        buf = memoryview(msg_body)
+        if ((len(buf) == 0) or (buf[0] != BIN_VERSION)):
+            raise ValueError("Unsupported binary message version")
+        try:
+            var_tbl, pos = self.__get_fields(buf, 1)
+        except (IndexError, struct.error):
+            raise ValueError("Truncated or corrupt binary message")
+        return var_tbl
+
+#### FUNCTIONS  ####
+
+# codecs by content type
+JSON_CODEC = JsonCodec()
+BIN_CODEC = BinCodec()
+CODECS = {
+    CONTENT_TYPE_JSON: JSON_CODEC,
+    CONTENT_TYPE_BIN:  BIN_CODEC,
+}
+
+def get_codec(content_type):
+    '''
+    Finds the codec for a content type
+    :param: content_type Content type of a message; messages without one (or
+            with an unknown one) are JSON
+    :return: Codec object
+    '''
+    return CODECS.get(content_type, JSON_CODEC)
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    msgs = [
+        {
+            MSG_PARAM_METHOD:    MSG_STU_POS,
+            MSG_PARAM_STU_UID:   UID_PREFIX_STU + str(uuid.uuid4()),
+            MSG_PARAM_STU_POS:   12,
+            MSG_PARAM_QUEUE_LEN: 340,
+        },
+        {
+            MSG_PARAM_METHOD:      MSG_TUT_ENTER,
+            MSG_PARAM_USER_NAME:   "Zoë",
+            MSG_PARAM_USER_PASSWD: "it's \"quoted\"",
+            "not_a_known_field":   [1, -2, 3.5, None, True, False, {"a": "b"}],
+            MSG_PARAM_TUT_UID:     "tut_not-a-uuid",
+        },
+        {
+            MSG_PARAM_METHOD: "some_future_method",
+            MSG_PARAM_STU_POS: None,
+        },
+    ]
+    print("##### Round trip commands #####")
+    for msg in msgs:
+        bin_msg = BIN_CODEC.encode(msg)
+        json_msg = JSON_CODEC.encode(msg)
+        print(BIN_CODEC.decode(bin_msg) == msg)
+        print(JSON_CODEC.decode(json_msg.encode("utf-8")) == msg)
+        print(str(len(json_msg)) + " JSON bytes -> " + str(len(bin_msg))
+            + " binary bytes")
+    print("##### Negotiation commands #####")
+    print(get_codec(None) is JSON_CODEC)
+    print(get_codec(CONTENT_TYPE_JSON) is JSON_CODEC)
+    print(get_codec(CONTENT_TYPE_BIN) is BIN_CODEC)
+    print("##### Error commands #####")
+    # codes outside the wire tables (0 or past the end) are rejected
+    method = bytes([BIN_VERSION, BIN_FIELD_CODES[MSG_PARAM_METHOD],
+        BIN_T_METHOD])
+    uid = bytes([BIN_VERSION, BIN_FIELD_CODES[MSG_PARAM_STU_UID], BIN_T_UID])
+    for bad in [b"", b"\x07", BIN_CODEC.encode(msgs[0])[:-3],
+            method + bytes([0]), method + bytes([len(BIN_METHODS) + 1]),
+            uid + bytes([0]) + bytes(16),
+            uid + bytes([len(BIN_UID_PREFIXES) + 1]) + bytes(16),
+            bytes([BIN_VERSION, len(BIN_FIELDS) + 1, BIN_T_NONE]),
+            bytes([BIN_VERSION, BIN_FIELD_CODES[MSG_PARAM_STU_POS],
+                BIN_T_FLOAT]) + bytes(2)]:
+        try:
+            BIN_CODEC.decode(bad)
+            print(False)
+        except ValueError:
+            print(True)
+
+if __name__ == "__main__":
+    main()
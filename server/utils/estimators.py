@@ -0,0 +1,195 @@
+##
+## File:    estimators.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that estimate statistics of a stream of values
+##              (e.g. how long students wait) in constant memory and constant
+##              time per value: an exponentially weighted moving average and
+##              the P-square quantile estimator of Jain and Chlamtac
+##
+
+# Python libraries
+from bisect import bisect_right, insort
+
+# project libraries
+from utils.macros import *
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class EWMA:
+    '''
+    EWMA object, an exponentially weighted moving average. Recent values
+    count the most, so the average follows the Mentoring Center through the
+    evening
+    '''
+
+    def __init__(self, alpha=EST_ALPHA, initial=None):
+        '''
+        Constructs an EWMA
+        :param: alpha Weight of each new value, between 0 and 1
+        :param: initial Optional value reported until the first update
+        '''
+        self.alpha = alpha
+        self.value = initial
+        self.count = 0
+
+    def __str__(self):
+        '''
+        Converts the average to a string equivalent
+        '''
+        return "EWMA(" + str(self.value) + ", n=" + str(self.count) + ")"
+
+    def update(self, x):
+        '''
+        Adds a value to the average
+        :param: x New value
+        '''
+        if (self.count == 0):
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        self.count += 1
+
+class P2Quantile:
+    '''
+    P2Quantile object, estimates a quantile of a stream without storing it.
+    Five markers track the minimum, the quantile, the maximum and two points
+    in between; each update moves the markers towards where they should be
+    with a piecewise-parabolic fit
+    '''
+
+    def __init__(self, p=EST_QUANTILE):
+        '''
+        Constructs a P2Quantile
+        :param: p Quantile to estimate, between 0 and 1 (e.g. 0.9)
+        '''
+        self.p = p
+        self.count = 0
+        # marker heights, positions, desired positions and the increments of
+        # the desired positions
+        self.heights = []
+        self.pos = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incr = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def __str__(self):
+        '''
+        Converts the estimator to a string equivalent
+        '''
+        return ("P2Quantile(p=" + str(self.p) + ", " + str(self.value())
+            + ", n=" + str(self.count) + ")")
+
+    #### BEGIN: Internal Functions ####
+    def __parabolic(self, i, d):
+        '''
+        Piecewise-parabolic prediction of a marker's height once it is moved
+        :param: i Index of the marker
+        :param: d Direction it moves, 1 or -1
+        :return: Predicted height
+        '''
+        q = self.heights
+        n = self.pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def __linear(self, i, d):
+        '''
+        Linear prediction of a marker's height once it is moved
+        :param: i Index of the marker
+        :param: d Direction it moves, 1 or -1
+        :return: Predicted height
+        '''
+        q = self.heights
+        n = self.pos
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+    #### END: Internal Functions ####
+
+    def update(self, x):
+        '''
+        Adds a value to the stream
+        :param: x New value
+        '''
+        self.count += 1
+        q = self.heights
+        # the first five values become the markers
+        if (self.count <= 5):
+            insort(q, x)
+            return
+        # find the cell the value falls in, stretching the ends if need be
+        if (x < q[0]):
+            q[0] = x
+            k = 0
+        elif (x >= q[4]):
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+        n = self.pos
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(0, 5):
+            self.desired[i] += self.incr[i]
+        # move the middle markers that have drifted off by a position or more
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (((d >= 1) and (n[i + 1] - n[i] > 1))
+                    or ((d <= -1) and (n[i - 1] - n[i] < -1))):
+                d = 1 if (d > 0) else -1
+                height = self.__parabolic(i, d)
+                if not(q[i - 1] < height < q[i + 1]):
+                    height = self.__linear(i, d)
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        '''
+        Returns the estimate of the quantile
+        :return: Estimated quantile or None if nothing has been seen
+        '''
+        if (self.count == 0):
+            return None
+        # exact (nearest rank) until there are enough values for the markers
+        if (self.count <= 5):
+            return self.heights[int(round(self.p * (self.count - 1)))]
+        return self.heights[2]
+
+#### FUNCTIONS  ####
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    import random
+    rng = random.Random(42)
+    print("##### EWMA commands #####")
+    avg = EWMA(0.5, 10.0)
+    print(avg.value == 10.0)
+    avg.update(4.0)
+    print(avg.value == 4.0)
+    avg.update(8.0)
+    print(avg.value == 6.0)
+    print(avg.count == 2)
+    print("##### P2Quantile commands #####")
+    est = P2Quantile(0.9)
+    print(est.value() == None)
+    for x in (5, 1, 3):
+        est.update(x)
+    print(est.value() == 5)
+    for p in (0.5, 0.9, 0.99):
+        values = [rng.expovariate(1 / 300.0) for i in range(0, 20000)]
+        est = P2Quantile(p)
+        for x in values:
+            est.update(x)
+        exact = sorted(values)[int(p * (len(values) - 1))]
+        print(abs(est.value() - exact) / exact < 0.05)
+        print(len(est.heights) == 5)
+    print(str(est))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+##
+## File:    fenwick_tree.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that defines a Fenwick tree (binary indexed
+##              tree), an order-statistics structure that supports point
+##              updates and prefix sums in O(log n) time
+##
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class FenwickTree:
+    '''
+    Fenwick tree over the integer positions [0, size)
+    '''
+
+    def __init__(self, size=0, values=None):
+        '''
+        Constructs a Fenwick tree
+        :param: size Number of positions the tree covers
+        :param: values Optional list of initial values, one per position. The
+                tree is built from this in O(n) time
+        '''
+        if (values != None):
+            size = max(size, len(values))
+        self.size = size
+        # the tree is 1-indexed internally; slot 0 is unused
+        self.tree = [0] * (size + 1)
+        if (values != None):
+            for i in range(0, len(values)):
+                self.tree[i + 1] += values[i]
+            for i in range(1, size + 1):
+                parent = i + (i & -i)
+                if (parent <= size):
+                    self.tree[parent] += self.tree[i]
+
+    def __str__(self):
+        '''
+        Converts tree to a string equivalent
+        '''
+        return "FenwickTree(" + str(self.size) + "): total " + str(self.total())
+
+    def add(self, pos, delta):
+        '''
+        Adds a value to a position
+        :param: pos Position to update
+        :param: delta Value to add to the position
+        '''
+        i = pos + 1
+        while (i <= self.size):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, pos):
+        '''
+        Sums all positions up to and including a position
+        :param: pos Last position to include in the sum
+        :return: Sum of positions [0, pos]
+        '''
+        result = 0
+        i = min(pos + 1, self.size)
+        while (i > 0):
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+    def total(self):
+        '''
+        Sums every position in the tree
+        :return: Sum of all positions
+        '''
+        return self.prefix_sum(self.size - 1)
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    print("##### Build commands #####")
+    tree = FenwickTree(values=[1, 1, 0, 1, 1])
+    print(tree.size == 5)
+    print(tree.total() == 4)
+    print(tree.prefix_sum(0) == 1)
+    print(tree.prefix_sum(2) == 2)
+    print(tree.prefix_sum(3) == 3)
+    print("##### Update commands #####")
+    tree.add(1, -1)
+    print(tree.prefix_sum(3) == 2)
+    tree.add(2, 1)
+    print(tree.prefix_sum(2) == 2)
+    print(tree.total() == 4)
+    print(str(tree))
+    print("##### Build matches updates #####")
+    built = FenwickTree(values=[3, 0, 2, 7, 1, 4])
+    added = FenwickTree(6)
+    for i, val in enumerate([3, 0, 2, 7, 1, 4]):
+        added.add(i, val)
+    print(built.tree == added.tree)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+##
+## File:    load_gen.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that generates synthetic Mentoring Center traffic
+##              against the server: students arrive, ask questions, wait to be
+##              helped, check their place in line and leave, while tutors help
+##              them. Clients are simulated in simulated time and talk to the
+##              server through an in-process MemBroker, so an evening's worth
+##              of traffic runs as fast as the server can handle it
+##
+
+# Python libraries
+import heapq
+import random
+
+# project libraries
+from utils.macros import *
+from utils.codec import get_codec
+
+#### GLOBALS    ####
+
+# simulated client events
+EV_STU_ARRIVE = "stu_arrive"
+EV_STU_ASK    = "stu_ask"
+EV_STU_POLL   = "stu_poll"
+EV_STU_LEAVE  = "stu_leave"
+EV_TUT_ARRIVE = "tut_arrive"
+EV_TUT_DONE   = "tut_done"
+EV_TUT_LEAVE  = "tut_leave"
+
+#### CLASS      ####
+
+class LoadGen:
+    '''
+    LoadGen object, simulates a room full of student and tutor devices
+    Every client action is an event at a simulated time. Events that are due
+    within the same LOAD_STEP are sent to the server together, the server is
+    run until its queue is empty, and the replies it sent schedule the next
+    events (e.g. a tutor that was told to help a student finishes one service
+    time later)
+    '''
+
+    def __init__(self, broker, students=LOAD_STUDENTS, tutors=LOAD_TUTORS,
+            arrival_window=LOAD_ARRIVAL_WINDOW, service_time=LOAD_SERVICE_TIME,
+            reask_prob=LOAD_REASK_PROB, think_time=LOAD_THINK_TIME,
+            poll_time=LOAD_POLL_TIME, content_type=None, seed=None,
+            clock=None):
+        '''
+        Constructs a LoadGen
+        :param: broker MemBroker the server consumes from
+        :param: students Number of students that show up
+        :param: tutors Number of tutors on duty
+        :param: arrival_window Simulated seconds over which students arrive
+        :param: service_time Mean session length in seconds (sessions are
+                exponentially distributed), or a function that is handed a
+                random.Random and returns a session length
+        :param: reask_prob Chance a student asks another question once helped
+        :param: think_time Mean time before a student asks another question
+        :param: poll_time How often a waiting student checks their position;
+                0 or None disables position checks
+        :param: content_type Wire format the clients speak; JSON by default
+        :param: seed Random seed, for repeatable runs
+        :param: clock Optional VirtualClock the server runs on; it is moved
+                along with simulated time
+        '''
+        self.broker = broker
+        self.n_stus = students
+        self.n_tuts = tutors
+        self.arrival_window = arrival_window
+        if (callable(service_time)):
+            self.service_time = service_time
+        else:
+            self.service_time = lambda rng: rng.expovariate(1.0 / service_time)
+        self.reask_prob = reask_prob
+        self.think_time = think_time
+        self.poll_time = poll_time
+        self.content_type = content_type
+        self.codec = get_codec(content_type)
+        self.rng = random.Random(seed)
+        self.clock = clock
+        # heap of pending (time, sequence number, event, client name)
+        self.events = []
+        self.ev_count = 0
+        # current simulated time
+        self.now = 0.0
+        # client name -> UID, once the server has told the client
+        self.uids = {}
+        # UID -> client name
+        self.names = {}
+        # student name -> time they started waiting; only waiting students
+        self.waiting = {}
+        # students that haven't left yet
+        self.active_stus = 0
+        # results
+        self.sent = 0
+        self.received = 0
+        self.waits = []
+        self.sessions = 0
+
+    def __str__(self):
+        '''
+        Converts load generator to a string equivalent
+        '''
+        return ("LoadGen(" + str(self.n_stus) + " students, "
+            + str(self.n_tuts) + " tutors, t=" + str(round(self.now, 1))
+            + "s, " + str(self.sent) + " sent, " + str(self.received)
+            + " received)")
+
+    #### BEGIN: Internal Functions ####
+    def __schedule(self, delay, event, name):
+        '''
+        Schedules a client event
+        :param: delay Simulated seconds from now
+        :param: event Event (EV_*) to run
+        :param: name Name of the client
+        '''
+        heapq.heappush(self.events, (self.now + delay, self.ev_count, event,
+            name))
+        self.ev_count += 1
+
+    def __send(self, var_tbl):
+        '''
+        Sends a message to the server queue
+        :param: var_tbl Dictionary of the message
+        '''
+        self.broker.publish(SERVER_QUEUE, self.codec.encode(var_tbl),
+            self.content_type)
+        self.sent += 1
+
+    def __enter_msg(self, method, name):
+        '''
+        Builds a registration message
+        :param: method MSG_STU_ENTER or MSG_TUT_ENTER
+        :param: name Name of the client
+        :return: Dictionary of the message
+        '''
+        return {
+            MSG_PARAM_METHOD:      method,
+            MSG_PARAM_USER_NAME:   name,
+            MSG_PARAM_USER_PASSWD: "pass",
+            MSG_PARAM_USER_F_NAME: "Load",
+            MSG_PARAM_USER_L_NAME: name,
+        }
+
+    def __uid_msg(self, method, name):
+        '''
+        Builds a message that only carries the sender's UID
+        :param: method Message method
+        :param: name Name of the client
+        :return: Dictionary of the message
+        '''
+        return {MSG_PARAM_METHOD: method, MSG_PARAM_UID: self.uids[name]}
+
+    def __run_event(self, event, name):
+        '''
+        Runs a single client event
+        :param: event Event (EV_*) to run
+        :param: name Name of the client
+        '''
+        if (event == EV_STU_ARRIVE):
+            # registering puts the student in line
+            self.__send(self.__enter_msg(MSG_STU_ENTER, name))
+            self.waiting[name] = self.now
+            if (self.poll_time):
+                self.__schedule(self.poll_time, EV_STU_POLL, name)
+        elif (event == EV_STU_ASK):
+            self.__send(self.__uid_msg(MSG_STU_QUEST, name))
+            self.waiting[name] = self.now
+            if (self.poll_time):
+                self.__schedule(self.poll_time, EV_STU_POLL, name)
+        elif (event == EV_STU_POLL):
+            # only students still in line check their position
+            if ((name in self.waiting) and (name in self.uids)):
+                self.__send(self.__uid_msg(MSG_STU_POS, name))
+                self.__schedule(self.poll_time, EV_STU_POLL, name)
+        elif (event == EV_STU_LEAVE):
+            self.__send(self.__uid_msg(MSG_USER_LEAVE, name))
+            self.active_stus -= 1
+            # the last student out sends the tutors home
+            if (self.active_stus == 0):
+                for i in range(0, self.n_tuts):
+                    self.__schedule(0, EV_TUT_LEAVE, self.__tut_name(i))
+        elif (event == EV_TUT_ARRIVE):
+            self.__send(self.__enter_msg(MSG_TUT_ENTER, name))
+        elif (event == EV_TUT_DONE):
+            self.__send(self.__uid_msg(MSG_TUT_DONE, name))
+        elif (event == EV_TUT_LEAVE):
+            self.__send(self.__uid_msg(MSG_USER_LEAVE, name))
+
+    def __read_replies(self):
+        '''
+        Reads every message the server has sent to the clients and schedules
+        whatever the clients do in response
+        '''
+        # clients learn their UIDs before anything else that was sent to them
+        queues = [msg_queue for msg_queue in self.broker.pending()
+            if not(msg_queue in (SERVER_QUEUE, UID_BOOTSTRAP_QUEUE))]
+        for msg_queue in [UID_BOOTSTRAP_QUEUE] + queues:
+            while (True):
+                msg = self.broker.get(msg_queue)
+                if (msg == None):
+                    break
+                self.received += 1
+                body, content_type = msg
+                self.__on_reply(get_codec(content_type).decode(body))
+
+    def __on_reply(self, msg_map):
+        '''
+        Handles a single message sent to a client
+        :param: msg_map Dictionary of the message
+        '''
+        method = msg_map.get(MSG_PARAM_METHOD)
+        if (method == MSG_USER_ENTER):
+            # a client learns its UID
+            name = msg_map[MSG_PARAM_USER_NAME]
+            self.uids[name] = msg_map[MSG_PARAM_USER_UID]
+            self.names[msg_map[MSG_PARAM_USER_UID]] = name
+        elif (method == MSG_USER_HELPED):
+            # the same notice goes to both the student and the tutor; the
+            # student's wait ends and the tutor's session starts
+            stu_name = self.names.get(msg_map[MSG_PARAM_STU_UID])
+            tut_name = self.names.get(msg_map[MSG_PARAM_TUT_UID])
+            if (stu_name in self.waiting):
+                self.waits.append(self.now - self.waiting.pop(stu_name))
+                self.sessions += 1
+                session = self.service_time(self.rng)
+                self.__schedule(session, EV_TUT_DONE, tut_name)
+                # the student moves on once the session is over
+                if (self.rng.random() < self.reask_prob):
+                    self.__schedule(session
+                        + self.rng.expovariate(1.0 / self.think_time),
+                        EV_STU_ASK, stu_name)
+                else:
+                    self.__schedule(session, EV_STU_LEAVE, stu_name)
+
+    def __tut_name(self, i):
+        '''
+        Builds the name of a simulated tutor
+        :param: i Index of the tutor
+        :return: Tutor user name
+        '''
+        return "ltut" + str(i).zfill(4)
+
+    def __stu_name(self, i):
+        '''
+        Builds the name of a simulated student
+        :param: i Index of the student
+        :return: Student user name
+        '''
+        return "lstu" + str(i).zfill(5)
+
+    def __run_step(self, pump, step):
+        '''
+        Sends every event due in the next step to the server, runs the server
+        and reads its replies
+        :param: pump Function that runs the server until its queue is empty
+        :param: step Length of the step, in simulated seconds
+        '''
+        self.now = self.events[0][0]
+        horizon = self.now + step
+        while ((len(self.events) > 0) and (self.events[0][0] <= horizon)):
+            ev_time, ev_count, event, name = heapq.heappop(self.events)
+            self.now = ev_time
+            self.__run_event(event, name)
+        # the server handles the step's messages at the time the last one
+        # was sent
+        if (self.clock != None):
+            self.clock.advance(self.now)
+        pump()
+        self.__read_replies()
+    #### END: Internal Functions ####
+
+    def run(self, pump, step=LOAD_STEP):
+        '''
+        Runs the simulated evening to completion
+        :param: pump Function that runs the server until its queue is empty
+        :param: step Events due within this many simulated seconds of each
+                other are sent to the server together
+        :return: The LoadGen, holding the results
+        '''
+        for i in range(0, self.n_tuts):
+            self.__schedule(0, EV_TUT_ARRIVE, self.__tut_name(i))
+        # Poisson arrivals: exponential gaps between students
+        rate = self.n_stus / max(self.arrival_window, 1e-9)
+        arrival = 0.0
+        for i in range(0, self.n_stus):
+            arrival += self.rng.expovariate(rate)
+            heapq.heappush(self.events, (arrival, self.ev_count,
+                EV_STU_ARRIVE, self.__stu_name(i)))
+            self.ev_count += 1
+        self.active_stus = self.n_stus
+        while (len(self.events) > 0):
+            self.__run_step(pump, step)
+        return self
+
+    def wait_percentile(self, pct):
+        '''
+        Returns a percentile of the time students waited to be helped
+        :param: pct Percentile, between 0 and 100
+        :return: Wait time in simulated seconds, or None if nobody waited
+        '''
+        return percentile(self.waits, pct)
+
+#### FUNCTIONS  ####
+
+def percentile(values, pct):
+    '''
+    Computes a percentile of a list of values (nearest rank)
+    :param: values List of numbers
+    :param: pct Percentile, between 0 and 100
+    :return: Percentile value, or None if the list is empty
+    '''
+    if (len(values) == 0):
+        return None
+    ordered = sorted(values)
+    idx = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[max(0, min(idx, len(ordered) - 1))]
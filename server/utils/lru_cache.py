@@ -0,0 +1,135 @@
+##
+## File:    lru_cache.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that defines a bounded, least-recently-used
+##              cache with hit/miss counters
+##
+
+from collections import OrderedDict
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class LRUCache:
+    '''
+    Bounded cache that evicts the least-recently-used entry when full
+    '''
+
+    def __init__(self, capacity):
+        '''
+        Constructs a LRUCache
+        :param: capacity Maximum number of entries the cache holds
+        '''
+        self.capacity = max(1, capacity)
+        # ordered from least to most recently used
+        self.entries = OrderedDict()
+        # cache effectiveness counters
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        '''
+        Converts cache to a string equivalent
+        '''
+        return ("LRUCache(" + str(len(self.entries)) + "/"
+            + str(self.capacity) + "): " + str(self.hits) + " hits, "
+            + str(self.misses) + " misses")
+
+    def __contains__(self, key):
+        '''
+        Checks if a key is cached, without counting it as a use
+        :param: key Key to look up
+        :return: True if the key is cached, False otherwise
+        '''
+        return key in self.entries
+
+    def len(self):
+        '''
+        Returns the number of cached entries
+        :return: Number of entries in the cache
+        '''
+        return len(self.entries)
+
+    def get(self, key):
+        '''
+        Fetches a cached value, marking it as most recently used
+        :param: key Key to look up
+        :return: Cached value or None if the key isn't cached
+        '''
+        if (key in self.entries):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, val):
+        '''
+        Caches a value, evicting the least recently used entry if full
+        :param: key Key to cache the value under
+        :param: val Value to cache
+        '''
+        self.entries[key] = val
+        self.entries.move_to_end(key)
+        if (len(self.entries) > self.capacity):
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        '''
+        Removes a key from the cache
+        :param: key Key to remove
+        :return: Value that was cached or None if the key wasn't cached
+        '''
+        return self.entries.pop(key, None)
+
+    def clear(self):
+        '''
+        Removes every entry from the cache
+        '''
+        self.entries.clear()
+
+    def hit_rate(self):
+        '''
+        Returns the fraction of lookups that were served from the cache
+        :return: Hit rate between 0 and 1
+        '''
+        total = self.hits + self.misses
+        if (total == 0):
+            return 0.0
+        return self.hits / total
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    cache = LRUCache(2)
+    print("##### Put/Get commands #####")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    print(cache.get("a") == 1)
+    print(cache.get("z") == None)
+    print(cache.hits == 1)
+    print(cache.misses == 1)
+    print("##### Eviction commands #####")
+    # "b" is least recently used
+    cache.put("c", 3)
+    print(not("b" in cache))
+    print(("a" in cache) and ("c" in cache))
+    print(cache.len() == 2)
+    print("##### Invalidate commands #####")
+    print(cache.invalidate("a") == 1)
+    print(cache.invalidate("a") == None)
+    print(cache.get("a") == None)
+    # one hit ("a") and two misses ("z", then "a" once invalidated)
+    print(cache.hits == 1)
+    print(cache.misses == 2)
+    print(cache.hit_rate() == 1 / 3)
+    print(str(cache))
+
+if __name__ == "__main__":
+    main()
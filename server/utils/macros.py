@@ -19,12 +19,61 @@ SERVER_HOST = "localhost"
 SERVER_QUEUE = "Default Queue"
 UID_BOOTSTRAP_QUEUE = "UID Queue"
 
+# RabbitMQ publisher connection pooling
+# number of channels kept open on the long-lived publisher connection
+RMQ_POOL_SIZE = 4
+# heartbeat interval (seconds) negotiated with the RabbitMQ server
+RMQ_HEARTBEAT = 60
+# number of times a failed publish is retried on a fresh connection
+RMQ_RETRIES = 1
+
+# Server engine selection
+# run the asyncio-based server engine by default instead of the blocking one
+SERVER_ASYNC = False
+# command line flag that selects the asyncio-based server engine
+SERVER_ASYNC_FLAG = "--async"
+# how long (seconds) the async consumer blocks on RabbitMQ before checking
+# for acks to send and if it has been asked to stop
+ASYNC_POLL_TIME = 0.05
+# how often (seconds) the async server lets the QueueManager do housekeeping
+ASYNC_TICK_TIME = 0.5
+
+# Flow control on the server queue
+# maximum number of un-acked messages RabbitMQ will push to the server
+SERVER_PREFETCH = 64
+# number of handled messages acknowledged together in one multiple=True ack
+SERVER_ACK_BATCH = 16
+# how long (seconds) the blocking consumer waits on RabbitMQ before sending
+# the acks of a partially filled batch
+SERVER_ACK_FLUSH_TIME = 0.05
+
 # UID prefixes that identifies what kind of user we have
 UID_PREFIX_STU = "stu_"
 UID_PREFIX_TUT = "tut_"
 # RIT email extension
 RIT_EMAIL_EXT = "@rit.edu"
 
+# smallest number of sequence numbers the student queue's rank tree covers
+QUEUE_RANK_MIN_SIZE = 64
+# student queue priority mode; students with a higher priority (e.g. an
+# assignment due tonight) are helped earlier
+QUEUE_PRIORITY = False
+# highest priority a student may ask with
+QUEUE_PRIORITY_MAX = 3
+# aging: each priority level is worth this many seconds of waiting, so a
+# student never waits more than QUEUE_PRIORITY_MAX * QUEUE_AGING_WEIGHT
+# seconds longer than they would have in FIFO order
+QUEUE_AGING_WEIGHT = 10 * 60
+# smallest size at which a priority line's heap is compacted
+QUEUE_HEAP_MIN_SIZE = 64
+# tutor selection; by default the tutor that has been available the longest is
+# sent next. Least-load mode sends the tutor that has helped the fewest
+# students this shift instead
+QUEUE_TUT_LEAST_LOAD = False
+# most questions a student may have waiting in line at once; asking again past
+# that (e.g. tapping "ask" twice) is answered with MSG_ERR_STU_QUEUED
+STU_MAX_TICKETS = 1
+
 # Various semi-official tutor titles
 TUTOR_TA  = "TA"
 TUTOR_SLI = "SLI"
@@ -44,8 +93,12 @@ MSG_STU_ANS         = "stu_answer"
 # Tutor is assigned a question/finishes with a student
 MSG_TUT_HELP        = "tut_help"
 MSG_TUT_DONE        = "tut_done"
+# Student asks for their current position in line
+MSG_STU_POS         = "stu_position"
 # Error messages
 MSG_ERR_USER_LOGIN  = "err_user_login"
+# student asked while already holding every place in line they may hold
+MSG_ERR_STU_QUEUED  = "err_stu_queued"
 
 # TODO Message JSON parameters
 MSG_PARAM_METHOD        = "get_method"
@@ -58,6 +111,78 @@ MSG_PARAM_USER_TITLE    = "user_title"
 MSG_PARAM_USER_UID      = "user_uid"
 MSG_PARAM_STU_UID       = "student_uid"
 MSG_PARAM_TUT_UID       = "tutor_uid"
+# UID of the user a message is coming from
+MSG_PARAM_UID           = MSG_PARAM_USER_UID
+# position in line/length of the line
+MSG_PARAM_STU_POS       = "student_pos"
+MSG_PARAM_QUEUE_LEN     = "queue_len"
+# expected wait (seconds) of a student in line
+MSG_PARAM_STU_ETA       = "student_eta"
+# course a question is about; courses a tutor can help with
+MSG_PARAM_COURSE_ID     = "course_id"
+MSG_PARAM_COURSE_IDS    = "course_ids"
+# priority of a question (0 is normal)
+MSG_PARAM_PRIORITY      = "priority"
+
+# Message wire formats, set as the content type of a message. Messages without
+# a content type are JSON. Clients that send binary messages are answered in
+# binary; replies on the UID bootstrap queue are always JSON
+CONTENT_TYPE_JSON       = "application/json"
+CONTENT_TYPE_BIN        = "application/x-mmcga-bin"
+
+# Metrics endpoint; counters, latency histograms and gauges are served in the
+# Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = True
+METRICS_HOST = "localhost"
+METRICS_PORT = 9420
+
+# Synthetic load (load_gen.py) defaults; times are in simulated seconds
+# number of students that show up over an evening, and tutors on duty
+LOAD_STUDENTS = 500
+LOAD_TUTORS = 20
+# window over which students arrive (Poisson arrivals)
+LOAD_ARRIVAL_WINDOW = 3 * 60 * 60
+# mean length of a tutoring session
+LOAD_SERVICE_TIME = 300.0
+# chance a student asks another question after being helped...
+LOAD_REASK_PROB = 0.3
+# ...and the mean time they take before asking it
+LOAD_THINK_TIME = 600.0
+# how often a waiting student checks their position in line
+LOAD_POLL_TIME = 120.0
+# messages due within this much simulated time are sent to the server together
+LOAD_STEP = 1.0
+
+# Staffing simulator (simulator.py) defaults
+# number of simulated evenings per staffing level
+SIM_EVENINGS = 100
+# numbers of tutors on duty to compare
+SIM_STAFFING = [12, 14, 16, 18, 20, 22, 24]
+# waits longer than this (seconds) count against a staffing level
+SIM_WAIT_TARGET = 10 * 60
+
+# Wait and session time estimators (estimators.py)
+# weight of each new value in the moving averages
+EST_ALPHA = 0.1
+# quantile of wait and session times that is tracked
+EST_QUANTILE = 0.9
+# session length (seconds) assumed until a session has been timed
+EST_SERVICE_TIME = 300.0
+
+# Crash-safe queue state (queue_wal.py); every change to the queues is appended
+# to a write-ahead log that is read back when the server starts
+WAL_ENABLED = True
+WAL_PATH = "./mmcga_queue.wal"
+# debug version of the log for testing purposes
+WAL_PATH_DEBUG = "./debug_test_mmcga_queue.wal"
+# extensions of the snapshot file and of a snapshot being written
+WAL_SNAP_EXT = ".snap"
+WAL_TMP_EXT = ".tmp"
+# the log is compacted into a snapshot once it has this many records
+WAL_SNAPSHOT_EVERY = 10000
+# how often (seconds) the log is forced to disk; records reach the OS as they
+# are written, so only a power loss can lose this much
+WAL_SYNC_INTERVAL = 1.0
 
 # SQLite database file naming
 SQL_DB_PATH       = "./"
@@ -67,17 +192,89 @@ SQL_DB            = SQL_DB_PATH + SQL_DB_FILE
 SQL_DB_FILE_DEBUG = "debug_test_mmcga.db"
 SQL_DB_DEBUG      = SQL_DB_PATH + SQL_DB_FILE_DEBUG
 
+# pragmas applied when the database connection is opened
+# - WAL journaling lets readers and the writer work without blocking and
+#   turns most commits into a sequential append
+# - NORMAL sync only fsyncs the WAL at checkpoints, which is still crash-safe
+#   in WAL mode
+DB_PRAGMAS = [
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-8000",
+    "busy_timeout=5000",
+]
+
+# number of prepared statements kept by the database connection
+DB_STMT_CACHE = 64
+
+# write-behind cache of changed users; changes are written to the database
+# once this many users are waiting...
+DB_FLUSH_SIZE = 64
+# ...or once the oldest change has waited this many seconds
+DB_FLUSH_INTERVAL = 2.0
+
+# number of decoded user records kept in the read-through user cache
+DB_USER_CACHE_SIZE = 1024
+
+# events (asks, dispatches, logins, ...) are buffered and written to the
+# database together with changed users, or sooner once this many are waiting
+DB_EVENT_FLUSH_SIZE = 512
+
+# version of the database schema, kept in SQLite's user_version. Version 0
+# stored each user as a JSON string; older databases are migrated on start up
+DB_SCHEMA_VERSION = 1
+
 # TODO Database tables
 DB_USER_TBL       = "Users"
+# courses each tutor can help with, and the students each tutor has helped
+DB_COURSE_TBL     = "TutorCourses"
+DB_HELPED_TBL     = "TutorHelped"
+# append-only log of what happened in the Mentoring Center, for reports
+DB_EVENT_TBL      = "Events"
 
 # alternative indices in the table ("secondary keys")
 DB_UNAME_IDX      = "user_name_idx"
+DB_Q_COUNT_IDX    = "q_count_idx"
+DB_COURSE_IDX     = "course_id_idx"
+DB_EVENT_TS_IDX   = "event_ts_idx"
+DB_EVENT_UID_IDX  = "event_uid_idx"
 
 # fields for DB tables
 DB_FIELD_UID      = "uid"
 DB_FIELD_UNAME    = "user_name"
+DB_FIELD_EMAIL    = "email"
+DB_FIELD_PASSWD   = "passwd"
+DB_FIELD_F_NAME   = "f_name"
+DB_FIELD_L_NAME   = "l_name"
+DB_FIELD_Q_COUNT  = "q_count"
+DB_FIELD_LOGINS   = "login_count"
+DB_FIELD_TITLE    = "title"
+DB_FIELD_BIO      = "bio"
+DB_FIELD_BUSY     = "busy"
+DB_FIELD_POS      = "pos"
+DB_FIELD_COURSE   = "course_id"
+DB_FIELD_STU_UID  = "stu_uid"
+# JSON serialization of a user; only found in version 0 databases
 DB_FIELD_JSON     = "json_str"
+DB_FIELD_EVENT_ID = "id"
+DB_FIELD_TS       = "ts"
+DB_FIELD_KIND     = "kind"
+DB_FIELD_PEER_UID = "peer_uid"
 
 # field types for DB tables
 DB_F_TYPE_INT     = "INTEGER"
 DB_F_TYPE_TXT     = "TEXT"
+DB_F_TYPE_REAL    = "REAL"
+
+# kinds of events in the event table; the UID is the user the event is about
+# and the peer is the other user involved, if any
+# user enters/leaves the Mentoring Center
+EVENT_LOGIN       = "login"
+EVENT_LOGOUT      = "logout"
+# student asks a question (peer: none)
+EVENT_ASK         = "ask"
+# tutor is sent to a student (peer: the student)
+EVENT_HELP        = "help"
+# tutor finishes with a student (peer: the student)
+EVENT_DONE        = "done"
@@ -0,0 +1,347 @@
+##
+## File:    metrics.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that record server metrics (counters, latency
+##              histograms and gauges) and serve them over HTTP in the
+##              Prometheus text format. Recording a value is a couple of list
+##              operations, so metrics can be left on in production
+##
+
+# Python libraries
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+
+#### GLOBALS    ####
+
+# upper bounds (seconds) of the latency histogram buckets; powers of two from
+# 1 microsecond to ~16 seconds
+METRICS_BUCKETS = tuple(1e-6 * (2 ** i) for i in range(0, 25))
+
+# content type of the Prometheus text format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#### CLASS      ####
+
+class Counter:
+    '''
+    Counter object, a value that only goes up
+    '''
+
+    def __init__(self):
+        '''
+        Constructs a Counter at 0
+        '''
+        self.value = 0
+
+    def inc(self, amount=1):
+        '''
+        Increments the counter
+        :param: amount Amount to add
+        '''
+        self.value += amount
+
+    def samples(self, name, labels):
+        '''
+        Lists the samples of the counter
+        :param: name Metric name
+        :param: labels Label text, e.g. '{method="x"}', or ""
+        :return: List of (sample name, label text, value)
+        '''
+        return [(name, labels, self.value)]
+
+class Histogram:
+    '''
+    Histogram object, counts observed values (e.g. latencies) into
+    logarithmically sized buckets
+    '''
+
+    def __init__(self, bounds=METRICS_BUCKETS):
+        '''
+        Constructs an empty Histogram
+        :param: bounds Sorted upper bounds of the buckets
+        '''
+        self.bounds = bounds
+        # one count per bucket, plus one for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        '''
+        Records a value
+        :param: value Value to record
+        '''
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        '''
+        Lists the samples of the histogram, with cumulative buckets
+        :param: name Metric name
+        :param: labels Label text, e.g. '{method="x"}', or ""
+        :return: List of (sample name, label text, value)
+        '''
+        result = []
+        inner = labels[1:-1] + "," if (len(labels) > 0) else ""
+        total = 0
+        for i in range(0, len(self.bounds)):
+            total += self.counts[i]
+            result.append((name + "_bucket",
+                "{" + inner + 'le="' + repr(self.bounds[i]) + '"}', total))
+        total += self.counts[-1]
+        result.append((name + "_bucket", "{" + inner + 'le="+Inf"}', total))
+        result.append((name + "_sum", labels, self.sum))
+        result.append((name + "_count", labels, self.count))
+        return result
+
+class Gauge:
+    '''
+    Gauge object, a value read from a callback when the metrics are scraped,
+    so keeping it up to date costs nothing
+    '''
+
+    def __init__(self, func):
+        '''
+        Constructs a Gauge
+        :param: func Function that returns the current value
+        '''
+        self.func = func
+
+    def samples(self, name, labels):
+        '''
+        Lists the samples of the gauge
+        :param: name Metric name
+        :param: labels Label text, e.g. '{method="x"}', or ""
+        :return: List of (sample name, label text, value)
+        '''
+        try:
+            return [(name, labels, self.func())]
+        except Exception as err:
+            printd("Gauge " + name + " failed: " + str(err))
+            return []
+
+class Metrics:
+    '''
+    Metrics object, a registry of named (and optionally labelled) metrics
+    Each metric should only be recorded to from one thread; scraping may
+    happen from any thread
+    '''
+
+    def __init__(self):
+        '''
+        Constructs an empty Metrics registry
+        '''
+        # metric name -> (type, help text)
+        self.info = {}
+        # (metric name, label text) -> metric
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        '''
+        Converts the registry to a string equivalent
+        '''
+        return self.render()
+
+    #### BEGIN: Internal Functions ####
+    def __labels(self, labels):
+        '''
+        Formats labels the way they appear in the text format
+        :param: labels Dictionary of label names to values
+        :return: Label text, e.g. '{method="x"}', or "" if there are none
+        '''
+        if (len(labels) == 0):
+            return ""
+        return "{" + ",".join(key + '="' + str(labels[key]).replace("\\",
+            "\\\\").replace('"', '\\"') + '"' for key in sorted(labels)) + "}"
+
+    def __get(self, m_type, name, help_text, labels, build):
+        '''
+        Fetches a metric, creating it the first time it is asked for
+        :param: m_type Prometheus type of the metric
+        :param: name Metric name
+        :param: help_text Description of the metric
+        :param: labels Dictionary of label names to values
+        :param: build Function that builds a new metric
+        :return: Metric object
+        '''
+        key = (name, self.__labels(labels))
+        metric = self.series.get(key)
+        if (metric == None):
+            with self.lock:
+                if not(name in self.info):
+                    self.info[name] = (m_type, help_text)
+                metric = self.series.setdefault(key, build())
+        return metric
+    #### END: Internal Functions ####
+
+    def counter(self, name, help_text="", **labels):
+        '''
+        Fetches (or creates) a counter
+        :param: name Metric name
+        :param: help_text Description of the metric
+        :param: labels Label names and values of the series
+        :return: Counter object
+        '''
+        return self.__get("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text="", **labels):
+        '''
+        Fetches (or creates) a histogram
+        :param: name Metric name
+        :param: help_text Description of the metric
+        :param: labels Label names and values of the series
+        :return: Histogram object
+        '''
+        return self.__get("histogram", name, help_text, labels, Histogram)
+
+    def gauge(self, name, func, help_text="", **labels):
+        '''
+        Registers a gauge, replacing any gauge with the same name and labels
+        :param: name Metric name
+        :param: func Function that returns the current value
+        :param: help_text Description of the metric
+        :param: labels Label names and values of the series
+        :return: Gauge object
+        '''
+        gauge = self.__get("gauge", name, help_text, labels,
+            lambda: Gauge(func))
+        gauge.func = func
+        return gauge
+
+    def render(self):
+        '''
+        Renders every metric in the Prometheus text format
+        :return: String of the metrics
+        '''
+        with self.lock:
+            series = sorted(self.series.items(), key=lambda item: item[0])
+            info = dict(self.info)
+        lines = []
+        last_name = None
+        for (name, labels), metric in series:
+            if (name != last_name):
+                last_name = name
+                m_type, help_text = info[name]
+                lines.append("# HELP " + name + " " + help_text)
+                lines.append("# TYPE " + name + " " + m_type)
+            for s_name, s_labels, value in metric.samples(name, labels):
+                lines.append(s_name + s_labels + " " + repr(value))
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    '''
+    MetricsServer object, serves a Metrics registry over HTTP at /metrics
+    from a background thread
+    '''
+
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        '''
+        Constructs a MetricsServer; nothing is served until start() is called
+        :param: metrics Metrics registry to serve
+        :param: host Address to listen on; local only by default
+        :param: port Port to listen on; 0 picks a free port
+        '''
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        '''
+        Starts serving in a daemon thread
+        :return: Port being served on
+        '''
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if (self.path.split("?")[0] != "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                printd("Metrics: " + (fmt % args))
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+            name="metrics", daemon=True)
+        self.thread.start()
+        printd("Serving metrics on " + self.host + ":" + str(self.port))
+        return self.port
+
+    def stop(self):
+        '''
+        Stops serving
+        '''
+        if (self.httpd != None):
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+#### FUNCTIONS  ####
+
+# metrics recorded by the server
+METRICS = Metrics()
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    import urllib.request
+    metrics = Metrics()
+    print("##### Counter commands #####")
+    metrics.counter("msgs_total", "Messages", method="a").inc()
+    metrics.counter("msgs_total", "Messages", method="a").inc(2)
+    metrics.counter("msgs_total", "Messages", method="b").inc()
+    print(metrics.counter("msgs_total", method="a").value == 3)
+    print("##### Histogram commands #####")
+    hist = metrics.histogram("lat_seconds", "Latency")
+    for value in (0.5e-6, 3e-6, 3e-6, 100.0):
+        hist.observe(value)
+    print(hist.count == 4)
+    print(hist.counts[0] == 1)
+    print(hist.counts[2] == 2)
+    print(hist.counts[-1] == 1)
+    print("##### Gauge commands #####")
+    depth = [7]
+    metrics.gauge("depth", lambda: depth[0], "Queue depth")
+    text = metrics.render()
+    print("depth 7" in text)
+    depth[0] = 9
+    print("depth 9" in metrics.render())
+    print('msgs_total{method="b"} 1' in text)
+    print('lat_seconds_bucket{le="+Inf"} 4' in text)
+    print("lat_seconds_count 4" in text)
+    print(text.count("# TYPE msgs_total counter") == 1)
+    print("##### Server commands #####")
+    server = MetricsServer(metrics, port=0)
+    port = server.start()
+    resp = urllib.request.urlopen("http://" + METRICS_HOST + ":" + str(port)
+        + "/metrics")
+    print(resp.status == 200)
+    print("depth 9" in resp.read().decode("utf-8"))
+    server.stop()
+    print(text)
+
+if __name__ == "__main__":
+    main()
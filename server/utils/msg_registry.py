@@ -0,0 +1,239 @@
+##
+## File:    msg_registry.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python classes that route messages received by the server to
+##              the function that handles them. Each handler declares the
+##              fields it expects up front, so routing is a single table
+##              lookup and validating a message is cheap
+##
+
+# Python libraries
+import time
+from operator import itemgetter
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+
+#### GLOBALS    ####
+
+#### CLASS      ####
+
+class MsgHandler:
+    '''
+    MsgHandler object, pairs a message method with the function that handles
+    it and the schema of the fields that function needs
+    '''
+
+    def __init__(self, method, func, fields=(), optional=()):
+        '''
+        Constructs a MsgHandler
+        :param: method Message method (MSG_* value) this handler answers
+        :param: func Function that handles the message. It is called with the
+                dispatch target followed by the value of each field, in the
+                order they are declared
+        :param: fields List of (field name, type) pairs that must be in the
+                message
+        :param: optional List of (field name, type, default) triples that may
+                be in the message
+        '''
+        self.method = method
+        self.func = func
+        self.fields = tuple(field for field, f_type in fields)
+        self.optional = tuple((field, default)
+            for field, f_type, default in optional)
+        # expected type of each argument, in argument order. Optional fields
+        # left at their default are allowed to be None
+        self.types = (tuple(f_type for field, f_type in fields)
+            + tuple(f_type for field, f_type, default in optional))
+        self.n_fields = len(self.fields)
+        # precompile the schema into a single getter that pulls every
+        # required field out of a message in one call
+        if (self.n_fields == 0):
+            self.getter = lambda msg_map: ()
+        elif (self.n_fields == 1):
+            get_one = itemgetter(self.fields[0])
+            self.getter = lambda msg_map: (get_one(msg_map),)
+        else:
+            self.getter = itemgetter(*self.fields)
+        # hooks called after this handler runs
+        self.hooks = []
+
+    def __str__(self):
+        '''
+        Converts handler to a string equivalent
+        '''
+        return ("MsgHandler(" + self.method + " -> " + self.func.__name__
+            + ", fields: " + str(self.fields) + ")")
+
+    def extract(self, msg_map):
+        '''
+        Pulls the handler's arguments out of a message and validates them
+        :param: msg_map Dictionary of the message received
+        :return: Tuple of arguments for the handler or None if the message
+                 doesn't match the schema
+        '''
+        try:
+            args = self.getter(msg_map)
+        except KeyError:
+            return None
+        if (len(self.optional) > 0):
+            args = args + tuple(msg_map.get(field, default)
+                for field, default in self.optional)
+        for i in range(0, len(args)):
+            if not(isinstance(args[i], self.types[i])):
+                if ((i < self.n_fields) or (args[i] != None)):
+                    return None
+        return args
+
+    def missing(self, msg_map):
+        '''
+        Lists the required fields a message is missing
+        :param: msg_map Dictionary of the message received
+        :return: List of missing field names
+        '''
+        return [field for field in self.fields if not(field in msg_map)]
+
+class MsgRegistry:
+    '''
+    MsgRegistry object, a dispatch table mapping message methods to handlers
+    '''
+
+    def __init__(self):
+        '''
+        Constructs an empty MsgRegistry
+        '''
+        # message method -> MsgHandler
+        self.handlers = {}
+        # hooks called after every handler runs
+        self.hooks = []
+
+    def __str__(self):
+        '''
+        Converts registry to a string equivalent
+        '''
+        result = "===== Message Registry =====\n"
+        for method in self.handlers:
+            result += str(self.handlers[method]) + "\n"
+        return result
+
+    def __contains__(self, method):
+        '''
+        Checks if a message method has a handler
+        :param: method Message method to look up
+        :return: True if the method is handled, False otherwise
+        '''
+        return method in self.handlers
+
+    def register(self, method, fields=(), optional=()):
+        '''
+        Decorator that registers a function as the handler for a message
+        method; see MsgHandler for the meaning of the parameters
+        :param: method Message method (MSG_* value) the function handles
+        :param: fields List of (field name, type) pairs that must be in the
+                message
+        :param: optional List of (field name, type, default) triples that may
+                be in the message
+        :return: Decorator that registers the function and returns it as is
+        '''
+        def decorator(func):
+            self.handlers[method] = MsgHandler(method, func, fields, optional)
+            return func
+        return decorator
+
+    def add_hook(self, hook, method=None):
+        '''
+        Adds a hook that is called after a handler runs, as
+        hook(method, elapsed time in seconds)
+        :param: hook Function to call
+        :param: method Optional message method; the hook only runs for this
+                method's handler if given, otherwise it runs for every handler
+        :return: True if the hook was added, False if the method is unknown
+        '''
+        if (method == None):
+            self.hooks.append(hook)
+            return True
+        if (method in self.handlers):
+            self.handlers[method].hooks.append(hook)
+            return True
+        return False
+
+    def dispatch(self, target, msg_map):
+        '''
+        Routes a message to its handler
+        :param: target Object handed to the handler as its first argument
+                (the server's QueueManager)
+        :param: msg_map Dictionary of the message received
+        :return: Value returned by the handler or None if the message could
+                 not be handled
+        '''
+        if not(isinstance(msg_map, dict)):
+            printd("Malformed message: " + str(msg_map))
+            return None
+        method = msg_map.get(MSG_PARAM_METHOD)
+        handler = self.handlers.get(method)
+        if (handler == None):
+            printd("Unknown message: " + str(msg_map))
+            return None
+        args = handler.extract(msg_map)
+        if (args == None):
+            printd("Malformed " + str(method) + " message, missing "
+                + str(handler.missing(msg_map)) + ": " + str(msg_map))
+            return None
+        # skip timing entirely if nobody is listening
+        if ((len(self.hooks) == 0) and (len(handler.hooks) == 0)):
+            return handler.func(target, *args)
+        start = time.perf_counter()
+        try:
+            return handler.func(target, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in handler.hooks:
+                hook(method, elapsed)
+            for hook in self.hooks:
+                hook(method, elapsed)
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    registry = MsgRegistry()
+
+    @registry.register("greet", fields=[("name", str)],
+        optional=[("times", int, 1)])
+    def greet(target, name, times):
+        target.append(name * times)
+        return name
+
+    timings = []
+    greeted = []
+    print("##### Dispatch commands #####")
+    print("greet" in registry)
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet",
+        "name": "bob"}) == "bob")
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet",
+        "name": "al", "times": 2}) == "al")
+    print(greeted == ["bob", "alal"])
+    print("##### Validation commands #####")
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet"}) == None)
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet",
+        "name": 42}) == None)
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet",
+        "name": "x", "times": "2"}) == None)
+    print(registry.dispatch(greeted, {MSG_PARAM_METHOD: "nope"}) == None)
+    print(registry.dispatch(greeted, ["not", "a", "map"]) == None)
+    print(len(greeted) == 2)
+    print("##### Hook commands #####")
+    print(registry.add_hook(lambda m, t: timings.append(m), "greet"))
+    print(not(registry.add_hook(lambda m, t: timings.append(m), "nope")))
+    registry.add_hook(lambda m, t: timings.append(t >= 0))
+    registry.dispatch(greeted, {MSG_PARAM_METHOD: "greet", "name": "c"})
+    print(timings == ["greet", True])
+    print(str(registry))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+##
+## File:    queue_wal.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that keeps the state of the Mentoring Center
+##              (who is in line, which tutors are on duty) safe across server
+##              restarts. Every change is appended to a write-ahead log, and
+##              the log is periodically compacted into a snapshot. On start up
+##              the latest snapshot plus the tail of the log are read back
+##
+
+# Python libraries
+import json
+import os
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+from datagrams.json_db_encoder import JSON_DB_Encoder
+
+#### GLOBALS    ####
+
+# record field that holds the log sequence number of a record (or the last
+# record covered by a snapshot)
+WAL_FIELD_LSN = "n"
+# record field that holds the operation a record describes
+WAL_FIELD_OP  = "op"
+
+#### CLASS      ####
+
+class QueueWAL:
+    '''
+    QueueWAL object, an append-only log of queue changes plus a snapshot
+    Records are JSON objects, one per line. Each record has a log sequence
+    number (LSN); a snapshot stores the LSN of the last record it covers, so
+    records that made it into a snapshot are never applied twice, even if
+    the server stops between writing a snapshot and truncating the log
+    '''
+
+    def __init__(self, path):
+        '''
+        Constructs a QueueWAL; nothing is opened until open() is called
+        :param: path Path of the log file; the snapshot is kept next to it
+        '''
+        self.path = path
+        self.snap_path = path + WAL_SNAP_EXT
+        self.fptr = None
+        # LSN of the last record written
+        self.lsn = 0
+        # records written since the last snapshot
+        self.since_snap = 0
+        # records written since the last fsync
+        self.unsynced = 0
+        self.encoder = JSON_DB_Encoder(separators=(",", ":"))
+
+    def __str__(self):
+        '''
+        Converts the log to a string equivalent
+        '''
+        return ("QueueWAL(" + self.path + ", lsn=" + str(self.lsn) + ", "
+            + str(self.since_snap) + " since snapshot)")
+
+    #### BEGIN: Internal Functions ####
+    def __fsync_dir(self):
+        '''
+        Flushes the directory holding the log, so a renamed snapshot survives
+        a power loss
+        '''
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    #### END: Internal Functions ####
+
+    def load(self):
+        '''
+        Reads back the latest snapshot and the records written after it. A
+        record torn by a crash ends the log
+        :return: (snapshot dictionary or None, list of record dictionaries)
+        '''
+        snap = None
+        if (os.path.exists(self.snap_path)):
+            with open(self.snap_path, "r", encoding="utf-8") as fptr:
+                snap = json.load(fptr)
+            self.lsn = snap[WAL_FIELD_LSN]
+        records = []
+        if (os.path.exists(self.path)):
+            with open(self.path, "r", encoding="utf-8") as fptr:
+                for line in fptr:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        printd("Log " + self.path + " ends in a torn record")
+                        break
+                    if (record[WAL_FIELD_LSN] > self.lsn):
+                        records.append(record)
+                        self.lsn = record[WAL_FIELD_LSN]
+        return snap, records
+
+    def open(self):
+        '''
+        Opens the log for appending. Records are written through to the OS
+        as they are appended, so they survive the server process dying
+        '''
+        self.fptr = open(self.path, "a", buffering=1, encoding="utf-8")
+
+    def append(self, op, **fields):
+        '''
+        Appends a record to the log
+        :param: op Operation the record describes
+        :param: fields Fields of the record; users and other objects are
+                encoded the way they are in the database
+        :return: LSN of the record
+        '''
+        self.lsn += 1
+        fields[WAL_FIELD_LSN] = self.lsn
+        fields[WAL_FIELD_OP] = op
+        self.fptr.write(self.encoder.encode(fields) + "\n")
+        self.since_snap += 1
+        self.unsynced += 1
+        return self.lsn
+
+    def sync(self):
+        '''
+        Forces the records written so far to disk
+        :return: Number of records that were synced
+        '''
+        count = self.unsynced
+        if ((count > 0) and (self.fptr != None)):
+            self.fptr.flush()
+            os.fsync(self.fptr.fileno())
+            self.unsynced = 0
+        return count
+
+    def snapshot(self, state):
+        '''
+        Writes a snapshot of the whole state and empties the log. The snapshot
+        is written to a temporary file and renamed over the old one, so there
+        is always one complete snapshot on disk
+        :param: state Dictionary of the state, as of the last record written
+        '''
+        state[WAL_FIELD_LSN] = self.lsn
+        tmp_path = self.snap_path + WAL_TMP_EXT
+        with open(tmp_path, "w", encoding="utf-8") as fptr:
+            fptr.write(self.encoder.encode(state))
+            fptr.flush()
+            os.fsync(fptr.fileno())
+        os.replace(tmp_path, self.snap_path)
+        self.__fsync_dir()
+        # every record is in the snapshot now
+        if (self.fptr != None):
+            self.fptr.close()
+        self.fptr = open(self.path, "w", buffering=1, encoding="utf-8")
+        self.since_snap = 0
+        self.unsynced = 0
+        printd("Snapshot of the queues written at LSN " + str(self.lsn))
+
+    def close(self):
+        '''
+        Closes the log, syncing it first
+        '''
+        if (self.fptr != None):
+            self.sync()
+            self.fptr.close()
+            self.fptr = None
+
+#### FUNCTIONS  ####
+
+#### MAIN       ####
+
+def main():
+    '''
+    Test program for this class
+    '''
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), "test.wal")
+    print("##### Append commands #####")
+    wal = QueueWAL(path)
+    print(wal.load() == (None, []))
+    wal.open()
+    print(wal.append("push", uid="stu_a", t=1.0) == 1)
+    print(wal.append("push", uid="stu_b", t=2.0) == 2)
+    wal.close()
+    wal = QueueWAL(path)
+    snap, records = wal.load()
+    print((snap == None) and (len(records) == 2))
+    print(records[1] == {"n": 2, "op": "push", "uid": "stu_b", "t": 2.0})
+    print("##### Snapshot commands #####")
+    wal.open()
+    wal.snapshot({"line": ["stu_a", "stu_b"]})
+    wal.append("leave", uid="stu_a", t=3.0)
+    wal.close()
+    wal = QueueWAL(path)
+    snap, records = wal.load()
+    print(snap == {"line": ["stu_a", "stu_b"], "n": 2})
+    print([record["n"] for record in records] == [3])
+    print(wal.lsn == 3)
+    print("##### Recovery commands #####")
+    # records already in the snapshot are skipped, and a torn record ends
+    # the log
+    with open(path, "w", encoding="utf-8") as fptr:
+        fptr.write('{"n":2,"op":"push","uid":"stu_b","t":2.0}\n')
+        fptr.write('{"n":3,"op":"leave","uid":"stu_a","t":3.0}\n')
+        fptr.write('{"n":4,"op":"pu')
+    wal = QueueWAL(path)
+    snap, records = wal.load()
+    print([record["n"] for record in records] == [3])
+    print(not(os.path.exists(wal.snap_path + WAL_TMP_EXT)))
+    print(str(wal))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+##
+## File:    rmq_pool.py
+##
+## Author:  Schuyler Martin <sam8050@rit.edu>
+##
+## Description: Python class that keeps a long-lived connection to the
+##              RabbitMQ server open, along with a small pool of channels, so
+##              that out-going messages don't pay for a fresh TCP+AMQP
+##              handshake every time they are sent
+##
+
+# Python libraries
+import pika
+import time
+
+# project libraries
+from utils.macros import *
+from utils.utils import printd
+
+#### GLOBALS    ####
+
+# exceptions that indicate the connection/channel has gone stale and should be
+# re-established before trying again
+RMQ_RECOVERABLE_ERRS = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.AMQPChannelError,
+    ConnectionError,
+)
+
+#### CLASS      ####
+
+class RMQPool:
+    '''
+    RMQPool object, maintains a persistent publisher connection to RabbitMQ
+    and hands out warm channels for publishing messages
+    '''
+
+    def __init__(self, host=SERVER_HOST, exchange="",
+            pool_size=RMQ_POOL_SIZE, heartbeat=RMQ_HEARTBEAT):
+        '''
+        Constructs a RMQPool object. No connection is made until the first
+        message is published
+        :param: host Host name of the RabbitMQ server
+        :param: exchange RabbitMQ exchange to publish messages to
+        :param: pool_size Number of channels to keep open on the connection
+        :param: heartbeat Heartbeat interval negotiated with the server, in
+                seconds
+        '''
+        self.host = host
+        self.exchange = exchange
+        self.pool_size = max(1, pool_size)
+        self.heartbeat = heartbeat
+        # connection and channels are built lazily
+        self.socket = None
+        self.channels = []
+        # round-robin index of the next channel to hand out
+        self.chan_idx = 0
+        # queues already declared on this connection; re-declaring is a round
+        # trip to the server that we only need to make once per connection
+        self.declared = set()
+        # message properties by content type; they never change, so they are
+        # only built once
+        self.props = {}
+        # last time we did any I/O; used to service heartbeats
+        self.last_io = 0.0
+        # number of times the connection has been (re-)established
+        self.connect_count = 0
+
+    def __str__(self):
+        '''
+        Converts pool to a string equivalent
+        '''
+        state = "open" if self.is_open() else "closed"
+        return ("RMQPool(" + self.host + ", " + state + ", "
+            + str(len(self.channels)) + " channels, "
+            + str(self.connect_count) + " connects)")
+
+    #### BEGIN: Internal Functions ####
+    def __connect(self):
+        '''
+        (Re-)Establishes the connection to the RabbitMQ server and opens the
+        channel pool
+        '''
+        self.__drop()
+        self.socket = pika.BlockingConnection(
+            pika.ConnectionParameters(self.host, heartbeat=self.heartbeat)
+        )
+        for i in range(0, self.pool_size):
+            self.channels.append(self.socket.channel())
+        self.connect_count += 1
+        self.last_io = time.monotonic()
+        printd("RMQPool connected to " + self.host)
+
+    def __drop(self):
+        '''
+        Forgets the current connection, closing it if it is still open
+        '''
+        if ((self.socket != None) and self.socket.is_open):
+            try:
+                self.socket.close()
+            except RMQ_RECOVERABLE_ERRS:
+                pass
+        self.socket = None
+        self.channels = []
+        self.chan_idx = 0
+        self.declared.clear()
+
+    def __service(self):
+        '''
+        Services heartbeats on an idle connection. The blocking adapter only
+        answers heartbeats when it performs I/O, so a publisher that sat quiet
+        for longer than the heartbeat window would otherwise be dropped by the
+        server
+        '''
+        now = time.monotonic()
+        if ((self.heartbeat > 0) and (now - self.last_io > self.heartbeat / 2)):
+            self.socket.process_data_events(0)
+        self.last_io = now
+
+    def __channel(self):
+        '''
+        Fetches a warm channel, replacing any that the server has closed
+        :return: Open channel on the pooled connection
+        '''
+        if not(self.is_open()):
+            self.__connect()
+        self.__service()
+        idx = self.chan_idx
+        self.chan_idx = (self.chan_idx + 1) % self.pool_size
+        if not(self.channels[idx].is_open):
+            self.channels[idx] = self.socket.channel()
+        return self.channels[idx]
+
+    def __publish(self, channel, msg_queue, body, content_type=None):
+        '''
+        Publishes a single message on a channel, declaring the queue first if
+        this connection hasn't seen it yet
+        :param: channel Channel to publish on
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        if not(msg_queue in self.declared):
+            channel.queue_declare(queue=msg_queue)
+            self.declared.add(msg_queue)
+        properties = None
+        if (content_type != None):
+            properties = self.props.get(content_type)
+            if (properties == None):
+                properties = pika.BasicProperties(content_type=content_type)
+                self.props[content_type] = properties
+        channel.basic_publish(exchange=self.exchange,
+            routing_key=msg_queue,
+            body=body,
+            properties=properties)
+    #### END: Internal Functions ####
+
+    def is_open(self):
+        '''
+        Checks if the pooled connection is currently open
+        :return: True if the connection is open, False otherwise
+        '''
+        return (self.socket != None) and self.socket.is_open
+
+    def publish(self, msg_queue, body, content_type=None):
+        '''
+        Publishes a message to a specific message queue, reconnecting if the
+        pooled connection has gone stale
+        :param: msg_queue Message queue to write to
+        :param: body Message body to send
+        :param: content_type Optional content type (wire format) of the body
+        '''
+        for attempt in range(0, RMQ_RETRIES + 1):
+            try:
+                self.__publish(self.__channel(), msg_queue, body, content_type)
+                return
+            except RMQ_RECOVERABLE_ERRS as err:
+                printd("RMQPool publish failed (" + str(err) + "), retrying")
+                self.__drop()
+                if (attempt == RMQ_RETRIES):
+                    raise
+
+    def publish_batch(self, msgs):
+        '''
+        Publishes a batch of messages back-to-back on a single warm channel.
+        If the connection drops part way through, only the messages that
+        haven't been sent yet are retried
+        :param: msgs List of (message queue, message body) pairs or
+                (message queue, message body, content type) triples to send
+        '''
+        sent = 0
+        for attempt in range(0, RMQ_RETRIES + 1):
+            try:
+                channel = self.__channel()
+                while (sent < len(msgs)):
+                    self.__publish(channel, *msgs[sent])
+                    sent += 1
+                return
+            except RMQ_RECOVERABLE_ERRS as err:
+                printd("RMQPool batch publish failed (" + str(err)
+                    + "), retrying")
+                self.__drop()
+                if (attempt == RMQ_RETRIES):
+                    raise
+
+    def close(self):
+        '''
+        Closes the pooled connection
+        '''
+        self.__drop()